@@ -0,0 +1,114 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        benchmark, download many small fragments from a local https server, like an HLS stream, with and without the
+        shared curl cache (dns, TLS sessions), and count new connections, full TLS handshakes and resumed TLS
+        sessions.
+
+        every fragment is fetched by a fresh curl handle, i.e. the same as utils.download(), a self-signed certificate
+        is generated by "openssl" command, which must be available in PATH.
+            python scripts/benchmarks/curl_share.py --fragments 500 --threads 4
+"""
+
+import os
+import ssl
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from vortexdm import config, utils  # noqa: E402
+from vortexdm.utils import download, curl_stats  # noqa: E402
+
+
+class FragmentHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+    disable_nagle_algorithm = True  # headers and body are sent separately, avoid delayed ack stalls
+    size = 16 * 1024
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        body = b'x' * self.size
+        self.send_response(200)
+        self.send_header('Content-Type', 'video/MP2T')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_server(folder):
+    cert, key = os.path.join(folder, 'cert.pem'), os.path.join(folder, 'key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=localhost',
+                    '-keyout', key, '-out', cert], check=True, capture_output=True)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FragmentHandler)
+    server.daemon_threads = True
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+def run(url, fragments, threads):
+    counters = {k: getattr(curl_stats, k) for k in ('transfers', 'new_connections', 'tls_handshakes', 'tls_resumed')}
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(threads) as executor:
+        results = list(executor.map(lambda i: download(f'{url}/seg{i}.ts', verbose=False, decode=False),
+                                    range(fragments)))
+
+    elapsed = time.perf_counter() - start
+    failed = sum(1 for data in results if not data)
+    counters = {k: getattr(curl_stats, k) - v for k, v in counters.items()}
+
+    return elapsed, failed, counters
+
+
+def main():
+    parser = argparse.ArgumentParser(description='measure shared curl cache effect on many small https downloads')
+    parser.add_argument('--fragments', type=int, default=500, help='number of fragments')
+    parser.add_argument('--threads', type=int, default=4, help='concurrent downloads')
+    parser.add_argument('--size', type=int, default=16 * 1024, help='fragment size in bytes')
+    args = parser.parse_args()
+
+    config.log_level = 0
+    config.ignore_ssl_cert = True  # self-signed certificate
+    FragmentHandler.size = args.size
+
+    folder = tempfile.mkdtemp(prefix='vortexdm_bench_')
+    server = start_server(folder)
+    url = f'https://localhost:{server.server_address[1]}'
+
+    try:
+        curl_share = utils.get_curl_share()
+        for name, share in (('without curl share', False), ('with curl share', curl_share)):
+            utils._curl_share = share  # False means curl share is not available
+            elapsed, failed, counters = run(url, args.fragments, args.threads)
+            print(f'{name}: {args.fragments} fragments in {elapsed:.2f} seconds, '
+                  f'{args.fragments / elapsed:.0f} fragments/sec, failed: {failed}, '
+                  f'new connections: {counters["new_connections"]}, full TLS handshakes: {counters["tls_handshakes"]}, '
+                  f'resumed TLS sessions: {counters["tls_resumed"]}')
+    finally:
+        server.shutdown()
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
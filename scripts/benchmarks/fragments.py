@@ -0,0 +1,117 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        benchmark, download an HLS stream of many small fragments from a local http server, with and without
+        fragments batching, i.e. a worker downloads a batch of fragments back-to-back on one connection, refer to
+        scheduling.FragmentBatcher.
+
+        server waits "--delay" seconds before answering every request, to simulate network round trip time.
+            python scripts/benchmarks/fragments.py --fragments 1000 --size 102400 --delay 0.02
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from vortexdm import config  # noqa: E402
+from vortexdm.brain import brain  # noqa: E402
+from vortexdm.downloaditem import DownloadItem  # noqa: E402
+from vortexdm.scheduling import FragmentBatcher  # noqa: E402
+from vortexdm.utils import format_bytes  # noqa: E402
+
+
+class HLSHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+    disable_nagle_algorithm = True  # headers and body are sent separately, avoid delayed ack stalls
+    fragments = 1000
+    size = 100 * 1024
+    delay = 0
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.delay:
+            time.sleep(self.delay)
+
+        if self.path.endswith('.m3u8'):
+            lines = ['#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-TARGETDURATION:2', '#EXT-X-MEDIA-SEQUENCE:0']
+            for i in range(self.fragments):
+                lines += ['#EXTINF:2.0,', f'seg{i}.ts']
+            lines.append('#EXT-X-ENDLIST')
+            body = '\n'.join(lines).encode()
+            content_type = 'application/vnd.apple.mpegurl'
+        else:
+            body = b'x' * self.size
+            content_type = 'video/MP2T'
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def run(url, folder):
+    d = DownloadItem(url=url, name='video.ts', folder=folder)
+    d.eff_url = url
+    d.type = config.MediaType.video
+    d.subtype_list = ['hls']
+
+    start = time.perf_counter()
+    brain(d)
+    elapsed = time.perf_counter() - start
+
+    size = os.path.getsize(d.target_file) if os.path.isfile(d.target_file) else 0
+    return elapsed, size, d.status
+
+
+def main():
+    parser = argparse.ArgumentParser(description='measure fragments batching effect on HLS download speed')
+    parser.add_argument('--fragments', type=int, default=1000, help='number of fragments')
+    parser.add_argument('--size', type=int, default=100 * 1024, help='fragment size in bytes')
+    parser.add_argument('--delay', type=float, default=0, help='server delay of every request in seconds')
+    parser.add_argument('--connections', type=int, default=10, help='max. connections')
+    args = parser.parse_args()
+
+    config.log_level = 0
+    config.max_connections = args.connections
+    HLSHandler.fragments, HLSHandler.size, HLSHandler.delay = args.fragments, args.size, args.delay
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), HLSHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/index.m3u8'
+
+    max_size = FragmentBatcher.max_size
+    try:
+        for name, batch_size in (('one fragment per job', 1), ('fragments batching', max_size)):
+            FragmentBatcher.max_size = batch_size
+            folder = tempfile.mkdtemp(prefix='vortexdm_bench_')
+            try:
+                elapsed, size, status = run(url, folder)
+            finally:
+                shutil.rmtree(folder, ignore_errors=True)
+
+            print(f'{name}: {status}, {args.fragments} fragments in {elapsed:.2f} seconds, '
+                  f'{args.fragments / elapsed:.0f} fragments/sec, {format_bytes(size / elapsed)}/s')
+    finally:
+        FragmentBatcher.max_size = max_size
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
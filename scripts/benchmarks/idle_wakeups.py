@@ -0,0 +1,162 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        benchmark, measure idle cpu usage and wake-ups per second of brain's manager threads for an active download,
+        a local http server trickles data very slowly, so connections stay open while almost nothing happens.
+
+        wake-ups are counted as calls to time.sleep() (polling loops) and SchedulingContext.wait() / wait_for()
+        (event driven loops), run this script on older revisions to compare, e.g.
+            python scripts/benchmarks/idle_wakeups.py
+            git stash; git checkout <old revision>; python scripts/benchmarks/idle_wakeups.py
+"""
+
+import os
+import re
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from vortexdm import config, brain  # noqa: E402
+from vortexdm.model import ObservableDownloadItem  # noqa: E402
+
+FILE_SIZE = 64 * 1024 * 1024  # virtual file, server generates its contents
+
+
+class TrickleHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    rate = 1024  # bytes/sec per connection
+    stop = threading.Event()
+
+    def log_message(self, *args):
+        pass
+
+    def send_file_headers(self):
+        start, end, code = 0, FILE_SIZE - 1, 200
+        match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2) or end), end)
+            code = 206
+
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(end - start + 1))
+        if code == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{FILE_SIZE}')
+        self.end_headers()
+
+        return end - start + 1
+
+    def do_HEAD(self):
+        self.send_file_headers()
+
+    def do_GET(self):
+        left = self.send_file_headers()
+        chunk = b'x' * self.rate
+
+        # Event.wait() instead of time.sleep() to keep server out of wake-ups count
+        while left > 0 and not self.stop.wait(1):
+            try:
+                self.wfile.write(chunk[:left])
+            except OSError:
+                return
+            left -= len(chunk)
+
+
+class WakeupsCounter:
+    """count calls of time.sleep() and SchedulingContext waits"""
+
+    def __init__(self):
+        self.count = 0
+        self._sleep = time.sleep
+
+        def sleep(*args, **kwargs):
+            self.count += 1
+            return self._sleep(*args, **kwargs)
+
+        time.sleep = sleep
+
+        try:
+            from vortexdm.scheduling import SchedulingContext
+        except ImportError:
+            return
+
+        for name in ('wait', 'wait_for'):
+            method = getattr(SchedulingContext, name, None)
+            if method:
+                setattr(SchedulingContext, name, self.wrap(method))
+
+    def wrap(self, method):
+        def wrapper(*args, **kwargs):
+            self.count += 1
+            return method(*args, **kwargs)
+
+        return wrapper
+
+
+def main():
+    parser = argparse.ArgumentParser(description='measure idle cpu and wake-ups of an active download')
+    parser.add_argument('--connections', type=int, default=8, help='max connections per download')
+    parser.add_argument('--duration', type=float, default=10, help='measuring time in seconds')
+    parser.add_argument('--warmup', type=float, default=8, help='time to reach max connections before measuring')
+    parser.add_argument('--rate', type=int, default=1024, help='server rate in bytes/sec per connection')
+    parser.add_argument('--engine', default=None, help='download engine, e.g. threads or curl_multi')
+    args = parser.parse_args()
+
+    TrickleHandler.rate = args.rate
+    server = ThreadingHTTPServer(('127.0.0.1', 0), TrickleHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/file.bin'
+
+    config.log_level = 0
+    config.max_connections = args.connections
+    if args.engine:
+        config.download_engine = args.engine
+
+    folder = tempfile.mkdtemp(prefix='vortexdm_bench_')
+    try:
+        d = ObservableDownloadItem(folder=folder)
+        d.update(url)
+
+        counter = WakeupsCounter()
+        brain_thread = threading.Thread(target=brain.brain, args=(d,), daemon=True)
+        brain_thread.start()
+
+        time.sleep(args.warmup)
+
+        count = counter.count
+        cpu = time.process_time()
+        start = time.monotonic()
+        time.sleep(args.duration)
+        elapsed = time.monotonic() - start
+        cpu = time.process_time() - cpu
+        wakeups = counter.count - count - 1  # exclude this measuring sleep
+
+        print(f'engine: {config.download_engine}, connections: {d.live_connections}/{args.connections}')
+        print(f'idle cpu: {cpu / elapsed * 100:.2f}% of one core')
+        print(f'wake-ups: {wakeups / elapsed:.1f} per second')
+
+        d.status = config.Status.cancelled
+        TrickleHandler.stop.set()
+        brain_thread.join(10)
+    finally:
+        server.shutdown()
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
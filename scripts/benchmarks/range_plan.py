@@ -0,0 +1,173 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        benchmark, simulate downloading a file with different initial range plans, no network is used:
+        "fixed": five slices of 5/10/15/20/50%, the plan used before utils.get_range_list() became adaptive.
+        "adaptive": utils.get_range_list() with an unknown link, i.e. the first download from a host.
+        "learned": utils.get_range_list() with link's rtt and connection speed, i.e. learned from previous downloads.
+
+        simulated thread manager starts one connection per segment up to "--connections", a new connection takes
+        3 round trips before receiving data, i.e. tcp and tls handshakes and the request, then it receives link's
+        connection speed, limited by a total "--bandwidth" shared equally, idle connections split running segments once
+        a second like thread_manager's auto-segmentation, refer to scheduling.SegmentSplitter, connections soft start
+        and server errors are not simulated.
+
+        results: total time, time till the first "--preview" ratio of file is ready for watching while downloading,
+        and number of segments split while downloading.
+            python scripts/benchmarks/range_plan.py --sizes 20 200 2000 --links broadband mobile
+"""
+
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from vortexdm import config  # noqa: E402
+from vortexdm.scheduling import SegmentSplitter  # noqa: E402
+from vortexdm.utils import get_range_list, format_bytes  # noqa: E402
+
+# name: (rtt in seconds, speed of one connection in bytes/sec)
+LINKS = {
+    'lan': (0.002, 20_000_000),
+    'broadband': (0.03, 2_000_000),
+    'mobile': (0.15, 300_000),
+}
+
+SETUP_RTTS = 3  # round trips before a new connection receives data
+
+
+class SimSegment:
+    """minimal segment, the attributes used by SegmentSplitter"""
+    __slots__ = ('range', 'current_size')
+
+    def __init__(self, range):
+        self.range = range
+        self.current_size = 0
+
+    @property
+    def size(self):
+        return self.range[1] - self.range[0] + 1
+
+    @property
+    def remaining(self):
+        return max(self.size - self.current_size, 0)
+
+
+def fixed_plan(file_size, minsize):
+    """five slices plan, used before adaptive get_range_list()"""
+    if file_size < minsize * 100 / 5:
+        return [[0, file_size - 1]]
+
+    sizes = [i * file_size // 100 for i in (5, 10, 15, 20)]
+    sizes.append(file_size - sum(sizes))
+
+    range_list = []
+    start = 0
+    for s in sizes:
+        range_list.append([start, start + s - 1])
+        start += s
+    return range_list
+
+
+def simulate(range_list, link, connections, bandwidth, preview_size, dt):
+    """simulate a download
+
+    Returns:
+        (tuple): total time, preview time, number of splits
+    """
+    rtt, speed = link
+    segs = [SimSegment(r) for r in range_list]
+    queue = list(segs)  # waiting segments, lower offsets first
+    running = {}  # key=segment, value=time its connection starts receiving data
+    splitter = SegmentSplitter()
+    splitter.rtt = rtt
+
+    t = 0
+    rate = 0
+    splits = 0
+    split_timer = -1
+    preview_time = None
+
+    while True:
+        # start waiting segments on free connections
+        while queue and len(running) < connections:
+            running[queue.pop(0)] = t + SETUP_RTTS * rtt
+
+        # auto-segmentation, once a second, same as thread_manager
+        if not queue and len(running) < connections and t - split_timer >= 1:
+            split_timer = t
+            seg_speeds = {seg: rate for seg, start in running.items() if t >= start and rate}
+            min_seg_size = max(config.SEGMENT_SIZE, rate * 6)
+            candidates = sorted((seg for seg in running if seg.remaining > config.SEGMENT_SIZE * 2),
+                                key=lambda seg: seg.range[0])
+            seg, point = splitter.plan(candidates, seg_speeds, rate, min_seg_size)
+            if seg:
+                new_seg = SimSegment([point + 1, seg.range[1]])
+                seg.range = [seg.range[0], point]
+                segs.append(new_seg)
+                queue.append(new_seg)
+                splits += 1
+
+        # receive data
+        active = [seg for seg, start in running.items() if t >= start]
+        rate = int(min(speed, bandwidth / len(active))) if active else 0
+        for seg in active:
+            seg.current_size = min(seg.size, seg.current_size + rate * dt)
+            if not seg.remaining:
+                del running[seg]
+
+        t += dt
+
+        if preview_time is None and all(seg.current_size >= min(seg.size, preview_size - seg.range[0])
+                                        for seg in segs if seg.range[0] < preview_size):
+            preview_time = t
+
+        if not running and not queue:
+            return t, preview_time, splits
+
+
+def main():
+    parser = argparse.ArgumentParser(description='compare initial range plans in a simulated download')
+    parser.add_argument('--sizes', type=float, nargs='+', default=[2, 20, 200, 2000], help='file sizes in MB')
+    parser.add_argument('--links', nargs='+', default=list(LINKS), choices=list(LINKS), help='simulated links')
+    parser.add_argument('--connections', type=int, default=config.max_connections, help='max. connections')
+    parser.add_argument('--bandwidth', type=float, default=0,
+                        help='total bandwidth in MB/s, default is connection speed x connections')
+    parser.add_argument('--preview', type=float, default=0.05, help='ratio of file needed to start watching')
+    parser.add_argument('--general', action='store_true', help='plan a general file, i.e. without small first segments')
+    parser.add_argument('--dt', type=float, default=0.01, help='simulation time step in seconds')
+    args = parser.parse_args()
+
+    for name in args.links:
+        rtt, speed = link = LINKS[name]
+        bandwidth = args.bandwidth * 1_000_000 or speed * args.connections
+        print(f'link: {name}, rtt: {rtt * 1000:.0f} ms, connection speed: {format_bytes(speed)}/s, '
+              f'bandwidth: {format_bytes(bandwidth)}/s, connections: {args.connections}')
+
+        for size in args.sizes:
+            size = int(size * 1_000_000)
+            plans = {
+                'fixed': fixed_plan(size, config.SEGMENT_SIZE),
+                'adaptive': get_range_list(size, config.SEGMENT_SIZE, connections=args.connections,
+                                           preview=not args.general),
+                'learned': get_range_list(size, config.SEGMENT_SIZE, connections=args.connections, rtt=rtt,
+                                          speed=speed, preview=not args.general),
+            }
+
+            for plan, range_list in plans.items():
+                total, preview, splits = simulate(range_list, link, args.connections, bandwidth,
+                                                  size * args.preview, args.dt)
+                print(f'    {format_bytes(size):>10} {plan:>8}: {len(range_list):>2} segments, total {total:7.2f} s, '
+                      f'preview {preview:6.2f} s, {splits:>2} splits')
+        print()
+
+
+if __name__ == '__main__':
+    main()
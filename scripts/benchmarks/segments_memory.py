@@ -0,0 +1,84 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        benchmark, memory and scan time of segments of a huge HLS playlist, e.g. a 10-hour live archive, a synthetic
+        m3u8 document is parsed by video.MediaPlaylist, and segment list is built the same way as for a real download.
+
+        run this script on older revisions to compare, e.g.
+            python scripts/benchmarks/segments_memory.py --segments 50000 --encrypted
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from vortexdm.downloaditem import DownloadItem  # noqa: E402
+from vortexdm.video import MediaPlaylist  # noqa: E402
+
+
+def make_m3u8_doc(segments, encrypted=False):
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-PLAYLIST-TYPE:VOD', '#EXT-X-TARGETDURATION:2',
+             '#EXT-X-MEDIA-SEQUENCE:0']
+    if encrypted:
+        lines.append('#EXT-X-KEY:METHOD=AES-128,URI="https://keys.example.com/key.bin"')
+
+    for i in range(segments):
+        lines.append('#EXTINF:0.720,')
+        lines.append(f'https://cdn.example.com/live/archive/1080p/fragment_{i}.ts?token=abcdef0123456789')
+
+    lines.append('#EXT-X-ENDLIST')
+    return '\n'.join(lines)
+
+
+def build_segments(d, m3u8_doc):
+    # keep segments only, the same as a real download item
+    return MediaPlaylist(d, d.url, m3u8_doc, 'video').create_segment_list()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='measure memory and scan time of a huge hls segment list')
+    parser.add_argument('--segments', type=int, default=50000, help='number of playlist segments')
+    parser.add_argument('--encrypted', action='store_true', help='add an encryption key to playlist')
+    parser.add_argument('--scans', type=int, default=100, help='number of full segment list scans to time')
+    args = parser.parse_args()
+
+    m3u8_doc = make_m3u8_doc(args.segments, args.encrypted)
+    d = DownloadItem(url='https://cdn.example.com/live/archive/1080p/index.m3u8', name='archive.mp4',
+                     folder=tempfile.gettempdir())
+
+    start = time.perf_counter()
+    build_segments(d, m3u8_doc)
+    build_time = time.perf_counter() - start
+
+    # tracemalloc slows down allocations, build segments again to measure memory
+    tracemalloc.start()
+    segments = build_segments(d, m3u8_doc)
+    memory, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # the kind of full scans file_manager and thread_manager do
+    start = time.perf_counter()
+    for _ in range(args.scans):
+        _ = [seg for seg in segments if not seg.completed and not seg.downloaded]
+    scan_time = (time.perf_counter() - start) / args.scans
+
+    print(f'segments: {len(segments)} objects for {args.segments} playlist segments')
+    print(f'memory: {memory / 1024 / 1024:.1f} MB, {memory / len(segments):.0f} bytes per object, '
+          f'peak: {peak / 1024 / 1024:.1f} MB')
+    print(f'build time: {build_time:.2f} seconds')
+    print(f'scan time: {scan_time * 1000:.2f} ms per full scan')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        benchmark, startup time with a big downloads history, synthetic download items are saved in a temporary
+        settings folder, some of them unfinished with a resume journal and a temp file, then a controller is created
+        and downloads list is sent to a view by controller.get_d_list(), the same as at application startup, the view
+        only records what it receives.
+
+        "shown thumbnails" time is for thumbnails of the first "--shown" items, which the view asks for when they are
+        shown in downloads tab.
+
+        "eager" time adds loading every item's progress info and thumbnail, i.e. the work which startup used to do
+        for every item before they were loaded on demand.
+            python scripts/benchmarks/startup.py --items 10000
+"""
+
+import os
+import sys
+import time
+import base64
+import shutil
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from vortexdm import config, setting  # noqa: E402
+from vortexdm.controller import Controller  # noqa: E402
+from vortexdm.downloaditem import DownloadItem, Segment  # noqa: E402
+from vortexdm.utils import get_range_list  # noqa: E402
+
+
+def make_history(folder, items, unfinished_ratio, segments):
+    """save synthetic download items in downloads list store"""
+    downloads_folder = os.path.join(folder, 'downloads')
+    os.makedirs(downloads_folder)
+    thumbnail = base64.b64encode(os.urandom(3 * 1024))
+    size = 100 * 1024 * 1024
+    unfinished_every = round(1 / unfinished_ratio) if unfinished_ratio else 0
+
+    d_list = []
+    for i in range(items):
+        d = DownloadItem(url=f'https://cdn.example.com/files/file_{i}.bin', name=f'file_{i}.bin',
+                         folder=downloads_folder)
+        d.uid = f'uid_{i}'
+        d.size = size
+        d.resumable = True
+        d.thumbnail = thumbnail
+
+        if unfinished_every and i % unfinished_every == 0:
+            # unfinished item, resume journal with one record per segment, and a temp file
+            d.status = config.Status.cancelled
+            os.makedirs(d.temp_folder)
+            open(d.temp_file, 'wb').close()
+            d.segments = [Segment(name=os.path.join(d.temp_folder, str(n)), num=n, range=r, tempfile=d.temp_file,
+                                  direct=True) for n, r in enumerate(get_range_list(size, size // segments))]
+            d.save_progress_info()
+            d.segments = []
+        else:
+            d.status = config.Status.completed
+            d.downloaded = size
+
+        d_list.append(d)
+
+    setting.save_d(*d_list)
+
+
+class RecordingView:
+    """minimal view, it records downloads list and thumbnails sent by controller"""
+
+    def __init__(self, controller=None):
+        self.controller = controller
+        self.d_list = None
+        self.thumbnails = {}
+        self.d_list_received = threading.Event()
+        self.thumbnails_received = threading.Event()
+        self.expected_thumbnails = 0
+
+    def update_view(self, **kwargs):
+        if kwargs.get('command') == 'd_list':
+            self.d_list = kwargs['d_list']
+            self.d_list_received.set()
+
+        elif kwargs.get('thumbnail'):
+            self.thumbnails[kwargs['uid']] = kwargs['thumbnail']
+            if len(self.thumbnails) >= self.expected_thumbnails:
+                self.thumbnails_received.set()
+
+
+def load_list():
+    """create a controller, and wait till downloads list is sent to view, the same as application startup"""
+    controller = Controller(view_class=RecordingView)
+    controller.get_d_list()
+    controller.view.d_list_received.wait()
+    return controller
+
+
+def load_thumbnails(controller, uids):
+    """ask for thumbnails the same as view does for shown items, and wait for them"""
+    view = controller.view
+    view.expected_thumbnails = len(uids)
+    for uid in uids:
+        controller.get_thumbnail(uid=uid)
+    view.thumbnails_received.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='measure startup time with a big downloads history')
+    parser.add_argument('--items', type=int, default=10000, help='number of download items in history')
+    parser.add_argument('--unfinished', type=float, default=0.1, help='ratio of unfinished items')
+    parser.add_argument('--segments', type=int, default=50, help='number of segments of an unfinished item')
+    parser.add_argument('--shown', type=int, default=20, help='number of items shown in downloads tab')
+    args = parser.parse_args()
+
+    config.log_level = 0
+    folder = tempfile.mkdtemp(prefix='vortexdm_bench_')
+    config.sett_folder = folder
+
+    try:
+        make_history(folder, args.items, args.unfinished, args.segments)
+        setting.get_downloads_store().close()  # start cold, the same as a new process
+
+        start = time.perf_counter()
+        controller = load_list()
+        lazy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        load_thumbnails(controller, list(controller.d_map)[:args.shown])
+        shown_time = time.perf_counter() - start
+
+        # hydrate every item the way startup used to do
+        start = time.perf_counter()
+        for d in controller.d_map.values():
+            d.ensure_progress_info()
+            d.load_thumbnail(cache=False)
+        hydrate_time = time.perf_counter() - start
+
+        print(f'items: {len(controller.view.d_list)}, unfinished: {round(args.items * args.unfinished)}')
+        print(f'lazy startup: {lazy_time:.2f} seconds')
+        print(f'shown thumbnails: {shown_time:.2f} seconds, {len(controller.view.thumbnails)} items')
+        print(f'eager startup: {lazy_time + hydrate_time:.2f} seconds, progress info and thumbnails of all items')
+    finally:
+        setting.get_downloads_store().close()
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
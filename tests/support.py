@@ -0,0 +1,173 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        helpers for tests, a local http server which serves in-memory files with byte ranges, and a download
+        function which runs a download item thru brain the same as controller does.
+"""
+
+import os
+import sys
+import time
+import threading
+import contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from vortexdm import config  # noqa: E402
+
+# quiet logs while testing
+config.log_level = 0
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, the same as real servers
+
+    def do_HEAD(self):
+        self.respond(body=False)
+
+    def do_GET(self):
+        self.respond(body=True)
+
+    def respond(self, body):
+        server = self.server
+        data = server.files.get(self.path)
+        range_header = self.headers.get('Range')
+
+        with server.lock:
+            server.requests.append((self.path, range_header))
+            failures = server.failures.get(self.path)
+            code = failures.pop(0) if body and failures else None
+
+            if data is None:
+                code = 404
+            server.history.append((time.monotonic(), self.path, range_header, code))
+
+        if code:
+            self.send_response(code)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        start, end = 0, len(data) - 1
+        if range_header and range_header.startswith('bytes='):
+            first, _, last = range_header[6:].partition('-')
+            start = int(first)
+            end = min(int(last), end) if last else end
+
+        if range_header:
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(data)}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+
+        if not body:
+            return
+
+        chunk_size = 16 * 1024
+        delay = chunk_size / server.rate if server.rate else 0
+        try:
+            for pos in range(start, end + 1, chunk_size):
+                self.wfile.write(data[pos:min(pos + chunk_size, end + 1)])
+                if delay:
+                    time.sleep(delay)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class RangeServer(ThreadingHTTPServer):
+    """local http server for tests
+
+    Args:
+        files (dict): key=path, e.g. '/file.bin', value=bytes
+        rate (int): bytes/sec of each response, 0 means no limit
+    """
+    daemon_threads = True
+
+    def __init__(self, files, rate=0):
+        super().__init__(('127.0.0.1', 0), RangeHandler)
+        self.files = files
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.requests = []  # (path, range header) of every request
+        self.failures = {}  # key=path, value=list of http status codes sent to next GET requests instead of data
+        self.history = []  # (time.monotonic(), path, range header, error code or None) of every request
+
+    def url(self, path):
+        return f'http://127.0.0.1:{self.server_port}{path}'
+
+    def get_requests(self, path):
+        with self.lock:
+            return [r for p, r in self.requests if p == path]
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+@contextlib.contextmanager
+def config_override(**kwargs):
+    """set config values temporarily"""
+    saved = {k: getattr(config, k) for k in kwargs}
+    config.__dict__.update(kwargs)
+    try:
+        yield
+    finally:
+        config.__dict__.update(saved)
+
+
+def download(url, folder, **kwargs):
+    """download a url into folder thru brain, the same as controller does
+
+    Returns:
+        (ObservableDownloadItem): finished download item
+    """
+    from vortexdm.model import ObservableDownloadItem
+    from vortexdm.brain import brain
+
+    d = ObservableDownloadItem(folder=folder)
+    d.update(url)
+    for k, v in kwargs.items():
+        setattr(d, k, v)
+    brain(d)
+    return d
+
+
+def download_until(url, folder, downloaded, timeout=20):
+    """start downloading a url, and cancel it when "downloaded" bytes are received, e.g. to test resuming
+
+    Returns:
+        (ObservableDownloadItem): cancelled download item
+    """
+    from vortexdm.model import ObservableDownloadItem
+    from vortexdm.brain import brain
+
+    d = ObservableDownloadItem(folder=folder)
+    d.update(url)
+    t = threading.Thread(target=brain, args=(d,), daemon=True)
+    t.start()
+
+    deadline = time.time() + timeout
+    while d.downloaded < downloaded and t.is_alive() and time.time() < deadline:
+        time.sleep(0.01)
+
+    d.status = config.Status.cancelled
+    t.join(timeout)
+    return d
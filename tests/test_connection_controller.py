@@ -0,0 +1,133 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        tests for "throughput" connection controller, a simulated link is driven with a fake clock, the same way
+        thread_manager calls the controller.
+            python -m unittest discover tests
+"""
+
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from support import config_override
+
+from vortexdm import connections
+from vortexdm.connections import ThroughputController
+from vortexdm.scheduling import ErrorRecord
+from vortexdm.speedmeter import SpeedSnapshot
+
+MB = 1024 * 1024
+
+
+class Link:
+    """simulated link, "rate" is a function of connections number which returns total bytes/sec, and "receiving"
+    returns how many of these connections are receiving data, the others are idle, e.g. still connecting"""
+
+    def __init__(self, rate, receiving=None):
+        self.rate = rate
+        self.receiving = receiving or (lambda n: n)
+        self.now = 1000.0
+        self.downloaded = 0
+        self.clock = SimpleNamespace(time=lambda: self.now)
+        with mock.patch.object(connections, 'time', self.clock):
+            self.controller = ThroughputController()
+        self.limits = []  # limit after every update
+
+    def run(self, seconds, records=None):
+        """call controller every second for n seconds, records are reported with first call"""
+        c = self.controller
+        with mock.patch.object(connections, 'time', self.clock):
+            for _ in range(seconds):
+                self.now += 1
+                rate = self.rate(c.limit)
+                self.downloaded += rate
+                receiving = self.receiving(c.limit)
+                speed = SpeedSnapshot(self.now, rate, self.downloaded,
+                                      tuple((tag, rate // receiving) for tag in range(receiving)))
+                c.update(records or [], 0, speed, c.limit)
+                records = None
+                self.limits.append(c.limit)
+        return c.limit
+
+
+class ThroughputControllerTest(unittest.TestCase):
+    def setUp(self):
+        self.config = config_override(max_connections=8)
+        self.config.__enter__()
+
+    def tearDown(self):
+        self.config.__exit__(None, None, None)
+
+    def test_ramp_up(self):
+        # every connection adds the same bandwidth, controller climbs to max connections one step at a time
+        link = Link(rate=lambda n: n * MB)
+        self.assertEqual(link.run(60), 8)
+        self.assertEqual(link.limits[:5], [1, 1, 1, 2, 2])
+        self.assertTrue(all(b - a in (0, 1) for a, b in zip(link.limits, link.limits[1:])))
+
+        # never failed a probe, nothing learned
+        self.assertEqual(link.controller.learned_limit, 0)
+
+    def test_hold_when_no_gain(self):
+        # server gives at most 3 MB/s, the 4th connection doesn't add bandwidth
+        link = Link(rate=lambda n: min(n, 3) * MB)
+        while not link.controller.learned_limit and len(link.limits) < 60:
+            link.run(1)
+        self.assertEqual(link.controller.limit, 3)
+        self.assertEqual(link.controller.learned_limit, 3)
+        self.assertEqual(max(link.limits), 4)
+
+        # no probing during hold time
+        link.limits.clear()
+        link.run(ThroughputController.hold_time - 1)
+        self.assertEqual(set(link.limits), {3})
+
+        # probe again after hold time, and drop it again
+        link.run(30)
+        self.assertIn(4, link.limits)
+        self.assertEqual(link.controller.limit, 3)
+
+    def test_per_connection_ewma(self):
+        # 4 live workers but only 2 of them receive data at 2 MB/s each, a 5th connection which adds 0.8 MB/s is
+        # less than half of a busy connection's EWMA, aggregate / live workers would have taken it as 1 MB/s
+        link = Link(rate=lambda n: 4 * MB if n <= 4 else 4.8 * MB, receiving=lambda n: 2)
+        link.controller._limit = 4
+        link.run(20)
+        self.assertEqual(max(link.limits), 5)
+        self.assertEqual(link.controller.limit, 4)
+        self.assertEqual(link.controller.learned_limit, 4)
+
+    def test_back_off_on_throttling(self):
+        link = Link(rate=lambda n: n * MB)
+        self.assertEqual(link.run(60), 8)
+
+        # not found isn't a slow down request
+        link.run(1, records=[ErrorRecord(ErrorRecord.http, 404)])
+        self.assertEqual(link.controller.limit, 8)
+
+        # 503 cuts connections by half at once
+        link.run(1, records=[ErrorRecord(ErrorRecord.http, 503)])
+        self.assertEqual(link.controller.limit, 4)
+        self.assertEqual(link.controller.learned_limit, 4)
+
+        # 429 during hold time cuts again, and limit is kept till hold time ends
+        link.run(1, records=[ErrorRecord(ErrorRecord.http, 429)])
+        self.assertEqual(link.controller.limit, 2)
+        link.limits.clear()
+        link.run(ThroughputController.hold_time - 1)
+        self.assertEqual(set(link.limits), {2})
+
+        # then ramp up again
+        link.run(30)
+        self.assertGreater(link.controller.limit, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        tests for the shared curl cache, TLS sessions are resumed by new curl handles, and a reused curl handle keeps
+        working, files are served by a local https server with a self-signed certificate generated by "openssl"
+        command, tests are skipped if it isn't available.
+            python -m unittest discover tests
+"""
+
+import io
+import os
+import ssl
+import shutil
+import tempfile
+import subprocess
+import unittest
+from unittest import mock
+
+import pycurl
+
+from support import RangeServer, config_override
+
+from vortexdm import utils
+from vortexdm.utils import curl_stats, get_curl_share, set_curl_options
+
+FILE = b'x' * 10_000
+
+
+@unittest.skipUnless(shutil.which('openssl'), 'openssl command is not available')
+class CurlShareTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.mkdtemp()
+        cert, key = os.path.join(cls.folder, 'cert.pem'), os.path.join(cls.folder, 'key.pem')
+        subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj',
+                        '/CN=localhost', '-keyout', key, '-out', cert], check=True, capture_output=True)
+
+        cls.server = RangeServer({'/file.bin': FILE})
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        cls.server.socket = context.wrap_socket(cls.server.socket, server_side=True)
+        cls.server.__enter__()
+        cls.url = f'https://localhost:{cls.server.server_port}/file.bin'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.__exit__()
+        shutil.rmtree(cls.folder, ignore_errors=True)
+
+    def setUp(self):
+        self.config = config_override(ignore_ssl_cert=True)
+        self.config.__enter__()
+
+    def tearDown(self):
+        self.config.__exit__(None, None, None)
+
+    def counters(self):
+        return {k: getattr(curl_stats, k) for k in ('new_connections', 'tls_handshakes', 'tls_resumed')}
+
+    def test_tls_session_resumed(self):
+        self.assertIsNotNone(get_curl_share())
+
+        before = self.counters()
+        for _ in range(3):
+            # a fresh curl handle for every download
+            self.assertEqual(utils.download(self.url, decode=False), FILE)
+
+        counters = {k: v - before[k] for k, v in self.counters().items()}
+
+        # session is shared by the first download, or by a previous test
+        self.assertEqual(counters['new_connections'], 3)
+        self.assertLessEqual(counters['tls_handshakes'], 1)
+        self.assertEqual(counters['tls_handshakes'] + counters['tls_resumed'], 3)
+        self.assertGreaterEqual(counters['tls_resumed'], 2)
+
+    def test_reused_handle(self):
+        # workers reset their curl handle and set options again for every segment, share stays attached
+        c = pycurl.Curl()
+        with mock.patch.object(utils, 'log') as log:
+            for i in range(3):
+                c.reset()
+                set_curl_options(c)
+                buffer = io.BytesIO()
+                c.setopt(pycurl.URL, self.url)
+                c.setopt(pycurl.RANGE, f'{i * 100}-{i * 100 + 99}')
+                c.setopt(pycurl.WRITEDATA, buffer)
+                c.perform()
+
+                self.assertEqual(c.getinfo(pycurl.RESPONSE_CODE), 206)
+                self.assertEqual(buffer.getvalue(), FILE[i * 100:i * 100 + 100])
+                curl_stats.record(c)
+
+        c.close()
+        errors = [call for call in log.call_args_list if 'curl share error' in str(call)]
+        self.assertEqual(errors, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        tests for direct write, ranged segments are written in place into a preallocated temp file, and resumed
+        from their written bytes count.
+            python -m unittest discover tests
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from support import RangeServer, config_override, download, download_until
+
+from vortexdm.config import Status
+from vortexdm.downloaditem import DownloadItem
+from vortexdm.utils import preallocate_file
+
+FILE = random.Random(3).randbytes(3_000_000)
+
+
+class PreallocateTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_existing_data_is_kept(self):
+        fp = os.path.join(self.folder, 'temp')
+        with open(fp, 'wb') as f:
+            f.write(b'abc')
+
+        preallocate_file(fp, 1000)
+        self.assertEqual(os.path.getsize(fp), 1000)
+        with open(fp, 'rb') as f:
+            self.assertEqual(f.read(3), b'abc')
+
+        # never shrunk
+        preallocate_file(fp, 10)
+        self.assertEqual(os.path.getsize(fp), 1000)
+
+    def test_segments_share_preallocated_temp_file(self):
+        d = DownloadItem(folder=self.folder)
+        d.name = 'file.bin'
+        d.size = 30_000_000
+        d.resumable = True
+
+        with config_override(direct_write=True):
+            d.build_segments()
+            d.prepare_temp_files()
+
+        self.assertGreater(len(d.segments), 1)
+        self.assertTrue(all(seg.direct and seg.tempfile == d.temp_file for seg in d.segments))
+        self.assertEqual(os.path.getsize(d.temp_file), d.size)
+
+
+class DirectDownloadTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def read_target(self):
+        with open(os.path.join(self.folder, 'file.bin'), 'rb') as f:
+            return f.read()
+
+    def test_download(self):
+        with RangeServer({'/file.bin': FILE}) as server, config_override(direct_write=True):
+            d = download(server.url('/file.bin'), self.folder)
+            self.assertEqual(d.status, Status.completed)
+            self.assertEqual(self.read_target(), FILE)
+
+    def test_resume(self):
+        with RangeServer({'/file.bin': FILE}, rate=1_000_000) as server, config_override(direct_write=True):
+            url = server.url('/file.bin')
+            d = download_until(url, self.folder, downloaded=len(FILE) // 3)
+            self.assertEqual(d.status, Status.cancelled)
+            self.assertLess(d.downloaded, len(FILE))
+
+            server.requests.clear()
+            d = download(url, self.folder)
+            self.assertEqual(d.status, Status.completed)
+            self.assertEqual(self.read_target(), FILE)
+
+            # written bytes of first session aren't downloaded again
+            requested = 0
+            for range_header in server.get_requests('/file.bin'):
+                if range_header:
+                    start, end = range_header[6:].split('-')
+                    requested += int(end) - int(start) + 1
+            self.assertLess(requested, len(FILE) * 0.8)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        tests for pending downloads order, priority and "start next" are changed through controller, the same as
+        downloads tab's right click menu, files are downloaded from a local http server with one download slot.
+            python -m unittest discover tests
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from vortexdm import config  # noqa: E402
+from vortexdm.config import Status  # noqa: E402
+from vortexdm.controller import Controller  # noqa: E402
+from vortexdm.model import ObservableDownloadItem  # noqa: E402
+
+FILE_SIZE = 100_000
+
+
+class Handler(BaseHTTPRequestHandler):
+    """serve any path with FILE_SIZE bytes, requests are recorded and the first file is held when server is armed"""
+
+    def do_HEAD(self):
+        self.send_headers()
+
+    def do_GET(self):
+        server = self.server
+        if server.armed:
+            with server.lock:
+                if self.path not in server.requests:
+                    server.requests.append(self.path)
+            if self.path == '/1.bin':
+                server.first_requested.set()
+                server.release.wait(10)
+
+        self.send_headers()
+        self.wfile.write(b'x' * FILE_SIZE)
+
+    def send_headers(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(FILE_SIZE))
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class RecordingView:
+    """minimal view"""
+
+    def __init__(self, controller=None):
+        self.controller = controller
+
+    def update_view(self, **kwargs):
+        pass
+
+    def quit(self):
+        pass
+
+
+class DownloadOrderTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.saved_config = {k: getattr(config, k) for k in ('sett_folder', 'max_concurrent_downloads')}
+        config.sett_folder = self.folder
+        config.max_concurrent_downloads = 1
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.armed = False
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.first_requested = threading.Event()
+        self.server.release = threading.Event()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.controller = Controller(view_class=RecordingView, custom_settings={'ignore_dlist': True})
+
+    def tearDown(self):
+        self.server.release.set()
+        self.server.shutdown()
+        self.server.server_close()
+        config.__dict__.update(self.saved_config)
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def new_item(self, name):
+        d = ObservableDownloadItem(folder=self.folder)
+        d.update(f'http://127.0.0.1:{self.server.server_port}/{name}')
+        return d
+
+    def test_start_next_and_priority(self):
+        items = [self.new_item(f'{i}.bin') for i in range(1, 5)]
+        self.server.armed = True
+
+        # first item takes the only download slot, and is held by server till the others are queued
+        self.assertTrue(self.controller.download(items[0], silent=True))
+        self.assertTrue(self.server.first_requested.wait(10))
+        for d in items[1:]:
+            self.assertTrue(self.controller.download(d, silent=True))
+
+        self.controller.move_to_front(items[3].uid)
+        self.controller.set_priority(items[2].uid, 1)
+        self.assertEqual(self.controller.d_map[items[2].uid].priority, 1)
+
+        self.server.release.set()
+        deadline = time.time() + 30
+        while time.time() < deadline:
+            if all(self.controller.d_map[d.uid].status == Status.completed for d in items):
+                break
+            time.sleep(0.1)
+
+        self.assertEqual(self.server.requests, ['/1.bin', '/4.bin', '/3.bin', '/2.bin'])
+        for d in items:
+            self.assertEqual(os.path.getsize(os.path.join(self.folder, d.name)), FILE_SIZE)
+
+
+if __name__ == '__main__':
+    unittest.main()
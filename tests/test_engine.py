@@ -0,0 +1,94 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        tests for download engines, "threads" and "curl_multi" download the same file from a local server, and
+        curl_multi reactor's socket callback.
+            python -m unittest discover tests
+"""
+
+import os
+import random
+import shutil
+import socket
+import selectors
+import tempfile
+import unittest
+
+import pycurl
+
+from support import RangeServer, config_override, download
+
+from vortexdm.config import Status
+from vortexdm.engine import CurlMultiEngine
+
+FILE = random.Random(1).randbytes(3_000_000)
+
+
+class EngineDownloadTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def check_download(self, engine):
+        with RangeServer({'/file.bin': FILE}) as server, config_override(download_engine=engine):
+            d = download(server.url('/file.bin'), self.folder)
+
+            self.assertEqual(d.status, Status.completed)
+            with open(os.path.join(self.folder, 'file.bin'), 'rb') as f:
+                self.assertEqual(f.read(), FILE)
+
+            # file is planned in ranges, i.e. more than one connection
+            self.assertGreater(len(server.get_requests('/file.bin')), 1)
+
+    def test_threads(self):
+        self.check_download('threads')
+
+    def test_curl_multi(self):
+        self.check_download('curl_multi')
+
+
+class SocketCallbackTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = CurlMultiEngine()
+        self.sock, self.other = socket.socketpair()
+        self.fd = self.sock.fileno()
+
+    def tearDown(self):
+        self.sock.close()
+        self.other.close()
+
+    def registered_events(self):
+        key = self.engine.selector.get_map().get(self.fd)
+        return key.events if key else None
+
+    def test_watch_events(self):
+        self.engine._socket_callback(pycurl.POLL_IN, self.fd, None, None)
+        self.assertEqual(self.registered_events(), selectors.EVENT_READ)
+
+        self.engine._socket_callback(pycurl.POLL_INOUT, self.fd, None, None)
+        self.assertEqual(self.registered_events(), selectors.EVENT_READ | selectors.EVENT_WRITE)
+
+        self.engine._socket_callback(pycurl.POLL_REMOVE, self.fd, None, None)
+        self.assertIsNone(self.registered_events())
+
+    def test_poll_none(self):
+        # curl doesn't want events for now, socket is unwatched instead of raising inside curl's callback
+        self.engine._socket_callback(pycurl.POLL_OUT, self.fd, None, None)
+        self.engine._socket_callback(pycurl.POLL_NONE, self.fd, None, None)
+        self.assertIsNone(self.registered_events())
+
+        # unknown socket
+        self.engine._socket_callback(pycurl.POLL_NONE, self.fd, None, None)
+        self.assertIsNone(self.registered_events())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        tests for fragments batching, batch size decisions, and a worker downloading a batch of fragments on the
+        same curl handle.
+            python -m unittest discover tests
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from support import RangeServer
+
+from vortexdm.config import Status
+from vortexdm.downloaditem import DownloadItem, Segment
+from vortexdm.scheduling import FragmentBatcher, SchedulingContext
+from vortexdm.worker import Worker
+
+KB = 1024
+
+
+class RecordingContext(SchedulingContext):
+    """scheduling context which records segment's lock state when a failed segment is reported"""
+
+    def __init__(self, d=None):
+        super().__init__(d)
+        self.reported = []
+
+    def report_failed_job(self, seg):
+        self.reported.append((seg, seg.locked))
+        super().report_failed_job(seg)
+
+
+class FragmentBatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.batcher = FragmentBatcher()
+
+    def test_no_readings(self):
+        # first fragments are downloaded one by one to measure rtt and size
+        self.assertEqual(self.batcher.batch_size(1000, 4), 1)
+        self.assertEqual(self.batcher.batch_size(1000, 4, speed=1_000_000), 1)
+
+    def test_batch_size_from_fragment_time(self):
+        # 0.1 second per fragment, a batch takes about target_time
+        self.batcher.update([(0.05, 0.1, 100 * KB)])
+        self.assertEqual(self.batcher.batch_size(1000, 4), 20)
+
+        # slow fragments aren't batched
+        batcher = FragmentBatcher()
+        batcher.update([(0.5, 3, 100 * KB)])
+        self.assertEqual(batcher.batch_size(1000, 4), 1)
+
+    def test_batch_size_from_speed(self):
+        self.batcher.update([(0.1, 5, 100 * KB)])
+
+        # known speed is used instead of measured fragment time, i.e. rtt + transfer time: 0.1 + 0.1 seconds
+        self.assertEqual(self.batcher.batch_size(1000, 4, speed=1000 * KB), 10)
+
+        # unknown speed
+        self.assertEqual(self.batcher.batch_size(1000, 4, speed=0), 1)
+
+    def test_fair_share(self):
+        self.batcher.update([(0.001, 0.01, 10 * KB)])
+        self.assertEqual(self.batcher.batch_size(10_000, 4), self.batcher.max_size)
+
+        # all connections get a share of remaining fragments
+        self.assertEqual(self.batcher.batch_size(100, 4), 25)
+        self.assertEqual(self.batcher.batch_size(101, 4), 26)
+        self.assertEqual(self.batcher.batch_size(3, 4), 1)
+        self.assertEqual(self.batcher.batch_size(0, 4), 1)
+        self.assertEqual(self.batcher.batch_size(100, 0), self.batcher.max_size)
+
+    def test_smoothing(self):
+        self.batcher.update([(0.1, 1, 1000)])
+        self.assertEqual((self.batcher.rtt, self.batcher.fragment_time, self.batcher.fragment_size), (0.1, 1, 1000))
+
+        # a new reading moves averages by smoothing weight, unknown size isn't counted
+        self.batcher.update([(0.6, 2, 0)])
+        self.assertAlmostEqual(self.batcher.rtt, 0.2)
+        self.assertAlmostEqual(self.batcher.fragment_time, 1.2)
+        self.assertEqual(self.batcher.fragment_size, 1000)
+
+
+class WorkerBatchTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_batch(self):
+        files = {f'/frag{i}.ts': os.urandom(20 * KB) for i in range(5)}
+        with RangeServer(files) as server:
+            # third fragment fails
+            server.failures['/frag2.ts'] = [500]
+
+            d = DownloadItem(folder=self.folder)
+            d.status = Status.downloading
+            segments = [Segment(name=os.path.join(self.folder, f'frag{i}.ts'), url=server.url(f'/frag{i}.ts'), d=d)
+                        for i in range(5)]
+
+            ctx = RecordingContext(d)
+            worker = Worker(tag=1, d=d, ctx=ctx)
+            self.assertTrue(worker.reuse(seg=segments[0], batch=segments[1:]))
+            self.assertTrue(all(seg.locked for seg in segments))
+            worker.run()
+
+            # fragments before the failed one are downloaded on one connection
+            for i in range(2):
+                self.assertTrue(segments[i].downloaded)
+                with open(segments[i].name, 'rb') as f:
+                    self.assertEqual(f.read(), files[f'/frag{i}.ts'])
+            self.assertEqual(len(worker.transfers), 2)
+            self.assertEqual(len(server.requests), 3)
+
+            # failed fragment and rest of batch are given back unlocked, each one as a separate job
+            self.assertEqual(ctx.reported, [(segments[2], False), (segments[3], False), (segments[4], False)])
+            self.assertEqual(ctx.get_failed_jobs(), segments[2:])
+            self.assertFalse(any(seg.locked for seg in segments))
+            self.assertFalse(any(seg.downloaded for seg in segments[2:]))
+
+    def test_locked_batch_is_refused(self):
+        d = DownloadItem(folder=self.folder)
+        segments = [Segment(name=os.path.join(self.folder, f'frag{i}.ts'), url='http://example.com', d=d)
+                    for i in range(3)]
+        segments[2].locked = True
+
+        worker = Worker(tag=1, d=d)
+        self.assertFalse(worker.reuse(seg=segments[0], batch=segments[1:]))
+        self.assertFalse(segments[0].locked)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        tests for in-process decryption of AES-128 hls segments, and post processing of merged hls temp files.
+            python -m unittest discover tests
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import support  # noqa: F401, quiet logs
+
+from vortexdm import aes, video
+from vortexdm.config import Status
+from vortexdm.downloaditem import Segment
+from vortexdm.video import MediaPlaylist, decrypt_hls_segment, post_process_hls
+
+KEY = bytes(range(16))
+EXPLICIT_IV = bytes.fromhex('8f6109d91fffb816bcd43fefe018db49')
+
+PLAYLIST = '''#EXTM3U
+#EXT-X-VERSION:3
+#EXT-X-TARGETDURATION:10
+#EXT-X-MEDIA-SEQUENCE:7
+#EXT-X-KEY:METHOD=AES-128,URI="key.bin"
+#EXTINF:10.0,
+seg0.ts
+#EXTINF:10.0,
+seg1.ts
+#EXT-X-KEY:METHOD=AES-128,URI="key.bin",IV=0x8f6109d91fffb816bcd43fefe018db49
+#EXTINF:10.0,
+seg2.ts
+#EXT-X-KEY:METHOD=NONE
+#EXTINF:10.0,
+seg3.ts
+#EXT-X-ENDLIST
+'''
+
+
+def encrypt(data, key, iv):
+    """AES-128 CBC with PKCS7 padding, the same as hls servers"""
+    from Cryptodome.Cipher import AES
+    pad = 16 - len(data) % 16
+    return AES.new(key, AES.MODE_CBC, iv).encrypt(data + bytes([pad]) * pad)
+
+
+def has_cryptodome():
+    try:
+        import Cryptodome.Cipher  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+@unittest.skipUnless(aes.available and has_cryptodome(), 'AES package is not installed')
+class DecryptTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_aes_cbc_decrypt(self):
+        iv = b'\x01' * 16
+        for data in (b'', b'x' * 15, b'y' * 16, os.urandom(1000)):
+            self.assertEqual(aes.aes_cbc_decrypt(encrypt(data, KEY, iv), KEY, iv), data)
+
+        with self.assertRaises(ValueError):
+            aes.aes_cbc_decrypt(b'x' * 16, b'short key', iv)
+
+    def test_decrypt_hls_segment(self):
+        d = SimpleNamespace(temp_folder=self.folder, subtype_list=['hls', 'encrypted'])
+        playlist = MediaPlaylist(d, 'http://example.com/video/index.m3u8', PLAYLIST, 'video')
+        segments = playlist.segments
+
+        self.assertEqual([seg.media_sequence for seg in segments], [7, 8, 9, 10])
+        self.assertEqual(segments[0].url, 'http://example.com/video/seg0.ts')
+        self.assertEqual(segments[0].key.url, 'http://example.com/video/key.bin')
+
+        # METHOD=NONE ends encryption of following segments
+        self.assertIsNone(segments[3].key)
+
+        # no IV attribute, media sequence number is the IV, otherwise IV attribute is used
+        ivs = [(7).to_bytes(16, 'big'), (8).to_bytes(16, 'big'), EXPLICIT_IV]
+        plain = [f'segment {i} '.encode() * (100 + i) for i in range(4)]
+        for seg, iv, data in zip(segments, ivs, plain):
+            with open(seg.key.name, 'wb') as f:
+                f.write(KEY)
+            with open(seg.name, 'wb') as f:
+                f.write(encrypt(data, KEY, iv))
+
+        for seg, data in zip(segments[:3], plain):
+            self.assertEqual(decrypt_hls_segment(seg), data)
+
+
+class PostProcessTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.temp_file = os.path.join(self.folder, '_temp_video.mp4')
+        with open(self.temp_file, 'wb') as f:
+            f.write(b'mpeg-ts data')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def new_item(self, merge=True):
+        seg = Segment(name=os.path.join(self.folder, 'seg_1.ts'), merge=merge)
+        return SimpleNamespace(name='video.mp4', temp_folder=self.folder, temp_file=self.temp_file,
+                               audio_file=os.path.join(self.folder, '_temp_audio.mp4'), subtype_list=['hls'],
+                               type='video', segments=[seg], status=Status.processing)
+
+    def test_remux(self):
+        def ffmpeg(cmd, d):
+            # write output file, i.e. last argument
+            with open(cmd.rsplit('"file:', 1)[1][:-1], 'wb') as f:
+                f.write(b'mp4 data')
+            return 0, ''
+
+        with mock.patch.object(video, 'run_ffmpeg', ffmpeg):
+            self.assertTrue(post_process_hls(self.new_item()))
+
+        with open(self.temp_file, 'rb') as f:
+            self.assertEqual(f.read(), b'mp4 data')
+        self.assertEqual(os.listdir(self.folder), ['_temp_video.mp4'])
+
+    def test_remux_failure(self):
+        with mock.patch.object(video, 'run_ffmpeg', return_value=(1, 'ffmpeg error')) as run_ffmpeg:
+            self.assertFalse(post_process_hls(self.new_item()))
+
+        # fast and slow commands are tried, temp file is kept as is
+        self.assertEqual(run_ffmpeg.call_count, 2)
+        with open(self.temp_file, 'rb') as f:
+            self.assertEqual(f.read(), b'mpeg-ts data')
+
+    def test_m3u8_failure(self):
+        # segments weren't merged, ffmpeg processes local m3u8 file
+        with mock.patch.object(video, 'run_ffmpeg', return_value=(1, 'ffmpeg error')):
+            self.assertFalse(post_process_hls(self.new_item(merge=False)))
+
+    def test_no_remux_for_mpeg_ts(self):
+        d = self.new_item()
+        d.temp_file = os.path.join(self.folder, '_temp_video.ts')
+        with mock.patch.object(video, 'run_ffmpeg') as run_ffmpeg:
+            self.assertTrue(post_process_hls(d))
+        run_ffmpeg.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        tests for hls encryption keys, every key file is downloaded once per key URI, and resume info of per-segment
+        keys saved by older versions isn't counted.
+            python -m unittest discover tests
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+import support  # noqa: F401, quiet logs
+
+from vortexdm.downloaditem import DownloadItem, Segment
+from vortexdm.journal import ProgressJournal
+from vortexdm.video import Key, MediaPlaylist
+
+# the same key tag repeated before every segment, then key rotation, then a known URI with a new IV, then no
+# encryption
+PLAYLIST = '''#EXTM3U
+#EXT-X-VERSION:3
+#EXT-X-TARGETDURATION:10
+#EXT-X-MEDIA-SEQUENCE:0
+#EXT-X-KEY:METHOD=AES-128,URI="k1.bin"
+#EXTINF:10.0,
+s0.ts
+#EXT-X-KEY:METHOD=AES-128,URI="k1.bin"
+#EXTINF:10.0,
+s1.ts
+#EXT-X-KEY:METHOD=AES-128,URI="k1.bin"
+#EXTINF:10.0,
+s2.ts
+#EXT-X-KEY:METHOD=AES-128,URI="k2.bin"
+#EXTINF:10.0,
+s3.ts
+#EXT-X-KEY:METHOD=AES-128,URI="k1.bin",IV=0x00000000000000000000000000000001
+#EXTINF:10.0,
+s4.ts
+#EXT-X-KEY:METHOD=NONE
+#EXTINF:10.0,
+s5.ts
+#EXT-X-ENDLIST
+'''
+
+
+class KeyDedupTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.d = SimpleNamespace(temp_folder=self.folder, temp_file=os.path.join(self.folder, 'temp.mp4'),
+                                 audio_file=os.path.join(self.folder, 'audio.mp4'), subtype_list=['hls', 'encrypted'])
+        self.playlist = MediaPlaylist(self.d, 'http://example.com/index.m3u8', PLAYLIST, 'video')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_keys(self):
+        segments = self.playlist.segments
+        keys = [seg.key for seg in segments]
+
+        # repeated tag doesn't make a new key
+        self.assertIs(keys[0], keys[1])
+        self.assertIs(keys[1], keys[2])
+        self.assertIsNot(keys[2], keys[3])
+        self.assertIsNone(keys[5])
+
+        # one key file per URI
+        self.assertEqual(list(self.playlist.keys), ['http://example.com/k1.bin', 'http://example.com/k2.bin'])
+        self.assertIs(keys[4].source, keys[0])
+        self.assertEqual(keys[4].iv, '0x00000000000000000000000000000001')
+        self.assertEqual(keys[4].name, keys[0].name)
+        self.assertNotEqual(keys[3].name, keys[0].name)
+
+    def test_segment_list(self):
+        segment_list = self.playlist.create_segment_list()
+        names = [os.path.basename(seg.name) for seg in segment_list]
+
+        # every key file is downloaded once, before first segment which needs it, keys are never merged
+        self.assertEqual(names, ['video_key_1.key', 'video_seg_1.ts', 'video_seg_2.ts', 'video_seg_3.ts',
+                                 'video_key_2.key', 'video_seg_4.ts', 'video_seg_5.ts', 'video_seg_6.ts'])
+        self.assertEqual([seg.merge for seg in segment_list if isinstance(seg, Key)], [False, False])
+        self.assertTrue(all(seg.tempfile == self.d.temp_file for seg in segment_list))
+
+    def test_local_m3u8(self):
+        doc = self.playlist.create_local_m3u8_doc()
+        key_lines = [line for line in doc.splitlines() if line.startswith('#EXT-X-KEY')]
+
+        # key tag is written only when key changes, it applies to all following segments
+        self.assertEqual(len(key_lines), 4)
+        self.assertIn(self.playlist.keys['http://example.com/k1.bin'].name, key_lines[0])
+        self.assertIn('IV=0x00000000000000000000000000000001', key_lines[2])
+        self.assertIn(self.playlist.keys['http://example.com/k1.bin'].name, key_lines[2])
+        self.assertEqual(key_lines[3], '#EXT-X-KEY:METHOD=NONE')
+
+
+class StaleKeyRecordsTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_stale_records_not_counted(self):
+        d = DownloadItem(folder=self.folder)
+        d.name = 'video.mp4'
+        d.subtype_list = ['hls']
+        os.makedirs(d.temp_folder, exist_ok=True)
+
+        d.segments = [Segment(name=os.path.join(d.temp_folder, f'video_seg_{i}.ts'), d=d) for i in range(3)]
+        for seg in d.segments[:2]:
+            with open(seg.name, 'wb') as f:
+                f.write(b'x' * 1000)
+
+        # previous session had a key file of its own for every segment
+        old_key = Segment(name=d.segments[0].name + '.key')
+        with open(old_key.name, 'wb') as f:
+            f.write(b'k' * 16)
+        ProgressJournal(d.temp_folder).write_snapshot(d.segments + [old_key])
+
+        d.load_progress_info()
+        self.assertEqual(d.downloaded, 2000)
+
+
+if __name__ == '__main__':
+    unittest.main()
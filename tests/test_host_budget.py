@@ -0,0 +1,106 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        tests for per-host connection budget shared by all download items.
+            python -m unittest discover tests
+"""
+
+import unittest
+from types import SimpleNamespace
+
+from support import config_override
+
+from vortexdm.connections import HostConnectionBudget
+
+
+class Context:
+    """records signals sent by budget to a waiting download item"""
+
+    def __init__(self):
+        self.signals = 0
+
+    def signal(self):
+        self.signals += 1
+
+
+class HostConnectionBudgetTest(unittest.TestCase):
+    def setUp(self):
+        self.budget = HostConnectionBudget()
+        self.d1, self.d2 = SimpleNamespace(uid='d1'), SimpleNamespace(uid='d2')
+        self.ctx1, self.ctx2 = Context(), Context()
+
+    def acquire(self, d, ctx, n, host='example.com'):
+        """try to acquire n slots, return number of acquired slots"""
+        return sum(self.budget.acquire(d, host, ctx) for _ in range(n))
+
+    def test_get_host(self):
+        self.assertEqual(HostConnectionBudget.get_host('https://Cdn.Example.com:8080/file.bin'), 'cdn.example.com')
+        self.assertEqual(HostConnectionBudget.get_host(''), '')
+
+    def test_limit(self):
+        with config_override(max_connections_per_host=4, host_connection_limits={'*.example.com': 2}):
+            self.assertEqual(self.budget.get_limit('example.org'), 4)
+            self.assertEqual(self.budget.get_limit('cdn.example.com'), 2)
+
+            self.assertEqual(self.acquire(self.d1, self.ctx1, 10, host='cdn.example.com'), 2)
+            self.assertEqual(self.acquire(self.d1, self.ctx1, 10, host='example.org'), 4)
+            self.assertEqual(self.budget.used('cdn.example.com'), 2)
+
+        # zero means no limit
+        with config_override(max_connections_per_host=0, host_connection_limits={}):
+            self.assertEqual(self.acquire(self.d2, self.ctx2, 50), 50)
+
+    def test_acquire_release(self):
+        with config_override(max_connections_per_host=4, host_connection_limits={}):
+            self.assertEqual(self.acquire(self.d1, self.ctx1, 4), 4)
+
+            # host is full, second item waits, and it is signaled when a slot is released
+            self.assertFalse(self.budget.acquire(self.d2, 'example.com', self.ctx2))
+            self.budget.release(self.d1, 'example.com')
+            self.assertEqual(self.ctx2.signals, 1)
+            self.assertTrue(self.budget.acquire(self.d2, 'example.com', self.ctx2))
+            self.assertEqual(self.budget.used('example.com'), 4)
+
+            # releasing a slot which isn't used changes nothing
+            self.budget.release(self.d2, 'other.com')
+            self.assertEqual(self.budget.used('example.com'), 4)
+
+    def test_fair_share(self):
+        with config_override(max_connections_per_host=4, host_connection_limits={}):
+            self.assertEqual(self.acquire(self.d1, self.ctx1, 4), 4)
+            self.assertEqual(self.acquire(self.d2, self.ctx2, 1), 0)
+
+            # first item has more than its fair share while second item is waiting, a released slot goes to the
+            # waiting item, i.e. first item can't take it back
+            for _ in range(2):
+                self.budget.release(self.d1, 'example.com')
+                self.assertFalse(self.budget.acquire(self.d1, 'example.com', self.ctx1))
+                self.assertTrue(self.budget.acquire(self.d2, 'example.com', self.ctx2))
+
+                # second item asks for more, host is full again
+                self.assertFalse(self.budget.acquire(self.d2, 'example.com', self.ctx2))
+
+            # now both have their share, 2 slots each
+            self.budget.release(self.d1, 'example.com')
+            self.assertTrue(self.budget.acquire(self.d1, 'example.com', self.ctx1))
+
+    def test_unregister(self):
+        with config_override(max_connections_per_host=2, host_connection_limits={}):
+            self.assertEqual(self.acquire(self.d1, self.ctx1, 2), 2)
+            self.assertFalse(self.budget.acquire(self.d2, 'example.com', self.ctx2))
+
+            # finished download item releases all its slots at once
+            self.budget.unregister(self.d1)
+            self.assertEqual(self.budget.used('example.com'), 0)
+            self.assertEqual(self.ctx2.signals, 1)
+            self.assertEqual(self.acquire(self.d2, self.ctx2, 2), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
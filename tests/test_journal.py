@@ -0,0 +1,160 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        tests for resume journal, replaying records, compaction, interrupted writes, and progress_info.txt written by
+        older versions.
+            python -m unittest discover tests
+"""
+
+import os
+import json
+import random
+import shutil
+import tempfile
+import unittest
+
+from support import RangeServer, download, download_until
+
+from vortexdm.config import Status
+from vortexdm.downloaditem import Segment
+from vortexdm.journal import ProgressJournal
+
+FILE = random.Random(10).randbytes(8_000_000)
+
+
+class ProgressJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.journal = ProgressJournal(self.folder)
+        self.segments = [Segment(name=os.path.join(self.folder, str(i)), range=[i * 100, i * 100 + 99])
+                         for i in range(5)]
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def lines(self):
+        with open(self.journal.fp) as f:
+            return f.readlines()
+
+    def test_replay(self):
+        seg0, seg3 = self.segments[0], self.segments[3]
+
+        # first append writes a full snapshot
+        seg0.written = 10
+        self.journal.append([seg0], self.segments)
+        self.assertEqual(len(self.lines()), 5)
+
+        # then only changed segments are appended, later records override older ones
+        seg0.written = 100
+        seg0.downloaded = True
+        seg3.written = 50
+        self.journal.append([seg0, seg3], self.segments)
+        self.assertEqual(len(self.lines()), 7)
+
+        # a segment which isn't in the snapshot, e.g. made by auto segmentation, is added in order of appearance
+        new_seg = Segment(name=os.path.join(self.folder, '5'), range=[500, 599])
+        self.journal.append([new_seg], self.segments + [new_seg])
+
+        data = ProgressJournal(self.folder).load()
+        self.assertEqual([item['name'] for item in data], [seg.name for seg in self.segments + [new_seg]])
+        self.assertEqual([item['written'] for item in data], [100, None, None, 50, None, None])
+        self.assertTrue(data[0]['downloaded'])
+        self.assertEqual(data[3]['_range'], [300, 399])
+
+    def test_interrupted_write(self):
+        self.journal.write_snapshot(self.segments)
+
+        # process killed while appending a record
+        with open(self.journal.fp, 'a') as f:
+            f.write('{"name": "' + self.segments[1].name + '", "writ')
+
+        journal = ProgressJournal(self.folder)
+        data = journal.load()
+        self.assertEqual(len(data), 5)
+        self.assertIsNone(data[1]['written'])
+
+        # next record isn't glued to the broken line, journal starts over with a snapshot
+        self.segments[1].written = 20
+        journal.append([self.segments[1]], self.segments)
+        self.assertEqual(len(self.lines()), 5)
+        self.assertEqual(ProgressJournal(self.folder).load()[1]['written'], 20)
+
+    def test_compaction(self):
+        self.journal.min_compaction_records = 10
+        self.journal.write_snapshot(self.segments)
+
+        max_lines = 0
+        for i in range(100):
+            seg = self.segments[i % 5]
+            seg.written = i
+            self.journal.append([seg], self.segments)
+            max_lines = max(max_lines, len(self.lines()))
+
+        # journal never grows beyond its limit, and compaction keeps the latest values
+        self.assertLessEqual(max_lines, 10)
+        self.assertFalse(os.path.exists(self.journal.fp + '.tmp'))
+        data = ProgressJournal(self.folder).load()
+        self.assertEqual([item['written'] for item in data], [95, 96, 97, 98, 99])
+
+    def test_legacy_progress_info(self):
+        legacy_fp = os.path.join(self.folder, ProgressJournal.legacy_file_name)
+        info = [{'name': seg.name, '_range': seg.range, 'written': 7} for seg in self.segments]
+        with open(legacy_fp, 'w') as f:
+            json.dump(info, f)
+
+        self.assertEqual(self.journal.load(), info)
+
+        # first snapshot replaces old progress info file
+        self.journal.write_snapshot(self.segments)
+        self.assertFalse(os.path.exists(legacy_fp))
+        self.assertEqual(len(self.journal.load()), 5)
+
+    def test_no_progress_info(self):
+        self.assertIsNone(self.journal.load())
+
+
+class ResumeTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_resume_from_legacy_progress_info(self):
+        with RangeServer({'/file.bin': FILE}, rate=1_000_000) as server:
+            url = server.url('/file.bin')
+            d = download_until(url, self.folder, len(FILE) // 3)
+            self.assertEqual(d.status, Status.cancelled)
+
+            # convert journal into progress_info.txt as written by older versions
+            journal = ProgressJournal(d.temp_folder)
+            info = journal.load()
+            os.remove(journal.fp)
+            with open(os.path.join(d.temp_folder, ProgressJournal.legacy_file_name), 'w') as f:
+                json.dump(info, f)
+
+            first_session = len(server.requests)
+            server.rate = 0
+            d = download(url, self.folder)
+
+            self.assertEqual(d.status, Status.completed)
+            with open(os.path.join(self.folder, 'file.bin'), 'rb') as f:
+                self.assertEqual(f.read(), FILE)
+
+            # already downloaded data isn't requested again
+            requested = 0
+            for range_header in server.get_requests('/file.bin')[first_session:]:
+                if range_header:
+                    start, end = range_header[6:].split('-')
+                    requested += int(end or len(FILE) - 1) - int(start) + 1
+            self.assertLess(requested, 0.8 * len(FILE))
+
+
+if __name__ == '__main__':
+    unittest.main()
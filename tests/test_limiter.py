@@ -0,0 +1,160 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        tests for bandwidth limiter, simulated connections receive data with a fake clock and wait as long as the
+        limiter tells them, the same as workers do.
+            python -m unittest discover tests
+"""
+
+import heapq
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from support import config_override
+
+from vortexdm import limiter as limiter_module
+from vortexdm.limiter import BandwidthLimiter, TokenBucket
+
+KB = 1024
+MB = 1024 * 1024
+CHUNK = 16 * KB
+
+
+class Item(SimpleNamespace):
+    """download item with the attributes used by limiter"""
+
+    def __init__(self, uid, speed_limit=0, bandwidth_weight=1):
+        super().__init__(uid=uid, speed_limit=speed_limit, bandwidth_weight=bandwidth_weight)
+
+
+def simulate(items, duration, connections=4, stop=None):
+    """every item's connections receive CHUNK bytes whenever limiter allows
+
+    Args:
+        items (list): Item objects
+        duration (float): simulated seconds
+        connections (int): connections per item
+        stop (dict): key=item uid, value=time when item stops receiving data
+
+    Returns:
+        (dict): key=item uid, value=list of (time, bytes) of every chunk
+    """
+    stop = stop or {}
+    clock = SimpleNamespace(now=0.0)
+    fake_time = SimpleNamespace(monotonic=lambda: clock.now)
+    received = {d.uid: [] for d in items}
+
+    with mock.patch.object(limiter_module, 'time', fake_time):
+        limiter = BandwidthLimiter()
+
+        # heap of (time, counter, item), counter keeps order of same time entries
+        heap = [(0.0, i * connections + c, d) for i, d in enumerate(items) for c in range(connections)]
+        heapq.heapify(heap)
+        counter = len(heap)
+
+        while heap:
+            now, _, d = heapq.heappop(heap)
+            if now >= min(duration, stop.get(d.uid, duration)):
+                continue
+
+            clock.now = now
+            received[d.uid].append((now, CHUNK))
+            delay = limiter.consume(d, CHUNK)
+
+            # a connection which isn't told to wait receives next chunk after a short while
+            counter += 1
+            heapq.heappush(heap, (now + max(delay, 0.001), counter, d))
+
+    return received
+
+
+def rate(chunks, start, end):
+    """bytes/sec received during [start, end)"""
+    return sum(n for t, n in chunks if start <= t < end) / (end - start)
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_debt(self):
+        bucket = TokenBucket(rate=1000, burst=0.25)
+        bucket.timestamp = 0
+
+        # consumer is told how long to wait till debt is paid off
+        self.assertAlmostEqual(bucket.consume(500, 0), 0.5)
+        self.assertAlmostEqual(bucket.consume(0, 0.25), 0.25)
+        self.assertEqual(bucket.consume(0, 0.5), 0)
+
+    def test_burst(self):
+        bucket = TokenBucket(rate=1000, burst=0.25)
+        bucket.timestamp = 0
+
+        # idle time fills the bucket only up to its capacity
+        self.assertEqual(bucket.consume(250, 10), 0)
+        self.assertAlmostEqual(bucket.consume(100, 10), 0.1)
+
+    def test_unlimited(self):
+        bucket = TokenBucket(rate=0)
+        self.assertEqual(bucket.consume(10 * MB, 1), 0)
+        self.assertEqual(bucket.tokens, 0)
+
+
+class BandwidthLimiterTest(unittest.TestCase):
+    def test_not_limited(self):
+        with config_override(speed_limit=0):
+            self.assertEqual(BandwidthLimiter().consume(Item('a'), MB), 0)
+
+    def test_total_rate(self):
+        # global limit is the total of all downloads, regardless of number of downloads or connections
+        items = [Item(uid) for uid in 'abc']
+        with config_override(speed_limit=2 * MB):
+            received = simulate(items, duration=10, connections=8)
+
+        total = sum(rate(chunks, 1, 10) for chunks in received.values())
+        self.assertAlmostEqual(total / (2 * MB), 1, delta=0.02)
+
+        # equal weights, equal shares
+        for chunks in received.values():
+            self.assertAlmostEqual(rate(chunks, 1, 10) / (2 * MB / 3), 1, delta=0.05)
+
+    def test_weights(self):
+        items = [Item('a', bandwidth_weight=3), Item('b'), Item('c')]
+        with config_override(speed_limit=5 * MB):
+            received = simulate(items, duration=10)
+
+        rates = {uid: rate(chunks, 1, 10) for uid, chunks in received.items()}
+        self.assertAlmostEqual(rates['a'] / (3 * MB), 1, delta=0.05)
+        self.assertAlmostEqual(rates['b'] / MB, 1, delta=0.05)
+        self.assertAlmostEqual(rates['c'] / MB, 1, delta=0.05)
+
+    def test_redistribution(self):
+        # when a download stops, its share is used by the others at once, nothing is reserved for it
+        items = [Item('a'), Item('b')]
+        with config_override(speed_limit=2 * MB):
+            received = simulate(items, duration=10, stop={'a': 5})
+
+        self.assertAlmostEqual(rate(received['b'], 1, 5) / MB, 1, delta=0.05)
+        self.assertAlmostEqual(rate(received['b'], 6, 10) / (2 * MB), 1, delta=0.05)
+
+    def test_item_speed_limit(self):
+        # download item's own cap, the rest of global rate goes to the other download
+        items = [Item('a', speed_limit=500 * KB), Item('b')]
+        with config_override(speed_limit=2 * MB):
+            received = simulate(items, duration=10)
+
+        self.assertAlmostEqual(rate(received['a'], 1, 10) / (500 * KB), 1, delta=0.05)
+        self.assertAlmostEqual(rate(received['b'], 1, 10) / (1.5 * MB), 1, delta=0.05)
+
+        # own cap without a global limit
+        with config_override(speed_limit=0):
+            received = simulate(items[:1], duration=10)
+        self.assertAlmostEqual(rate(received['a'], 1, 10) / (500 * KB), 1, delta=0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
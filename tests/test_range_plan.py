@@ -0,0 +1,101 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        tests for initial range plans, segments cover the whole file, every connection gets an equal share, and
+        preview plans start with a small segment.
+            python -m unittest discover tests
+"""
+
+import itertools
+import unittest
+
+import support  # noqa: F401, quiet logs
+
+from vortexdm.config import SEGMENT_SIZE
+from vortexdm.utils import get_range_list
+
+SIZES = [1, 1000, SEGMENT_SIZE * 20, 2_000_000, 20_000_000, 123_456_789, 2_000_000_000]
+CONNECTIONS = [1, 2, 3, 10, 32]
+LINKS = [(0, 0), (0.002, 20_000_000), (0.03, 2_000_000), (0.15, 300_000)]
+
+
+def plans(preview):
+    for file_size, connections, (rtt, speed) in itertools.product(SIZES, CONNECTIONS, LINKS):
+        range_list = get_range_list(file_size, SEGMENT_SIZE, connections=connections, rtt=rtt, speed=speed,
+                                    preview=preview)
+        yield (file_size, connections, rtt, speed), range_list
+
+
+class RangePlanTest(unittest.TestCase):
+    def test_whole_file(self):
+        for preview in (True, False):
+            for args, range_list in plans(preview):
+                file_size = args[0]
+                with self.subTest(args=args, preview=preview):
+                    self.assertEqual(range_list[0][0], 0)
+                    self.assertEqual(range_list[-1][1], file_size - 1)
+                    for (_, end), (start, _) in zip(range_list, range_list[1:]):
+                        self.assertEqual(start, end + 1)
+                    self.assertTrue(all(end >= start for start, end in range_list))
+
+    def test_unknown_size(self):
+        self.assertEqual(get_range_list(0, SEGMENT_SIZE), [None])
+
+    def test_preview_head(self):
+        for args, range_list in plans(preview=True):
+            if len(range_list) == 1:
+                continue
+
+            with self.subTest(args=args):
+                # first segment at offset 0 is the smallest one, at most a quarter of a connection's share
+                sizes = [end - start + 1 for start, end in range_list]
+                share = max(sizes)
+                self.assertEqual(range_list[0][0], 0)
+                self.assertEqual(sizes[0], min(sizes))
+                self.assertLessEqual(sizes[0], max(SEGMENT_SIZE, share // 4))
+                self.assertLessEqual(sizes[0], share // 2)
+
+    def test_equal_shares(self):
+        for preview in (True, False):
+            for args, range_list in plans(preview):
+                with self.subTest(args=args, preview=preview):
+                    sizes = [end - start + 1 for start, end in range_list]
+                    share = max(sizes)
+
+                    # small segments double in size, up to half a share
+                    heads = 0
+                    while sizes[heads] <= share // 2:
+                        heads += 1
+                    for small, bigger in zip(sizes[:heads], sizes[1:heads]):
+                        self.assertEqual(bigger, small * 2)
+
+                    # no more segments than connections, besides follow-ups of small segments
+                    self.assertLessEqual(len(sizes) - heads, args[1])
+
+                    # a small segment and its follow-up at the end of file add up to an equal share
+                    tails = sizes[len(sizes) - heads:]
+                    for head, tail in zip(sizes[:heads], tails):
+                        self.assertLessEqual(abs(head + tail - share), len(sizes))
+                    self.assertTrue(all(abs(size - share) <= len(sizes) for size in sizes[heads:len(sizes) - heads]))
+
+                    # no small segments without preview
+                    if not preview:
+                        self.assertEqual(heads, 0)
+
+    def test_few_connections(self):
+        # a small file isn't split into segments which take less than opening their connections
+        self.assertEqual(get_range_list(SEGMENT_SIZE * 10, SEGMENT_SIZE, connections=10), [[0, SEGMENT_SIZE * 10 - 1]])
+
+        # a segment takes at least 10 round trips, i.e. 450 KB on this link
+        range_list = get_range_list(2_000_000, SEGMENT_SIZE, connections=10, rtt=0.15, speed=300_000, preview=False)
+        self.assertEqual(len(range_list), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
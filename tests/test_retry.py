@@ -0,0 +1,93 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        tests for failed segments, a worker gives back a failed segment unlocked, and thread manager retries it at
+        once while other segments are still downloading.
+            python -m unittest discover tests
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import time
+import unittest
+
+from support import RangeServer
+
+from vortexdm.brain import brain
+from vortexdm.config import Status
+from vortexdm.downloaditem import DownloadItem, Segment
+from vortexdm.model import ObservableDownloadItem
+from vortexdm.scheduling import SchedulingContext
+from vortexdm.worker import Worker
+
+FILE = random.Random(4).randbytes(8_000_000)
+
+
+class RecordingContext(SchedulingContext):
+    """scheduling context which records segment's lock state when a failed segment is reported"""
+
+    def __init__(self, d=None):
+        super().__init__(d)
+        self.locked_when_reported = []
+
+    def report_failed_job(self, seg):
+        self.locked_when_reported.append(seg.locked)
+        super().report_failed_job(seg)
+
+
+class RetryTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_failed_segment_is_unlocked_when_reported(self):
+        with RangeServer({'/file.bin': FILE}) as server:
+            server.failures['/file.bin'] = [500]
+
+            d = DownloadItem(folder=self.folder)
+            d.status = Status.downloading
+            seg = Segment(name=os.path.join(self.folder, 'seg_0'), url=server.url('/file.bin'), range=[0, 999], d=d)
+
+            ctx = RecordingContext(d)
+            worker = Worker(tag=1, d=d, ctx=ctx)
+            worker.reuse(seg=seg)
+            worker.run()
+
+            self.assertEqual(ctx.locked_when_reported, [False])
+            self.assertEqual(ctx.get_failed_jobs(), [seg])
+
+    def test_failed_segment_is_retried_while_downloading(self):
+        # every connection takes a few seconds
+        with RangeServer({'/file.bin': FILE}, rate=1_000_000) as server:
+            d = ObservableDownloadItem(folder=self.folder)
+            d.update(server.url('/file.bin'))
+
+            # first segment request fails
+            server.failures['/file.bin'] = [503]
+            brain(d)
+
+            self.assertEqual(d.status, Status.completed)
+            with open(os.path.join(self.folder, 'file.bin'), 'rb') as f:
+                self.assertEqual(f.read(), FILE)
+
+            history = [item for item in server.history if item[2]]
+            failed_time, _, failed_range, _ = next(item for item in history if item[3])
+            retry_time = next(t for t, _, r, code in history if t > failed_time and r == failed_range and not code)
+
+            # retried at once, not after other segments are done, i.e. seconds later
+            self.assertLess(retry_time - failed_time, 1)
+            self.assertGreater(time.monotonic() - failed_time, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        tests for scheduling.SegmentSplitter, auto-segmentation split decisions.
+            python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from vortexdm.scheduling import SegmentSplitter  # noqa: E402
+
+KB = 1024
+MB = 1024 * 1024
+
+
+class FakeSegment:
+    """minimal segment, the attributes used by SegmentSplitter"""
+
+    def __init__(self, start, size, current_size=0):
+        self.range = [start, start + size - 1]
+        self.current_size = current_size
+
+    @property
+    def remaining(self):
+        return self.range[1] - self.range[0] + 1 - self.current_size
+
+
+class SplitPointTest(unittest.TestCase):
+    def setUp(self):
+        self.splitter = SegmentSplitter()
+        self.splitter.rtt = 0.05  # lead time = 0.2 seconds
+
+    def test_connections_finish_together(self):
+        seg = FakeSegment(1000, 10 * MB, current_size=MB)
+        speed = 100 * KB
+        point = self.splitter.split_point(seg, speed, speed, min_size=MB)
+
+        ahead = int(speed * self.splitter.lead_time)
+        old_size = point - (1000 + MB) + 1
+        new_size = seg.range[1] - point
+
+        # old connection downloads "ahead" while new one is connecting, the rest is shared equally
+        self.assertAlmostEqual(old_size - ahead, (seg.remaining - ahead) / 2, delta=1)
+        self.assertAlmostEqual(old_size / speed, self.splitter.lead_time + new_size / speed, delta=0.1)
+
+    def test_faster_new_connection_gets_more(self):
+        seg = FakeSegment(0, 10 * MB)
+        point = self.splitter.split_point(seg, 100 * KB, 300 * KB, min_size=MB)
+        self.assertGreater(seg.range[1] - point, point + 1)
+
+    def test_slow_segment_below_min_size_is_split(self):
+        # 1 MB left at 50 KB/s takes ~20 seconds, min_size is for segments of unknown speed only
+        seg = FakeSegment(0, MB)
+        self.assertIsNotNone(self.splitter.split_point(seg, 50 * KB, 4 * MB, min_size=24 * MB))
+
+    def test_split_saving_little_time_is_skipped(self):
+        # 1 MB left at 1 MB/s, a split saves less than min_gain
+        seg = FakeSegment(0, MB)
+        self.assertIsNone(self.splitter.split_point(seg, MB, MB, min_size=0))
+
+    def test_old_connection_overtakes_new_one(self):
+        # remaining bytes are downloaded before new connection receives its first byte
+        seg = FakeSegment(0, 100 * KB)
+        self.assertIsNone(self.splitter.split_point(seg, MB, MB, min_size=0))
+
+    def test_unknown_speed_split_in_half(self):
+        seg = FakeSegment(0, 10 * MB, current_size=2 * MB)
+        point = self.splitter.split_point(seg, 0, 0, min_size=MB)
+        self.assertEqual(point, 2 * MB + 4 * MB)
+
+    def test_unknown_speed_halves_below_min_size(self):
+        seg = FakeSegment(0, 3 * MB)
+        self.assertIsNone(self.splitter.split_point(seg, 0, 0, min_size=2 * MB))
+
+
+class PlanTest(unittest.TestCase):
+    def setUp(self):
+        self.splitter = SegmentSplitter()
+        self.splitter.rtt = 0.05
+
+    def test_longest_eta_first(self):
+        fast = FakeSegment(0, 20 * MB)
+        slow = FakeSegment(20 * MB, 5 * MB)
+        seg, point = self.splitter.plan([fast, slow], {fast: MB, slow: 100 * KB}, MB, min_size=MB)
+        self.assertIs(seg, slow)
+        self.assertTrue(slow.range[0] < point < slow.range[1])
+
+    def test_unknown_speed_first(self):
+        running = FakeSegment(0, 20 * MB)
+        waiting = FakeSegment(20 * MB, 20 * MB)
+        seg, _ = self.splitter.plan([running, waiting], {running: 100 * KB}, MB, min_size=MB)
+        self.assertIs(seg, waiting)
+
+    def test_nothing_worth_splitting(self):
+        segs = [FakeSegment(0, MB), FakeSegment(MB, MB)]
+        seg_speeds = {seg: MB for seg in segs}
+        self.assertEqual(self.splitter.plan(segs, seg_speeds, MB, min_size=MB), (None, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        tests for scheduling.SchedulingContext and ErrorRecord, every download item has its own error and failed
+        jobs channels.
+            python -m unittest discover tests
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from support import RangeServer
+
+from vortexdm.config import Status
+from vortexdm.downloaditem import DownloadItem, Segment
+from vortexdm.scheduling import ErrorRecord, SchedulingContext
+from vortexdm.worker import Worker
+
+
+class ErrorRecordTest(unittest.TestCase):
+    def test_throttling(self):
+        self.assertTrue(ErrorRecord(ErrorRecord.http, 429).is_throttling)
+        self.assertTrue(ErrorRecord(ErrorRecord.http, 503).is_throttling)
+        self.assertFalse(ErrorRecord(ErrorRecord.http, 404).is_throttling)
+
+        # curl error numbers aren't http codes
+        self.assertFalse(ErrorRecord(ErrorRecord.curl, 503).is_throttling)
+
+
+class SchedulingContextTest(unittest.TestCase):
+    def test_channels_are_separate(self):
+        ctx1, ctx2 = SchedulingContext(), SchedulingContext()
+        record = ErrorRecord(ErrorRecord.http, 503, 'service unavailable')
+        seg = Segment(name='seg')
+
+        ctx1.report_error(record)
+        ctx1.report_failed_job(seg)
+
+        self.assertEqual((ctx1.errors_num, ctx1.failed_jobs_num), (1, 1))
+        self.assertEqual((ctx2.errors_num, ctx2.failed_jobs_num), (0, 0))
+
+        # reading drains the channel
+        self.assertEqual(ctx1.get_errors(), [record])
+        self.assertEqual(ctx1.get_failed_jobs(), [seg])
+        self.assertEqual(ctx1.get_errors(), [])
+        self.assertEqual(ctx1.get_failed_jobs(), [])
+
+
+class WorkerReportTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_worker_reports_to_its_own_context(self):
+        with RangeServer({'/busy.bin': b'x' * 1000}) as server:
+            server.failures['/busy.bin'] = [503]
+
+            d = DownloadItem(folder=self.folder)
+            d.status = Status.downloading
+            seg = Segment(name=os.path.join(self.folder, 'seg_0'), url=server.url('/busy.bin'), range=[0, 999], d=d)
+
+            ctx, other_ctx = SchedulingContext(d), SchedulingContext()
+            worker = Worker(tag=1, d=d, ctx=ctx)
+            worker.reuse(seg=seg)
+            worker.run()
+
+            errors = ctx.get_errors()
+            self.assertEqual(len(errors), 1)
+            self.assertEqual((errors[0].kind, errors[0].code), (ErrorRecord.http, 503))
+            self.assertTrue(errors[0].is_throttling)
+            self.assertEqual(errors[0].worker_tag, 1)
+
+            # segment is given back to be downloaded again
+            self.assertEqual(ctx.get_failed_jobs(), [seg])
+            self.assertEqual((other_ctx.errors_num, other_ctx.failed_jobs_num), (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        tests for in-memory byte count of segments, segment files on disk are checked only when resuming or verifying.
+            python -m unittest discover tests
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from support import RangeServer, config_override, download
+
+from vortexdm.config import Status
+from vortexdm.downloaditem import Segment
+
+FILE = random.Random(9).randbytes(3_000_000)
+
+
+class SegmentSizeTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.name = os.path.join(self.folder, 'seg_0')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_size_read_once(self):
+        with open(self.name, 'wb') as f:
+            f.write(b'x' * 500)
+
+        seg = Segment(name=self.name, range=[0, 999])
+        self.assertIsNone(seg.written)
+        self.assertEqual(seg.current_size, 500)
+
+        # file changes aren't seen until sync_size() is called, worker counts its writes in "written"
+        with open(self.name, 'ab') as f:
+            f.write(b'x' * 100)
+        self.assertEqual(seg.current_size, 500)
+        self.assertEqual(seg.sync_size(), 600)
+        self.assertEqual(seg.remaining, 400)
+
+    def test_missing_file(self):
+        seg = Segment(name=self.name, range=[0, 999])
+        self.assertEqual(seg.current_size, 0)
+
+    def test_direct_segment(self):
+        # no file of its own, count is kept as is
+        seg = Segment(name=self.name, range=[0, 999], direct=True)
+        seg.written = 300
+        self.assertEqual(seg.sync_size(), 300)
+        self.assertEqual(seg.current_size, 300)
+
+    def test_download_doesnt_stat_segment_files(self):
+        getsize = os.path.getsize
+        segment_calls = []
+
+        def counting_getsize(path):
+            if os.path.dirname(os.path.abspath(path)) != os.path.abspath(self.folder):
+                segment_calls.append(path)
+            return getsize(path)
+
+        with RangeServer({'/file.bin': FILE}) as server, config_override(direct_write=False), \
+                mock.patch('os.path.getsize', counting_getsize):
+            d = download(server.url('/file.bin'), self.folder)
+
+        self.assertEqual(d.status, Status.completed)
+        with open(os.path.join(self.folder, 'file.bin'), 'rb') as f:
+            self.assertEqual(f.read(), FILE)
+
+        # segment files are checked when workers verify them, not with every received chunk
+        segments = len(server.get_requests('/file.bin'))
+        self.assertLessEqual(len(segment_calls), 3 * segments)
+
+
+if __name__ == '__main__':
+    unittest.main()
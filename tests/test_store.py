@@ -0,0 +1,147 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        tests for downloads list store, per-item upserts, replacing the whole list, and importing downloads.dat
+        written by older versions.
+            python -m unittest discover tests
+"""
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from support import config_override
+
+from vortexdm import setting
+from vortexdm.config import Status
+from vortexdm.model import ObservableDownloadItem
+from vortexdm.store import DownloadsStore
+
+
+def item(uid, name, status=Status.completed, thumbnail=None):
+    return uid, {'name': name, '_status': status, 'url': f'http://example.com/{name}', 'folder': '/downloads'}, \
+        thumbnail
+
+
+class DownloadsStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.store = DownloadsStore(self.folder)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def names(self, store=None):
+        return [(uid, d_dict['name']) for uid, d_dict, _ in (store or self.store).load()]
+
+    def test_upsert(self):
+        self.store.save([item('1', 'a.bin', thumbnail='dGh1bWI='), item('2', 'b.bin'), item('3', 'c.bin')])
+
+        # an updated item keeps its position and its thumbnail if no new one is given
+        self.store.save([item('1', 'a2.bin', status=Status.error)])
+        self.assertEqual(self.names(), [('1', 'a2.bin'), ('2', 'b.bin'), ('3', 'c.bin')])
+        self.assertEqual(self.store.load()[0][1]['_status'], Status.error)
+        self.assertEqual(self.store.load_thumbnail('1'), 'dGh1bWI=')
+        self.assertEqual([has_thumbnail for _, _, has_thumbnail in self.store.load()], [True, False, False])
+
+        self.store.delete('2')
+        self.assertEqual(self.names(), [('1', 'a2.bin'), ('3', 'c.bin')])
+        self.assertIsNone(self.store.load_thumbnail('2'))
+
+        # data is on disk, not only in this connection
+        self.store.close()
+        self.assertEqual(self.names(DownloadsStore(self.folder)), [('1', 'a2.bin'), ('3', 'c.bin')])
+
+    def test_replace_all(self):
+        self.store.save([item('1', 'a.bin'), item('2', 'b.bin'), item('3', 'c.bin')])
+
+        self.store.replace_all([item('3', 'c2.bin'), item('4', 'd.bin')])
+        self.assertEqual(self.names(), [('3', 'c2.bin'), ('4', 'd.bin')])
+
+        self.store.replace_all([])
+        self.assertEqual(self.names(), [])
+
+    def test_failed_save_keeps_previous_state(self):
+        self.store.save([item('1', 'a.bin')])
+
+        # second item can't be serialized, the whole transaction is rolled back
+        bad = ('2', {'name': object()}, None)
+        with self.assertRaises(TypeError):
+            self.store.save([item('1', 'a2.bin'), bad])
+
+        self.assertEqual(self.names(), [('1', 'a.bin')])
+
+    def test_legacy_migration(self):
+        downloads = {uid: d_dict for uid, d_dict, _ in (item('1', 'a.bin'), item('2', 'b.bin', Status.cancelled))}
+        with open(os.path.join(self.folder, 'downloads.dat'), 'w') as f:
+            json.dump(downloads, f)
+        with open(os.path.join(self.folder, 'thumbnails.dat'), 'w') as f:
+            json.dump({'2': 'dGh1bWI='}, f)
+
+        self.assertEqual(self.names(), [('1', 'a.bin'), ('2', 'b.bin')])
+        self.assertEqual(self.store.load()[1][1]['_status'], Status.cancelled)
+        self.assertEqual(self.store.load_thumbnail('2'), 'dGh1bWI=')
+
+        # old files are left untouched, and imported only once
+        self.assertTrue(os.path.isfile(os.path.join(self.folder, 'downloads.dat')))
+        self.store.delete('1')
+        self.store.close()
+        self.assertEqual(self.names(DownloadsStore(self.folder)), [('2', 'b.bin')])
+
+    def test_broken_legacy_file(self):
+        with open(os.path.join(self.folder, 'downloads.dat'), 'w') as f:
+            f.write('{"1": {"name": ')
+
+        self.assertEqual(self.names(), [])
+        self.store.save([item('1', 'a.bin')])
+        self.assertEqual(self.names(), [('1', 'a.bin')])
+
+
+class SettingTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.config = config_override(sett_folder=self.folder)
+        self.config.__enter__()
+
+    def tearDown(self):
+        setting.get_downloads_store().close()
+        self.config.__exit__(None, None, None)
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def new_item(self, name, status=Status.completed):
+        d = ObservableDownloadItem(folder=self.folder)
+        d.name = name
+        d.url = f'http://example.com/{name}'
+        d.status = status
+        return d
+
+    def test_save_and_load(self):
+        d1, d2, d3 = self.new_item('a.bin'), self.new_item('b.bin', Status.error), self.new_item('c.bin')
+        setting.save_d_map({d.uid: d for d in (d1, d2, d3)})
+
+        # one item changed, others aren't rewritten
+        d1.status = Status.error
+        d1.speed_limit = 100_000
+        setting.save_d(d1)
+        setting.delete_d(d3.uid)
+
+        d_map = setting.load_d_map()
+        self.assertEqual(list(d_map), [d1.uid, d2.uid])
+        self.assertEqual(d_map[d1.uid].name, 'a.bin')
+        self.assertEqual(d_map[d1.uid].status, Status.error)
+        self.assertEqual(d_map[d1.uid].speed_limit, 100_000)
+        self.assertEqual(d_map[d2.uid].status, Status.error)
+        self.assertEqual(d_map[d2.uid].url, 'http://example.com/b.bin')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        tests for timer service, callbacks run in order of due time.
+            python -m unittest discover tests
+"""
+
+import time
+import threading
+import unittest
+
+import support  # noqa: F401, quiet logs
+
+from vortexdm.timers import TimerService
+
+
+class TimerServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.service = TimerService()
+        self.calls = []
+        self.done = threading.Event()
+
+    def record(self, name, last=False):
+        self.calls.append((name, time.time()))
+        if last:
+            self.done.set()
+
+    def names(self):
+        return [name for name, _ in self.calls]
+
+    def test_order(self):
+        now = time.time()
+
+        # added out of order, run in order of due time, same due time in order of adding
+        self.service.call_at(now + 0.3, self.record, 'd', True)
+        self.service.call_at(now + 0.1, self.record, 'b')
+        self.service.call_at(now + 0.2, self.record, 'c')
+        self.service.call_at(now + 0.1, self.record, 'b2')
+        self.service.call_at(now - 1, self.record, 'a')
+
+        self.assertTrue(self.done.wait(5))
+        self.assertEqual(self.names(), ['a', 'b', 'b2', 'c', 'd'])
+
+        # nothing runs before its due time
+        due = {'a': now - 1, 'b': now + 0.1, 'b2': now + 0.1, 'c': now + 0.2, 'd': now + 0.3}
+        for name, t in self.calls:
+            self.assertGreaterEqual(t, due[name])
+
+    def test_earlier_timer_wakes_up_thread(self):
+        # timer thread is sleeping till a far timer, a new nearer timer must not wait for it
+        self.service.call_later(60, self.record, 'far')
+        time.sleep(0.05)
+        start = time.time()
+        self.service.call_later(0.05, self.record, 'near', True)
+
+        self.assertTrue(self.done.wait(5))
+        self.assertLess(time.time() - start, 0.5)
+        self.assertEqual(self.names(), ['near'])
+
+    def test_cancel(self):
+        timer = self.service.call_later(0.05, self.record, 'cancelled')
+        self.service.call_later(0.1, self.record, 'kept', True)
+        timer.cancel()
+
+        self.assertTrue(self.done.wait(5))
+        self.assertEqual(self.names(), ['kept'])
+
+    def test_callback_error(self):
+        def fail():
+            raise ValueError('callback error')
+
+        # a failing callback doesn't stop other timers
+        self.service.call_later(0, fail)
+        self.service.call_later(0.05, self.record, 'after error', True)
+
+        self.assertTrue(self.done.wait(5))
+        self.assertEqual(self.names(), ['after error'])
+
+    def test_thread_restarts(self):
+        self.service.call_later(0, self.record, 'first', True)
+        self.assertTrue(self.done.wait(5))
+
+        # thread quits when there are no timers
+        deadline = time.time() + 5
+        while self.service._thread is not None and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertIsNone(self.service._thread)
+
+        self.done.clear()
+        self.service.call_later(0, self.record, 'second', True)
+        self.assertTrue(self.done.wait(5))
+        self.assertEqual(self.names(), ['first', 'second'])
+
+
+if __name__ == '__main__':
+    unittest.main()
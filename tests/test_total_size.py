@@ -0,0 +1,109 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        tests for running segments' aggregates of download item, total size must match a full scan of segments
+        after any change of segments' sizes, media types, or completed flags.
+            python -m unittest discover tests
+"""
+
+import random
+import unittest
+
+from vortexdm.config import MediaType
+from vortexdm.downloaditem import DownloadItem, Segment
+
+MEDIA_TYPES = (MediaType.video, MediaType.audio, MediaType.general)
+
+
+def guess_size(segments):
+    """total size from a full scan, unknown sizes are guessed from average of known sizes"""
+    known = [seg.size for seg in segments if seg.size]
+    total = sum(known)
+    if known and len(segments) > len(known):
+        total += sum(known) // len(known) * (len(segments) - len(known))
+    return total
+
+
+def scan_total_size(d):
+    video = guess_size([seg for seg in d.segments if seg.media_type == MediaType.video])
+    audio = guess_size([seg for seg in d.segments if seg.media_type == MediaType.audio])
+    other = guess_size([seg for seg in d.segments if seg.media_type not in (MediaType.video, MediaType.audio)])
+    return (video + audio + other) or d.size, video, audio
+
+
+class TotalSizeTest(unittest.TestCase):
+    def check(self, d):
+        total, video, audio = scan_total_size(d)
+        self.assertEqual(d.calculate_total_size(), total)
+        self.assertEqual((d.video_size, d.audio_size), (video or d.size, audio))
+
+        stats = d.get_segments_stats()
+        self.assertEqual(stats.count, len(d.segments))
+        self.assertEqual(stats.completed, sum(1 for seg in d.segments if seg.completed))
+
+    def test_no_segments(self):
+        d = DownloadItem()
+        d.size = 1000
+        self.assertEqual(d.calculate_total_size(), 1000)
+
+    def test_unknown_sizes_are_guessed(self):
+        # e.g. hls fragments, sizes are known only after downloading
+        d = DownloadItem()
+        d.segments = [Segment(name=str(i), media_type=MediaType.video, d=d) for i in range(10)]
+        self.assertEqual(d.calculate_total_size(), 0)
+
+        d.segments[0].size = 100
+        d.segments[1].size = 300
+        self.assertEqual(d.calculate_total_size(), 2000)
+        self.check(d)
+
+    def test_random_changes(self):
+        rnd = random.Random(13)
+        d = DownloadItem()
+        d.segments = [Segment(name=str(i), size=rnd.choice((0, rnd.randint(1, 1000))),
+                              media_type=rnd.choice(MEDIA_TYPES), d=d) for i in range(50)]
+        self.check(d)
+
+        for i in range(2000):
+            seg = rnd.choice(d.segments)
+            action = rnd.randrange(5)
+            if action == 0:
+                seg.size = rnd.choice((0, rnd.randint(1, 1000)))
+            elif action == 1:
+                seg.media_type = rnd.choice(MEDIA_TYPES)
+            elif action == 2:
+                seg.completed = not seg.completed
+            elif action == 3:
+                d.add_segments(Segment(name=f'new{i}', size=rnd.randint(0, 1000), media_type=rnd.choice(MEDIA_TYPES)))
+            else:
+                # segment list changed without add_segments(), aggregates are rebuilt
+                d.segments.append(Segment(name=f'new{i}', size=rnd.randint(0, 1000), d=d))
+
+            if i % 50 == 0:
+                self.check(d)
+
+        self.check(d)
+
+        # list replaced
+        d.segments = d.segments[:10]
+        self.check(d)
+
+    def test_remaining_parts_updates_total_size(self):
+        d = DownloadItem()
+        d.segments = [Segment(name=str(i), size=100, d=d) for i in range(4)]
+        d.remaining_parts = 4
+        self.assertEqual(d.total_size, 400)
+
+        d.segments[0].size = 500
+        d.remaining_parts = 3
+        self.assertEqual(d.total_size, 800)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -63,6 +63,13 @@ def pars_args(arguments):
     def speed(txt):
         return parse_bytes(txt)
 
+    def host_limit(txt):
+        # host or domain pattern and connections number, e.g. *.example.com=8
+        pattern, _, number = txt.rpartition('=')
+        if not pattern:
+            raise argparse.ArgumentTypeError(f'expected PATTERN=NUMBER, got "{txt}"')
+        return pattern.strip().lower(), int(number)
+
     # region cmdline arguments
     # some args' names are taken from youtube-dl, reference:
     # https://github.com/ytdl-org/youtube-dl/blob/master/youtube_dl/options.py
@@ -257,8 +264,8 @@ def pars_args(arguments):
     downloader.add_argument(
         '-l', '--speed-limit', dest='speed_limit',
         type=speed, metavar='LIMIT', default=argparse.SUPPRESS,
-        help=f'download speed limit, in bytes per second (e.g. 100K or 5M), zero means no limit, '
-             f'current value={format_bytes(config.speed_limit)}.')
+        help=f'total download speed limit shared by all downloads, in bytes per second (e.g. 100K or 5M), '
+             f'zero means no limit, current value={format_bytes(config.speed_limit)}.')
     downloader.add_argument(
         '--concurrent', dest='max_concurrent_downloads',
         type=int, metavar='NUMBER', default=argparse.SUPPRESS,
@@ -267,6 +274,38 @@ def pars_args(arguments):
         '--connections', dest='max_connections',
         type=int, metavar='NUMBER', default=argparse.SUPPRESS,
         help=f'max download connections per item, default="{config.max_connections}".')
+    downloader.add_argument(
+        '--download-engine', dest='download_engine',
+        type=str, metavar='ENGINE', choices=config.download_engine_choices, default=argparse.SUPPRESS,
+        help=f'select download engine, available choices are: {config.download_engine_choices}, "threads" uses a '
+             f'thread per connection, "curl_multi" drives all connections from one thread, '
+             f'default="{config.download_engine}".')
+    downloader.add_argument(
+        '--direct-write', dest='direct_write',
+        action='store_true', default=argparse.SUPPRESS,
+        help=f'write segments of resumable downloads in place into a preallocated temp file instead of merging '
+             f'separate segment files, default="{config.direct_write}".')
+    downloader.add_argument(
+        '--no-direct-write', dest='direct_write',
+        action='store_false', default=argparse.SUPPRESS,
+        help='download segments into separate files, then merge them into temp file.')
+    downloader.add_argument(
+        '--connection-controller', dest='connection_controller',
+        type=str, metavar='CONTROLLER', choices=config.connection_controller_choices, default=argparse.SUPPRESS,
+        help=f'select policy which decides number of connections per download, available choices are: '
+             f'{config.connection_controller_choices}, "errors" reduces connections when servers report errors, '
+             f'"throughput" keeps extra connections only if they increase download speed, '
+             f'default="{config.connection_controller}".')
+    downloader.add_argument(
+        '--max-connections-per-host', dest='max_connections_per_host',
+        type=int, metavar='NUMBER', default=argparse.SUPPRESS,
+        help=f'max total connections of all downloads to the same host, zero means no limit, '
+             f'default="{config.max_connections_per_host}".')
+    downloader.add_argument(
+        '--host-connections', dest='host_connection_limits',
+        type=host_limit, metavar='PATTERN=NUMBER', action='append', default=argparse.SUPPRESS,
+        help='max total connections to hosts which match a host or domain pattern, overrides '
+             '--max-connections-per-host, could be used multiple times, e.g. --host-connections "*.example.com=8"')
 
     # -------------------------------------------------------------------------------------Debugging options------------
     debug = parser.add_argument_group(title='Debugging Options')
@@ -349,6 +388,9 @@ def main(argv=sys.argv):
     if sett.get('proxy'):
         sett['enable_proxy'] = True
 
+    if sett.get('host_connection_limits'):
+        sett['host_connection_limits'] = {**config.host_connection_limits, **dict(sett['host_connection_limits'])}
+
     if sett.get('output'):
         fp = os.path.realpath(sett.get('output'))
         if os.path.isdir(fp):
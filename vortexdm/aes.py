@@ -0,0 +1,70 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        AES-128 CBC decryption, used to decrypt encrypted hls segments in-process while downloading.
+
+        it needs one of the optional packages "pycryptodomex", "pycryptodome", or "cryptography", if none is installed
+        "available" is False, and encrypted hls streams are decrypted by ffmpeg after download as before.
+"""
+
+
+def _load_backend():
+    """return a function(data, key, iv) which decrypts data without removing padding, or None"""
+    for module in ('Cryptodome.Cipher', 'Crypto.Cipher'):
+        try:
+            AES = __import__(module, fromlist=['AES']).AES
+            return lambda data, key, iv: AES.new(key, AES.MODE_CBC, iv).decrypt(data)
+        except Exception:
+            pass
+
+    try:
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+        def decrypt(data, key, iv):
+            decryptor = Cipher(algorithms.AES(key), modes.CBC(iv)).decryptor()
+            return decryptor.update(data) + decryptor.finalize()
+
+        return decrypt
+    except Exception:
+        pass
+
+    return None
+
+
+_decrypt = _load_backend()
+
+# True if an AES package is installed
+available = _decrypt is not None
+
+
+def aes_cbc_decrypt(data, key, iv):
+    """decrypt AES-128 CBC data, and remove PKCS7 padding
+
+    Args:
+        data (bytes): encrypted data, its length must be a multiple of 16
+        key (bytes): 16 bytes key
+        iv (bytes): 16 bytes initialization vector
+
+    Returns:
+        (bytes): decrypted data
+    """
+    if not available:
+        raise RuntimeError('AES decryption needs "pycryptodomex", "pycryptodome", or "cryptography" package')
+
+    if len(key) != 16:
+        raise ValueError(f'invalid AES-128 key length: {len(key)} bytes')
+
+    data = _decrypt(data, key, iv)
+
+    # remove PKCS7 padding
+    pad = data[-1] if data else 0
+    if 1 <= pad <= 16 and data[-pad:] == bytes([pad]) * pad:
+        data = data[:-pad]
+
+    return data
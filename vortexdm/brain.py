@@ -12,13 +12,19 @@ from threading import Thread
 from queue import Queue
 import concurrent.futures
 
-from .video import merge_video_audio, pre_process_hls, post_process_hls, \
+from .video import merge_video_audio, pre_process_hls, post_process_hls, decrypt_hls_segment, \
     convert_audio, download_subtitles, write_metadata
 from . import config
 from .config import Status
-from .utils import (log, format_bytes, delete_file, rename_file, run_command, read_in_chunks)
+from .utils import (log, format_bytes, delete_file, rename_file, run_command, read_in_chunks, curl_stats,
+                    link_stats)
 from .worker import Worker
 from .downloaditem import Segment
+from .engine import start_worker
+from .scheduling import SchedulingContext, FragmentBatcher, SegmentSplitter, EndGame, tail_stats
+from .connections import get_connection_controller, host_budget
+from .limiter import limiter
+from .speedmeter import speed_sampler
 
 
 def brain(d=None):
@@ -29,12 +35,13 @@ def brain(d=None):
     if d.status == Status.downloading:
         log('another brain thread may be running')
         return
-    else:
-        d.status = Status.downloading
 
-    # first we will remove temp files because file manager is appending segments blindly to temp file
-    delete_file(d.temp_file)
-    delete_file(d.audio_file)
+    # scheduling context, has this download item's own errors and failed jobs channels, and wakes up brain and its
+    # managers when workers finish, fail, or download status changes
+    ctx = SchedulingContext(d)
+    d.scheduling_ctx = ctx
+
+    d.status = Status.downloading
 
     # reset downloaded
     d.downloaded = 0
@@ -64,6 +71,11 @@ def brain(d=None):
     # load progress info
     d.load_progress_info()
 
+    # remove temp files because file manager is appending segments blindly to temp file, except temp files which
+    # direct-write segments write into in place, those will be preallocated and keep data of previous session
+    if d.status == Status.downloading:
+        d.prepare_temp_files()
+
     # create some queues to send quit flag to threads
     fpr_q = Queue()
     spr_q = Queue()
@@ -72,22 +84,26 @@ def brain(d=None):
 
     if d.type == config.MediaType.video:
         # run files processing reporter in a separate thread
-        Thread(target=fpr, daemon=True, args=(d, fpr_q)).start()
+        Thread(target=fpr, daemon=True, args=(d, fpr_q, ctx)).start()
 
-    Thread(target=spr, daemon=True, args=(d, spr_q)).start()
+    Thread(target=spr, daemon=True, args=(d, spr_q, ctx)).start()
 
     # run file manager in a separate thread
-    Thread(target=file_manager, daemon=True, args=(d, fm_q)).start()
+    fm_thread = Thread(target=file_manager, daemon=True, args=(d, fm_q, ctx))
+    fm_thread.start()
 
     # run thread manager in a separate thread
-    Thread(target=thread_manager, daemon=True, args=(d, tm_q)).start()
+    tm_thread = Thread(target=thread_manager, daemon=True, args=(d, tm_q, ctx))
+    tm_thread.start()
 
-    while True:
-        time.sleep(0.1)  # a sleep time to make the program responsive
+    # wait for status change, status setter signals ctx
+    seq = ctx.sequence
+    while d.status in Status.active_states:
+        seq = ctx.wait(seq)
 
-        if d.status not in Status.active_states:
-            log(f'File {d.status}.', log_level=2)
-            break
+    log(f'File {d.status}.', log_level=2)
+    log('curl connections (all downloads):', curl_stats, log_level=3)
+    log('tail latency (all downloads):', tail_stats, log_level=3)
 
     # check file size
     if os.path.isfile(d.target_file):
@@ -101,12 +117,26 @@ def brain(d=None):
     log(f'brain {d.uid}: quitting', log_level=2)
     for q in (spr_q, fpr_q, tm_q, fm_q):
         q.put('quit')
+    ctx.signal()
+
+    # file manager saves progress info when it quits, and thread manager journals its last finished segments, a
+    # download resumed right away must not load an older journal, or get its journal appended by this session
+    fm_thread.join()
+    tm_thread.join()
+    d.scheduling_ctx = None
 
     log('-' * 50, '\n', log_level=2)
 
 
-def file_manager(d, q, keep_segments=True):
-    """write downloaded segments to a single file, and report download completed"""
+def file_manager(d, q, ctx, keep_segments=True):
+    """write downloaded segments to a single file, and report download completed
+
+    Args:
+        d: DownloadItem object
+        q: Queue to receive quit flag from brain
+        ctx: scheduling.SchedulingContext object, signaled when a worker finishes or status changes
+        keep_segments (bool): don't delete segments' files after merging
+    """
 
     # create temp folder if it doesn't exist
     if not os.path.isdir(d.temp_folder):
@@ -120,25 +150,31 @@ def file_manager(d, q, keep_segments=True):
     # report all blocks
     d.update_segments_progress()
 
-    while True:
-        time.sleep(0.1)
+    job_list = []
+    segments_num = 0  # number of d.segments when job_list was built, thread manager might add new segments
+    seq = ctx.sequence
+    timeout = None
 
-        job_list = [seg for seg in d.segments if not seg.completed]
+    while True:
+        if len(d.segments) != segments_num:
+            segments_num = len(d.segments)
+            job_list = [seg for seg in d.segments if not seg.completed]
 
-        # sort segments based on ranges, faster in writing to target file
-        try:
-            if job_list and job_list[0].range:
-                # it will raise "TypeError: 'NoneType' object is not subscriptable" if for example video is normal
-                # and audio is fragmented, the latter will have range=None
-                job_list = sorted(job_list, key=lambda seg: seg.range[0])
-        except:
-            pass
+            # sort segments based on ranges, faster in writing to target file
+            try:
+                if job_list and job_list[0].range:
+                    # it will raise "TypeError: 'NoneType' object is not subscriptable" if for example video is
+                    # normal and audio is fragmented, the latter will have range=None
+                    job_list = sorted(job_list, key=lambda seg: seg.range[0])
+            except:
+                pass
 
         for seg in job_list:
 
             # for segments which have no range, it must be appended to temp file in order, or final file will be
             # corrupted, therefore if the first non completed segment is not "downloaded", will exit loop
-            if not seg.downloaded:
+            # encrypted hls segment is decrypted while merging, it waits for its key too
+            if not seg.downloaded or (seg.merge and seg.key and not seg.key.source.downloaded):
                 if not seg.range:
                     break
                 else:
@@ -146,7 +182,6 @@ def file_manager(d, q, keep_segments=True):
 
             # append downloaded segment to temp file, mark as completed
             try:
-                seg.merge_errors = getattr(seg, 'merge_errors', 0)
                 if seg.merge_errors > 10:
                     log('merge max errors exceeded for:', seg.name, seg.last_merge_error)
                     d.status = Status.error
@@ -154,7 +189,7 @@ def file_manager(d, q, keep_segments=True):
                 elif seg.merge_errors > 0:
                     time.sleep(1)
 
-                if seg.merge:
+                if seg.merge and not seg.direct:
 
                     # use 'rb+' mode if we use seek, 'ab' doesn't work, 'rb+' will raise error if file doesn't exist
                     # open/close target file with every segment will avoid operating system buffering, which cause
@@ -169,6 +204,10 @@ def file_manager(d, q, keep_segments=True):
                         # read the exact segment size, sometimes segment has extra data as a side effect of
                         # auto segmentation
                         chunks = read_in_chunks(seg.name, bytes_range=(0, seg.range[1] - seg.range[0]), flag='rb')
+                    elif seg.key:
+                        # decrypt first, a failure leaves temp file untouched
+                        chunks = [decrypt_hls_segment(seg)]
+                        target_file = open(seg.tempfile, 'ab')
                     else:
                         target_file = open(seg.tempfile, 'ab')
                         chunks = read_in_chunks(seg.name)
@@ -189,11 +228,19 @@ def file_manager(d, q, keep_segments=True):
             except Exception as e:
                 seg.merge_errors += 1
                 seg.last_merge_error = e
+                timeout = 1  # retry merging even if no events received
                 log('failed to merge segment', seg.name, ' - ', seg.range, ' - ', e)
 
                 if config.test_mode:
                     raise e
 
+        # drop merged segments, keep sort order
+        job_list = [seg for seg in job_list if not seg.completed]
+
+        # thread manager added new segments while merging, rebuild job list before checking completion
+        if len(d.segments) != segments_num:
+            continue
+
         # all segments already merged
         if not job_list:
 
@@ -318,6 +365,10 @@ def file_manager(d, q, keep_segments=True):
         except:
             pass
 
+        # sleep until a worker finishes a segment or status changes
+        seq = ctx.wait(seq, timeout)
+        timeout = None
+
     # save progress info for future resuming
     if os.path.isdir(d.temp_folder):
         d.save_progress_info()
@@ -326,18 +377,47 @@ def file_manager(d, q, keep_segments=True):
     log(f'file_manager {d.uid}: quitting', log_level=2)
 
 
-def thread_manager(d, q):
-    """create multiple worker threads to download file segments"""
+def thread_manager(d, q, ctx):
+    """create multiple worker threads to download file segments
+
+    Args:
+        d: DownloadItem object
+        q: Queue to receive quit flag from brain
+        ctx: scheduling.SchedulingContext object, workers will report their errors and failed jobs thru it
+    """
 
     #   soft start, connections will be gradually increase over time to reach max. number
     #   set by user, this prevent impact on servers/network, and avoid "service not available" response
     #   from server when exceeding multi-connection number set by server.
-    limited_connections = 1
+    #   connections number is decided by a controller selected in settings, refer to connections.py
+    controller = get_connection_controller(d)
+    log(f'thread_manager {d.uid}: connection controller: {controller.name}', log_level=3)
 
     # create worker/connection list
-    all_workers = [Worker(tag=i, d=d) for i in range(config.max_connections)]
+    all_workers = [Worker(tag=i, d=d, ctx=ctx) for i in range(config.max_connections)]
     free_workers = set([w for w in all_workers])
-    threads_to_workers = dict()
+    tasks_to_workers = dict()  # key=Thread or engine.Transfer object, value=worker
+    tasks_to_hosts = dict()  # key=Thread or engine.Transfer object, value=host of its connection slot
+
+    # speed and per-connection throughput estimates, refer to speedmeter.py
+    speed_sampler.register(d, all_workers)
+    host_waiting = False  # True when next job is waiting for a free connection slot on its host
+
+    # small fragments are handed to workers in batches, downloaded back-to-back on one connection
+    batcher = FragmentBatcher()
+
+    # auto-segmentation, split segments with the longest estimated time to finish
+    splitter = SegmentSplitter()
+
+    # near completion, idle workers race the slowest running segments
+    endgame = EndGame()
+
+    # link info of download item's host, used to plan segments of next downloads, refer to utils.get_range_list
+    connection_speed = 0
+
+    # tail latency, time from 95% to 100%, measured if this session started below 95%
+    tail_start = None
+    tail_tracked = bool(d.total_size) and d.downloaded < tail_stats.start * d.total_size
 
     num_live_threads = 0
 
@@ -379,69 +459,98 @@ def thread_manager(d, q):
     max_errors = 100
     errors_descriptions = set()  # store unique errors
     error_timer = 0
-    error_timer2 = 0
-    conn_increase_interval = 0.5
     errors_check_interval = 0.2  # in seconds
     segmentation_timer = 0
 
-    # speed limit
-    sl_timer = time.time()
+    # running segments' progress is appended to resume journal periodically, to survive a crash
+    journal_timer = time.time()
+    journal_interval = 5  # in seconds
+
+    def journal(*segs):
+        # shadows are saved for resuming only if they win
+        segs = [seg for seg in segs if not endgame.is_shadow(seg)]
+        if segs and os.path.isdir(d.temp_folder):
+            d.journal_segments(*segs)
+
+    def cancel_worker(seg):
+        for worker in tasks_to_workers.values():
+            if worker.seg is seg:
+                worker.cancel()
+                return True
+        return False
+
+    def settle_race(seg):
+        # end-game race result when a worker finishes, refer to scheduling.EndGame
+        result, original, shadow = endgame.finished(seg)
+
+        if result == 'shadow won':
+            # cut original segment where shadow starts, its worker has downloaded that part already, extra bytes are
+            # truncated by its worker
+            original.range = [original.range[0], shadow.range[0] - 1]
+            cancel_worker(original)
+            d.add_segments(shadow)
+            d.downloaded += shadow.current_size
+            d.mark_segment_changed(original)
+            d.mark_segment_changed(shadow)
+            journal(original, shadow)
+            log(f'end-game: {shadow.basename} won the race, {original.basename} cut to {original.range}', log_level=3)
+
+        elif result == 'original won':
+            log(f'end-game: {original.basename} won the race, dropping {shadow.basename}', log_level=3)
+            if not cancel_worker(shadow):
+                # shadow isn't running, e.g. waiting in job list for a connection slot
+                if shadow in job_list:
+                    job_list.remove(shadow)
+                settle_race(shadow)
+
+        elif result == 'drop shadow':
+            if not shadow.direct:
+                delete_file(shadow.name)
 
     def clear_error_q():
         # clear error queue
-        for _ in range(config.error_q.qsize()):
-            errors_descriptions.add(config.error_q.get())
+        for record in ctx.get_errors():
+            errors_descriptions.add(record.description)
 
-    while True:
-        time.sleep(0.001)  # a sleep time to while loop to make the app responsive
+    # max. sleep time when no events received, to pick up changes in settings, e.g. max_connections
+    idle_timeout = 1
+    seq = ctx.sequence
 
-        # Failed jobs returned from workers, will be used as a flag to rebuild job_list --------------------------------
-        if config.jobs_q.qsize() > 0:
-            # rebuild job_list
-            job_list = [seg for seg in d.segments if not seg.downloaded and not seg.locked]
+    while True:
+        # Failed jobs returned from workers, put them back to job_list ---------------------------------------------
+        if ctx.failed_jobs_num > 0:
+            failed_jobs = [seg for seg in ctx.get_failed_jobs() if not seg.downloaded and not seg.locked
+                           and seg not in endgame.dropped]
+            job_list += [seg for seg in failed_jobs if seg not in job_list]
 
             # sort segments based on its ranges smaller ranges at the end
             job_list = sort_segs(job_list)
 
-            # empty queue
-            for _ in range(config.jobs_q.qsize()):
-                _ = config.jobs_q.get()
-
         # create new workers if user increases max_connections while download is running
         if config.max_connections > len(all_workers):
             extra_num = config.max_connections - len(all_workers)
             index = len(all_workers)
             for i in range(extra_num):
                 index += i
-                worker = Worker(tag=index, d=d)
+                worker = Worker(tag=index, d=d, ctx=ctx)
                 all_workers.append(worker)
                 free_workers.add(worker)
 
-        # allowable connections
-        allowable_connections = min(config.max_connections, limited_connections)
-
         # dynamic connection manager ---------------------------------------------------------------------------------
         # check every n seconds for connection errors
         if time.time() - error_timer >= errors_check_interval:
             error_timer = time.time()
-            errors_num = config.error_q.qsize()
+            records = ctx.get_errors()
 
-            total_errors += errors_num
+            total_errors += len(records)
             d.errors = total_errors  # update errors property of download item
 
-            clear_error_q()
-
-            if total_errors >= 1 and limited_connections > 1:
-                limited_connections -= 1
-                conn_increase_interval += 1
-                error_timer2 = time.time()
+            errors_descriptions.update(record.description for record in records)
+            if records:
                 log('Errors:', errors_descriptions, 'Total:', total_errors, log_level=3)
-                log('Thread Manager: received server errors, connections limited to:', limited_connections, log_level=3)
 
-            elif limited_connections < config.max_connections and time.time() - error_timer2 >= conn_increase_interval:
-                error_timer2 = time.time()
-                limited_connections += 1
-                log('Thread Manager: allowable connections:', limited_connections, log_level=3)
+            # exact bytes received by workers and per-connection EWMA, d.downloaded is updated by workers once a second
+            controller.update(records, total_errors, speed_sampler.snapshot(d), num_live_threads)
 
             # reset total errors if received any data
             if downloaded != d.downloaded:
@@ -453,14 +562,11 @@ def thread_manager(d, q):
             if total_errors >= max_errors:
                 d.status = Status.error
 
-        # speed limit ------------------------------------------------------------------------------------------------
-        # wait some time for dynamic connection manager to release all connections
-        if time.time() - sl_timer < config.max_connections * errors_check_interval:
-            worker_sl = (config.speed_limit // config.max_connections) if config.max_connections else 0
-        else:
-            worker_sl = (config.speed_limit // allowable_connections) if allowable_connections else 0
+        # allowable connections
+        allowable_connections = controller.limit
 
         # Threads ------------------------------------------------------------------------------------------------------
+        host_waiting = False
         if d.status == Status.downloading:
             if free_workers and num_live_threads < allowable_connections:
                 seg = None
@@ -473,21 +579,27 @@ def thread_manager(d, q):
 
                     # calculate minimum segment size based on speed, e.g. for 3 MB/s speed, and 2 live threads,
                     # worker speed = 1.5 MB/sec, min seg size will be 1.5 x 6 = 9 MB
-                    worker_speed = d.speed // num_live_threads if num_live_threads else 0
+                    worker_speed = speed_sampler.connection_speed(d)
                     min_seg_size = max(config.SEGMENT_SIZE, worker_speed * 6)
 
+                    # segments racing an end-game shadow can't be split, min_seg_size is used for segments of unknown
+                    # speed, others are split if it saves time, refer to scheduling.SegmentSplitter
                     filtered_segs = [seg for seg in d.segments if seg.range is not None
-                                      and seg.remaining > min_seg_size * 2]
+                                     and seg.remaining > config.SEGMENT_SIZE * 2 and seg not in endgame.races]
+
+                    # sort segments based on its ranges smaller ranges first, used for segments of equal time to finish
+                    filtered_segs = sort_segs(filtered_segs)[::-1]
 
-                    # sort segments based on its ranges smaller ranges at the end
-                    filtered_segs = sort_segs(filtered_segs)
+                    # speed of running segments' connections
+                    connection_speeds = dict(speed_sampler.snapshot(d).connections)
+                    seg_speeds = {worker.seg: connection_speeds[worker.tag] for worker in tasks_to_workers.values()
+                                  if connection_speeds.get(worker.tag)}
 
-                    if filtered_segs:
-                        current_seg = filtered_segs.pop()
+                    current_seg, middle = splitter.plan(filtered_segs, seg_speeds, worker_speed, min_seg_size)
 
+                    if current_seg:
                         # range boundaries
                         start = current_seg.range[0]
-                        middle = start + current_seg.current_size + current_seg.remaining // 2
                         end = current_seg.range[1]
 
                         # assign new range for current segment
@@ -496,24 +608,69 @@ def thread_manager(d, q):
                         # create new segment
                         seg = Segment(name=os.path.join(d.temp_folder, f'{len(d.segments)}'), url=current_seg.url,
                                       tempfile=current_seg.tempfile, range=[middle + 1, end],
-                                      media_type=current_seg.media_type)
+                                      media_type=current_seg.media_type, direct=current_seg.direct)
 
                         # add to segments
-                        d.segments.append(seg)
+                        d.add_segments(seg)
+                        if os.path.isdir(d.temp_folder):
+                            d.journal_segments(current_seg, seg)
                         log('-' * 10, f'new segment: {seg.basename} {seg.range}, updated seg {current_seg.basename} '
-                                      f'{current_seg.range}, minimum seg size:{format_bytes(min_seg_size)}', log_level=3)
-
-                if seg and not seg.downloaded and not seg.locked:
+                                      f'{current_seg.range}, speed: {format_bytes(seg_speeds.get(current_seg, 0))}/s, '
+                                      f'minimum seg size:{format_bytes(min_seg_size)}', log_level=3)
+
+                    # end-game mode, nothing left to split, race the slowest running segment with a shadow copy of
+                    # its remaining range
+                    elif endgame.is_active(d):
+                        current_seg = endgame.pick(tasks_to_workers.values(), connection_speeds)
+                        if current_seg:
+                            start = current_seg.range[0] + current_seg.current_size
+                            name = os.path.join(d.temp_folder, f'{len(d.segments)}_shadow_{endgame.started}')
+                            seg = Segment(name=name, url=current_seg.url, tempfile=current_seg.tempfile,
+                                          range=[start, current_seg.range[1]], media_type=current_seg.media_type,
+                                          direct=current_seg.direct)
+                            endgame.add(current_seg, seg)
+                            log('-' * 10, f'end-game: {seg.basename} {seg.range} races {current_seg.basename}, '
+                                          f'remaining: {format_bytes(current_seg.remaining)}', log_level=3)
+
+                # per-host connection budget shared with other download items, refer to connections.py
+                host = host_budget.get_host(seg.url) if seg else ''
+                if seg and not seg.downloaded and not seg.locked and not host_budget.acquire(d, host, ctx):
+                    # put segment back, ctx will be signaled when a slot is released on this host
+                    job_list.append(seg)
+                    host_waiting = True
+
+                elif seg and not seg.downloaded and not seg.locked:
                     worker = free_workers.pop()
                     # sometimes download chokes when remaining only one worker, will set higher minimum speed and
                     # less timeout for last workers batch
-                    if len(job_list) + config.jobs_q.qsize() <= allowable_connections:
+                    if limiter.is_limited(d):
+                        # speed limited workers are slow on purpose, abort only if stalled for a minute
+                        minimum_speed, timeout = 1, 60
+                    elif len(job_list) + ctx.failed_jobs_num <= allowable_connections:
                         # worker will abort if speed less than 20 KB for 10 seconds
                         minimum_speed, timeout = 20 * 1024, 10
                     else:
                         minimum_speed = timeout = None  # default as in utils.set_curl_option
 
-                    ready = worker.reuse(seg=seg, speed_limit=worker_sl, minimum_speed=minimum_speed, timeout=timeout)
+                    # next fragments from the same host, in download order, a failed fragment is retried alone, so it
+                    # doesn't hold back other fragments
+                    batch = []
+                    if seg.range is None and not seg.direct and not seg.retries:
+                        # fair share is based on max. connections, connection controller might still be increasing
+                        # allowable connections, and new connections need jobs too
+                        batch_size = batcher.batch_size(len(job_list) + 1, config.max_connections,
+                                                        speed_sampler.connection_speed(d))
+                        while job_list and len(batch) < batch_size - 1:
+                            next_seg = job_list[-1]
+                            if next_seg.range is not None or next_seg.downloaded or next_seg.locked or \
+                                    next_seg.retries >= config.max_seg_retries or \
+                                    host_budget.get_host(next_seg.url) != host:
+                                break
+                            batch.append(job_list.pop())
+
+                    started = False
+                    ready = worker.reuse(seg=seg, minimum_speed=minimum_speed, timeout=timeout, batch=batch,
+                                         shadow=endgame.is_shadow(seg))
                     if ready:
                         # check max download retries
                         if seg.retries >= config.max_seg_retries:
@@ -523,30 +680,61 @@ def thread_manager(d, q):
                         else:
                             seg.retries += 1
 
-                            thread = Thread(target=worker.run, daemon=True)
-                            thread.start()
-                            threads_to_workers[thread] = worker
+                            task = start_worker(worker)
+                            tasks_to_workers[task] = worker
+                            tasks_to_hosts[task] = host
+                            started = True
 
                             # save progress info for future resuming
-                            if os.path.isdir(d.temp_folder):
-                                d.save_progress_info()
-
-        # check thread completion
-        for thread in list(threads_to_workers.keys()):
-            if not thread.is_alive():
-                worker = threads_to_workers.pop(thread)
+                            journal(*worker.job_segs)
+
+                    # worker didn't start, give back connection slot and batch
+                    if not started:
+                        host_budget.release(d, host)
+
+                        for batch_seg in reversed(batch):
+                            if ready:
+                                batch_seg.locked = False
+                            job_list.append(batch_seg)
+
+        # check workers completion
+        finished_segs = []
+        for task in list(tasks_to_workers.keys()):
+            if not task.is_alive():
+                worker = tasks_to_workers.pop(task)
                 free_workers.add(worker)
+                host_budget.release(d, tasks_to_hosts.pop(task))
+                finished_segs += worker.job_segs
+                batcher.update(worker.transfers)
+                splitter.update(worker.transfers)
+                settle_race(worker.seg)
+
+        # save progress of finished segments, and checkpoint running segments every journal_interval
+        if time.time() - journal_timer >= journal_interval:
+            journal_timer = time.time()
+            finished_segs += [worker.seg for worker in tasks_to_workers.values()]
+
+        if finished_segs:
+            journal(*finished_segs)
 
         # update d param -----------------------------------------------------------------------------------------------
         num_live_threads = len(all_workers) - len(free_workers)
         d.live_connections = num_live_threads
-        d.remaining_parts = d.live_connections + len(job_list) + config.jobs_q.qsize()
+        batched = sum(len(worker.batch) for worker in tasks_to_workers.values())
+        d.remaining_parts = d.live_connections + batched + len(job_list) + ctx.failed_jobs_num
+
+        connection_speed = speed_sampler.connection_speed(d) or connection_speed
+
+        if tail_tracked and tail_start is None and d.downloaded >= tail_stats.start * d.total_size:
+            tail_start = time.time()
 
         # Required check if things goes wrong --------------------------------------------------------------------------
-        if num_live_threads + len(job_list) + config.jobs_q.qsize() == 0:
+        if num_live_threads + len(job_list) + ctx.failed_jobs_num == 0:
             # rebuild job_list
             job_list = [seg for seg in d.segments if not seg.downloaded]
             if not job_list:
+                if tail_start is not None:
+                    tail_stats.record(time.time() - tail_start)
                 break
             else:
                 # remove an orphan locks
@@ -560,17 +748,47 @@ def thread_manager(d, q):
         except:
             pass
 
+        # sleep until a worker finishes or fails, an error is reported, status changes, or a timer is due ---------
+        now = time.time()
+        timers = [now + idle_timeout]
+
+        if d.status == Status.downloading and free_workers and num_live_threads < allowable_connections:
+            # start next job immediately, or try auto segmentation later
+            timers.append(now if job_list and not host_waiting else segmentation_timer + 1)
+
+        if ctx.errors_num or total_errors:
+            timers.append(error_timer + errors_check_interval)
+
+        # connection controller is still adjusting connections
+        controller_timer = controller.next_update()
+        if controller_timer is not None:
+            timers.append(max(controller_timer, error_timer + errors_check_interval))
+
+        seq = ctx.wait(seq, timeout=max(0, min(timers) - now))
+
+    # give back all connection slots
+    host_budget.unregister(d)
+    speed_sampler.unregister(d)
+
+    # host's link info for planning segments of next downloads
+    link_stats.record(d.eff_url, rtt=splitter.rtt, speed=connection_speed, connections=controller.learned_limit)
+
+    if endgame.started:
+        log(f'thread_manager {d.uid}: end-game races: {endgame.started}, won by shadows: {endgame.won}', log_level=3)
+
     # update d param
     d.live_connections = 0
-    d.remaining_parts = num_live_threads + len(job_list) + config.jobs_q.qsize()
+    d.remaining_parts = num_live_threads + len(job_list) + ctx.failed_jobs_num
     log(f'thread_manager {d.uid}: quitting', log_level=2)
 
 
-def fpr(d, q):
+def fpr(d, q, ctx):
     """file processing progress reporter
 
     Args:
         d: DownloadItem object
+        q: Queue to receive quit flag from brain
+        ctx: scheduling.SchedulingContext object, to quit immediately when status changes
     """
 
     while True:
@@ -583,14 +801,17 @@ def fpr(d, q):
         except:
             pass
 
-        time.sleep(1)
+        # report every second, or quit as soon as download stops
+        ctx.wait_for(lambda: d.status not in config.Status.active_states, timeout=1)
 
 
-def spr(d, q):
+def spr(d, q, ctx):
     """segments progress reporter
 
     Args:
         d: DownloadItem object
+        q: Queue to receive quit flag from brain
+        ctx: scheduling.SchedulingContext object, to quit immediately when status changes
     """
 
     while True:
@@ -604,4 +825,5 @@ def spr(d, q):
         # report active blocks only
         d.update_segments_progress(activeonly=True)
 
-        time.sleep(1)
\ No newline at end of file
+        # report every second, or quit as soon as download stops
+        ctx.wait_for(lambda: d.status not in config.Status.active_states, timeout=1)
\ No newline at end of file
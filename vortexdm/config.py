@@ -7,7 +7,6 @@
     :license: GNU GPLv3, see LICENSE.md for more details.
 """
 
-from queue import Queue
 import os
 import sys
 import platform
@@ -24,7 +23,8 @@ settings_keys = [
     'proxy', 'recent_folders', 'refresh_url_retries', 'scrollbar_width', 'speed_limit', 'update_frequency',
     'playlist_autonum_options', 'use_server_timestamp', 'window_size', 'write_metadata', 'view_mode', 'temp_folder',
     'window_maximized', 'force_window_maximize', 'd_preview', 'updater_version', 'media_presets',
-    'video_title_template', 'ffmpeg_actual_path'
+    'video_title_template', 'ffmpeg_actual_path', 'download_engine', 'direct_write',
+    'connection_controller', 'max_connections_per_host', 'host_connection_limits'
 ]
 
 # ----------------------------------------------------------------------------------------General ----------------------
@@ -185,6 +185,24 @@ max_concurrent_downloads = 3
 max_connections = 10
 max_seg_retries = 10  # maximum download retries for a segment until reporting downloaded failed
 
+# download engine, "threads": a thread per connection, "curl_multi": all connections driven by one thread using
+# pycurl.CurlMulti, refer to engine.py
+download_engine_choices = ('threads', 'curl_multi')
+download_engine = 'threads'
+
+# write ranged segments in place into a preallocated temp file, instead of separate segment files merged afterwards
+direct_write = True
+
+# connection controller decides how many connections to use per download, refer to connections.py
+# "errors": increase connections gradually until max_connections, reduce them when servers report errors
+# "throughput": keep extra connections only if they increase download speed, back off on 429 / 503 responses
+connection_controller_choices = ('errors', 'throughput')
+connection_controller = 'errors'
+
+# total connections of all downloads to the same host, zero means no limit, refer to connections.HostConnectionBudget
+max_connections_per_host = 0
+host_connection_limits = {}  # per host or domain pattern limits, e.g. {'*.example.com': 8}, override above value
+
 # ---------------------------------------------------------------------------------------Debugging options--------------
 keep_temp = False  # keep temp files / folders after done downloading for debugging
 
@@ -232,11 +250,6 @@ d_preview = False  # preview for download items
 # ----------------------------------------------------------------------------------------------------------------------
 # ----------------------------------------------------------------------------------------------------------------------
 
-# queues
-error_q = Queue()  # used by workers to report server refuse connection errors
-jobs_q = Queue()  # # required for failed worker jobs
-
-
 # status class as an Enum
 class Status:
     """used to identify status, work as an Enum"""
@@ -0,0 +1,303 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        connection controllers, decide how many connections thread_manager is allowed to use for a download item,
+        controller is selected by config.connection_controller, available controllers:
+        "errors": soft start, add a connection every interval and remove one whenever servers report errors.
+        "throughput": AIMD / hill climbing, measure aggregate throughput and keep an extra connection only if it
+        adds bandwidth, cut connections by half when server asks us to slow down, i.e. 429 / 503.
+
+        per-host connection budget, limits total connections of all download items to the same host, refer to
+        HostConnectionBudget.
+"""
+
+import time
+import fnmatch
+from threading import Lock
+from urllib.parse import urlparse
+
+from . import config
+from .utils import log, format_bytes
+
+
+class ConnectionController:
+    """base class, subclasses must implement update()
+
+    thread_manager calls update() with every errors check, i.e. when errors reported or at time returned by
+    next_update(), then it reads "limit" property
+    """
+    name = ''
+
+    def __init__(self, d=None):
+        self.d = d  # reference to DownloadItem
+        self._limit = 1  # soft start, connections will be increased gradually
+
+    @property
+    def limit(self):
+        """allowable connections number"""
+        return max(1, min(self._limit, config.max_connections))
+
+    @property
+    def learned_limit(self):
+        """connections number which proved to be useful for this host, zero if unknown, used to plan segments of
+        next downloads from the same host"""
+        return 0
+
+    def update(self, records, total_errors, speed, live_connections):
+        """update connections limit
+
+        Args:
+            records (list): scheduling.ErrorRecord objects received since last update
+            total_errors (int): number of errors since last time data received
+            speed (speedmeter.SpeedSnapshot): download item's speed info, i.e. total bytes received by its
+            connections and EWMA throughput of every connection
+            live_connections (int): number of running workers
+        """
+        raise NotImplementedError
+
+    def next_update(self):
+        """time when update() should be called even if no errors reported, None if not required"""
+        return None
+
+
+class ErrorBasedController(ConnectionController):
+    """increase connections by one every "conn_increase_interval" until reaching max_connections, decrease by one with
+    every errors check that finds errors and slow down future increase"""
+    name = 'errors'
+
+    def __init__(self, d=None):
+        super().__init__(d)
+        self.conn_increase_interval = 0.5
+        self.timer = 0  # last change time
+
+    def update(self, records, total_errors, speed, live_connections):
+        if total_errors >= 1 and self._limit > 1:
+            self._limit -= 1
+            self.conn_increase_interval += 1
+            self.timer = time.time()
+            log('Thread Manager: received server errors, connections limited to:', self._limit, log_level=3)
+
+        elif self._limit < config.max_connections and time.time() - self.timer >= self.conn_increase_interval:
+            self.timer = time.time()
+            self._limit += 1
+            log('Thread Manager: allowable connections:', self._limit, log_level=3)
+
+    def next_update(self):
+        if self._limit < config.max_connections:
+            return self.timer + self.conn_increase_interval
+
+
+class ThroughputController(ConnectionController):
+    """AIMD / hill climbing, probe one extra connection at a time and keep it only if aggregate throughput increases
+    by a reasonable share of the per-connection throughput, otherwise drop it and hold for a while before probing
+    again, on throttling errors 429 / 503 cut connections by half
+
+    per-connection throughput is the average EWMA of connections which are receiving data, as sampled by
+    speedmeter.SpeedSampler, dividing aggregate throughput by live workers underestimates it whenever some workers
+    are idle, e.g. connecting or waiting for a segment.
+    """
+    name = 'throughput'
+
+    settle_time = 1  # seconds to ignore after changing limit, new connections need time to handshake and ramp up
+    sample_interval = 3  # seconds, throughput measuring window
+    hold_time = 15  # seconds to keep current limit after a failed probe or a throttling error
+
+    # extra connection is kept if it adds at least this ratio of the average per-connection throughput
+    min_marginal_ratio = 0.5
+
+    def __init__(self, d=None):
+        super().__init__(d)
+        self.baseline = None  # aggregate throughput measured with (limit - 1) connections while probing
+        self.baseline_per_connection = 0  # per-connection throughput measured with (limit - 1) connections
+        self.probing = False
+        self.hold_until = 0
+        self.window_start = 0
+        self.window_downloaded = None
+        self._reset_window(time.time())
+
+    @property
+    def learned_limit(self):
+        # limit is learned only after a failed probe or throttling, otherwise it was still ramping up
+        return self.limit if self.hold_until else 0
+
+    def _reset_window(self, now):
+        self.window_start = now + self.settle_time
+        self.window_downloaded = None
+
+    def _set_limit(self, limit, now, reason=''):
+        self._limit = max(1, min(limit, config.max_connections))
+        self._reset_window(now)
+        log('Thread Manager: allowable connections:', self._limit, reason, log_level=3)
+
+    def update(self, records, total_errors, speed, live_connections):
+        now = time.time()
+        downloaded = speed.received
+
+        # multiplicative decrease, server asks us to slow down
+        if any(record.is_throttling for record in records):
+            self.probing = False
+            self.baseline = None
+            self.hold_until = now + self.hold_time
+            self._set_limit(self._limit // 2, now, reason='- server throttling')
+            return
+
+        if now < self.window_start:
+            return
+
+        # start measuring window
+        if self.window_downloaded is None or downloaded < self.window_downloaded:
+            self.window_start = now
+            self.window_downloaded = downloaded
+            return
+
+        elapsed = now - self.window_start
+        if elapsed < self.sample_interval:
+            return
+
+        throughput = (downloaded - self.window_downloaded) / elapsed
+        rates = [rate for _, rate in speed.connections]
+        per_connection = sum(rates) / len(rates) if rates else throughput / max(1, live_connections)
+        log(f'Thread Manager: throughput {format_bytes(throughput)}/s, {live_connections} connections, '
+            f'{format_bytes(per_connection)}/s per connection', log_level=3)
+
+        if self.probing:
+            self.probing = False
+            marginal = throughput - self.baseline
+            if marginal < self.baseline_per_connection * self.min_marginal_ratio:
+                # extra connection didn't add bandwidth
+                self.baseline = None
+                self.hold_until = now + self.hold_time
+                self._set_limit(self._limit - 1, now,
+                                reason=f'- extra connection added only {format_bytes(marginal)}/s')
+                return
+
+        # additive increase, probe one more connection
+        if now >= self.hold_until and self._limit < config.max_connections and live_connections >= self._limit:
+            self.baseline = throughput
+            self.baseline_per_connection = per_connection
+            self.probing = True
+            self._set_limit(self._limit + 1, now, reason='- probing')
+        else:
+            # keep measuring with current limit
+            self.window_start = now
+            self.window_downloaded = downloaded
+
+    def next_update(self):
+        if self.window_downloaded is None:
+            return self.window_start
+        return self.window_start + self.sample_interval
+
+
+controllers = {c.name: c for c in (ErrorBasedController, ThroughputController)}
+
+
+def get_connection_controller(d=None):
+    """create connection controller selected in settings"""
+    return controllers.get(config.connection_controller, ErrorBasedController)(d)
+
+
+class HostConnectionBudget:
+    """process-wide connection slots per host, shared by all running download items
+
+    thread_manager must acquire a slot before starting a worker and release it when the worker is done, free slots
+    are shared fairly, a download item which already has its fair share, i.e. limit / number of items on same host,
+    will not get a new slot while another item on same host is waiting for one.
+
+    limits are read from config.host_connection_limits, a dict of {host or domain pattern: max connections}, e.g.
+    {'*.example.com': 8}, patterns are matched using fnmatch, otherwise config.max_connections_per_host is used,
+    zero means no limit.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._hosts = {}  # key=host, value=dict of {download item uid: _HostUser}
+
+    @staticmethod
+    def get_host(url):
+        try:
+            return urlparse(url).hostname or ''
+        except Exception:
+            return ''
+
+    @staticmethod
+    def get_limit(host):
+        for pattern, limit in config.host_connection_limits.items():
+            if fnmatch.fnmatch(host, pattern.lower()):
+                return limit
+
+        return config.max_connections_per_host
+
+    def unregister(self, d):
+        """remove download item from all hosts and release all its slots"""
+        with self._lock:
+            for host, users in list(self._hosts.items()):
+                if users.pop(d.uid, None):
+                    self._notify(users)
+                if not users:
+                    del self._hosts[host]
+
+    def acquire(self, d, host, ctx=None):
+        """try to take a connection slot, it doesn't block
+
+        Returns:
+            (bool): True if slot acquired, otherwise download item is marked as waiting and its ctx will be signaled
+            when a slot is released
+        """
+        with self._lock:
+            users = self._hosts.setdefault(host, {})
+            user = users.get(d.uid)
+            if user is None:
+                user = users[d.uid] = _HostUser(ctx)
+
+            limit = self.get_limit(host)
+            if limit:
+                used = sum(u.used for u in users.values())
+                share = max(1, limit // len(users))
+                others_waiting = any(u.waiting and u.used < share for u in users.values() if u is not user)
+
+                if used >= limit or (user.used >= share and others_waiting):
+                    user.waiting = True
+                    return False
+
+            user.used += 1
+            user.waiting = False
+            return True
+
+    def release(self, d, host):
+        with self._lock:
+            users = self._hosts.get(host, {})
+            user = users.get(d.uid)
+            if user and user.used > 0:
+                user.used -= 1
+                self._notify(users)
+
+    def used(self, host):
+        """number of connections currently used for host"""
+        with self._lock:
+            return sum(u.used for u in self._hosts.get(host, {}).values())
+
+    @staticmethod
+    def _notify(users):
+        # wake up waiting download items' thread managers
+        for user in users.values():
+            if user.waiting and user.ctx:
+                user.ctx.signal()
+
+
+class _HostUser:
+    """download item's usage of a host"""
+
+    def __init__(self, ctx=None):
+        self.ctx = ctx  # scheduling.SchedulingContext
+        self.used = 0
+        self.waiting = False
+
+
+# one budget for the whole application
+host_budget = HostConnectionBudget()
@@ -37,6 +37,8 @@ from .brain import brain
 from . import video
 from .video import get_media_info, process_video
 from .model import ObservableDownloadItem, ObservableVideo
+from .downloadqueue import DownloadQueue
+from .timers import timer_service
 
 def set_option(**kwargs):
     """set global setting option(s) in config.py"""
@@ -336,7 +338,15 @@ class Controller:
         # d_map is a dictionary that map uid to download item object
         self.d_map = {}
 
-        self.download_q = Queue()
+        # pending downloads, started by queue thread when a download slot is free, refer to downloadqueue.py
+        self.download_q = DownloadQueue(start_callback=self._start_queued_download,
+                                        idle_callback=self._on_downloads_idle)
+
+        # scheduled downloads' timers, key=download item uid, value=timers.Timer
+        self._sched_timers = {}
+
+        # set when a download starts, on completion actions run only after something was downloaded
+        self._completion_trigger = False
         self.ignore_dlist = custom_settings.get('ignore_dlist', False)
 
         # load application settings
@@ -358,13 +368,12 @@ class Controller:
         Thread(target=video.load_extractor_engines, daemon=True).start()
 
         # handle download queue
-        Thread(target=self.download_q_handler, daemon=True).start()
+        self.download_q.start()
 
-        # handle scheduled downloads
-        Thread(target=self._scheduled_downloads_handler, daemon=True).start()
-
-        # handle on completion actions
-        Thread(target=self._on_completion_watchdog, daemon=True).start()
+        # start timers of scheduled downloads loaded from disk
+        for d in self.d_map.values():
+            if d.status == Status.scheduled:
+                self._set_schedule_timer(d)
 
         # check for ffmpeg and update file path "config.ffmpeg_actual_path"
         check_ffmpeg()
@@ -578,6 +587,11 @@ class Controller:
         if not self.ignore_dlist:
             setting.save_d_map(self.d_map)
 
+    def save_d(self, d):
+        """save one download item, cost doesn't depend on downloads list size"""
+        if not self.ignore_dlist:
+            setting.save_d(d)
+
     # endregion
 
     # region video
@@ -719,30 +733,26 @@ class Controller:
     # endregion
 
     # region download
-    def download_q_handler(self):
-        """handle downloads, should run in a dedicated thread"""
-
-        while True:
-            active_downloads = len([d for d in self.d_map.values() if d.status in Status.active_states])
-            if active_downloads < config.max_concurrent_downloads:
-                d = self.download_q.get()
-                if d.status == Status.pending:
-                    self._download(d)
-
-            time.sleep(1)
-
-    def _scheduled_downloads_handler(self):
-        """handle scheduled downloads, should run in a dedicated thread"""
+    def _start_queued_download(self, d):
+        """called by download queue thread when a download slot is free, it must not block"""
+        if d.status == Status.pending:
+            self._download(d)
+        else:
+            # cancelled while pending
+            self.download_q.deactivate(d)
 
-        while True:
-            sched_downloads = [d for d in self.d_map.values() if d.status == Status.scheduled]
-            if sched_downloads:
-                current_datetime = datetime.now()
-                for d in sched_downloads:
-                    if d.sched and datetime.fromisoformat(d.sched) <= current_datetime:
-                        self.download(d, silent=True)
+    def set_priority(self, uid, priority):
+        """change download item's priority, pending items with higher priority start first"""
+        d = self.d_map.get(uid)
+        if d:
+            self.download_q.set_priority(d, priority)
+            self.save_d(d)
 
-            time.sleep(60)
+    def move_to_front(self, uid):
+        """start a pending download item next, before other pending items"""
+        d = self.d_map.get(uid)
+        if d:
+            self.download_q.move_to_front(d)
 
     def _pre_download_checks(self, d, silent=False, force_rename=False):
         """do all checks required for this download
@@ -919,7 +929,7 @@ class Controller:
             self.d_map[d.uid] = d
 
             # save on disk
-            self.save_d_map()
+            self.save_d(d)
 
             if not download_later:
                 d.status = Status.pending
@@ -931,7 +941,15 @@ class Controller:
 
     @threaded
     def _download(self, d, **kwargs):
+        # count as active download, until done, it frees a slot in download queue
+        self.download_q.activate(d)
+        self._completion_trigger = True
+        try:
+            self._run_download(d)
+        finally:
+            self.download_q.deactivate(d)
 
+    def _run_download(self, d):
         # retry multiple times to download and auto refresh expired url
         for n in range(config.refresh_url_retries + 1):
             # start brain in a separate thread
@@ -976,6 +994,7 @@ class Controller:
         d = self.d_map.get(uid)
 
         if d and d.status in (*Status.active_states, Status.pending):
+            self.download_q.remove(d)
             d.status = Status.cancelled
 
     def _post_download(self, d):
@@ -1426,6 +1445,10 @@ class Controller:
         """
 
         d = self.d_map.pop(uid)
+        self.download_q.remove(d)
+        self._cancel_schedule_timer(uid)
+        if not self.ignore_dlist:
+            setting.delete_d(uid)
 
         d.status = Status.cancelled
 
@@ -1452,13 +1475,26 @@ class Controller:
         """update previous download list in view"""
         log('controller.get_d_list()> sending d_list')
 
+        # thumbnails are read from disk, view asks for them when items are shown, refer to get_thumbnail()
         buff = {'command': 'd_list', 'd_list': []}
         for d in self.d_map.values():
-            properties = d.watch_list
+            properties = d.watch_list - {'thumbnail'}
             info = {k: getattr(d, k, None) for k in properties}
             buff['d_list'].append(info)
         self.view.update_view(**buff)
 
+    @threaded
+    def get_thumbnail(self, uid=None):
+        """send a download item's thumbnail to view, e.g. when its item is shown or selected"""
+        d = self.d_map.get(uid)
+        if not d:
+            return
+
+        # history items' thumbnails are not kept in memory, view keeps its own images
+        thumbnail = d.load_thumbnail(cache=False)
+        if thumbnail:
+            self._update_view(uid=d.uid, thumbnail=thumbnail)
+
     def get_segments_progress(self, uid=None, video_idx=None):
         # get download item
         d = self.get_d(uid, video_idx)
@@ -1466,6 +1502,9 @@ class Controller:
         if not d:
             return None
 
+        # history items' progress info is loaded on demand
+        d.ensure_progress_info()
+
         return d.update_segments_progress(activeonly=False)
 
     def get_properties(self, uid=None, video_idx=None):
@@ -1579,6 +1618,7 @@ class Controller:
         log(f'Schedule {d.name} at: {target_date}')
         d.sched = target_date.isoformat(sep=' ')
         d.status = Status.scheduled
+        self._set_schedule_timer(d)
 
     def schedule_cancel(self, uid=None, video_idx=None):
         # get download item
@@ -1588,50 +1628,68 @@ class Controller:
             return
 
         log(f'Schedule for: {d.name} has been cancelled')
+        self._cancel_schedule_timer(d.uid)
         d.status = Status.cancelled
         d.sched = None
 
+    def _set_schedule_timer(self, d):
+        """start download item at its scheduled time "d.sched", replaces any previous timer of the same item"""
+        self._cancel_schedule_timer(d.uid)
+
+        try:
+            due = datetime.fromisoformat(d.sched).timestamp()
+        except Exception as e:
+            log('schedule error:', e, d.name, d.sched)
+            return
+
+        self._sched_timers[d.uid] = timer_service.call_at(due, self._start_scheduled_download, d.uid, d.sched)
+
+    def _cancel_schedule_timer(self, uid):
+        timer = self._sched_timers.pop(uid, None)
+        if timer:
+            timer.cancel()
+
+    @threaded
+    def _start_scheduled_download(self, uid, sched):
+        """called by timer service at scheduled time"""
+        self._sched_timers.pop(uid, None)
+
+        # skip items started, cancelled, or rescheduled after their timer was set
+        d = self.d_map.get(uid)
+        if d and d.status == Status.scheduled and d.sched == sched:
+            self.download(d, silent=True)
+
     # endregion
 
     # region on completion command / shutdown
-    def _on_completion_watchdog(self):
-        """a separate thread to watch when "ALL" download items are completed and execute on completion action if
-        configured"""
+    def _on_downloads_idle(self):
+        """called by download queue when "ALL" download items are done, i.e. no active or pending downloads, execute
+        on completion actions if configured"""
 
-        # make sure user started any item downloading, after setting "on-completion actions"
-        trigger = False
+        # make sure user started any item downloading, before running "on-completion actions"
+        trigger = self._completion_trigger
+        self._completion_trigger = False
 
-        while True:
-            if config.shutdown:
-                break
+        if not trigger or config.shutdown:
+            return
 
-            # check for "on-completion actions"
-            if config.on_completion_command or config.shutdown_pc or config.on_completion_exit:
-                # check for any active download, then set the trigger
-                if [d for d in self.d_map.values() if d.status in Status.active_states]:
-                    trigger = True
-
-                elif trigger:
-                    # check if items no longer active or pending
-                    if not [d for d in self.d_map.values() if d.status in Status.active_states or d.status == Status.pending]:
-                        # reset the trigger
-                        trigger = False
-
-                        # execute command
-                        if config.on_completion_command:
-                            run_command(config.on_completion_command)
-
-                        # shutdown
-                        if config.shutdown_pc:
-                            self.shutdown_pc()
-
-                        # exit application
-                        if config.on_completion_exit:
-                            self.quit()
-            else:
-                trigger = False
+        if config.on_completion_command or config.shutdown_pc or config.on_completion_exit:
+            # run in a separate thread, shutdown_pc() waits for user response
+            self._run_completion_actions()
 
-            time.sleep(5)
+    @threaded
+    def _run_completion_actions(self):
+        # execute command
+        if config.on_completion_command:
+            run_command(config.on_completion_command)
+
+        # shutdown
+        if config.shutdown_pc:
+            self.shutdown_pc()
+
+        # exit application
+        if config.on_completion_exit:
+            self.quit()
 
     def scedule_shutdown(self, uid):
         """schedule shutdown after an item completed downloading"""
@@ -1692,6 +1750,28 @@ class Controller:
         d = self.get_d(uid=uid)
         return d.on_completion_command
 
+    def set_bandwidth(self, uid, speed_limit=None, bandwidth_weight=None):
+        """change download item's own speed limit and its share of global speed limit, a running download applies
+        new values at once, refer to limiter.py
+
+        Args:
+            uid (str): download item's uid
+            speed_limit (int): bytes/sec, 0 means no limit other than global speed limit, None keeps current value
+            bandwidth_weight (float): share of global speed limit relative to other active downloads, e.g. 2 gets
+            twice the bandwidth of a download with weight 1, None keeps current value
+        """
+        d = self.get_d(uid=uid)
+        if not d:
+            return
+
+        if speed_limit is not None:
+            d.speed_limit = max(0, int(speed_limit))
+
+        if bandwidth_weight is not None:
+            d.bandwidth_weight = max(0.01, float(bandwidth_weight))
+
+        self.save_d(d)
+
     # endregion
 
     # region general
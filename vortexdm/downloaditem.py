@@ -11,51 +11,121 @@
 
 import os
 import mimetypes
-import time
-from collections import deque
 from threading import Lock
 from urllib.parse import urljoin, unquote, urlparse
 
-from .utils import (validate_file_name, get_headers, translate_server_code, log, delete_file, delete_folder, save_json,
-                    load_json, get_range_list)
+from .utils import (validate_file_name, get_headers, translate_server_code, log, delete_file, delete_folder,
+                    get_range_list, preallocate_file, update_object, link_stats)
 from . import config
 from .config import MediaType
+from .journal import ProgressJournal
+from .speedmeter import speed_sampler
 
 
 class Segment:
+    # huge hls playlists and fragmented streams have tens of thousands of segments, slots save memory and make
+    # attributes access faster, new attributes must be added here
+    __slots__ = ('d', 'name', 'num', '_range', '_size', 'downloaded', '_down_bytes', '_completed', 'tempfile',
+                 'headers', 'url', 'seg_type', 'merge', 'key', 'locked', '_media_type', 'retries', 'direct', 'written',
+                 'duration', 'media_sequence', 'merge_errors', 'last_merge_error')
+
     def __init__(self, name=None, num=None, range=None, size=0, url=None, tempfile=None, seg_type='', merge=True,
-                 media_type=MediaType.general, d=None):
-        self.d = d  # reference to parent download item
+                 media_type=MediaType.general, d=None, direct=False):
+        # reference to parent download item, size, completed, and media_type changes are reported to it, refer to
+        # DownloadItem.segment_updated(), it is set at the end of initialization
+        self.d = None
         self.name = name  # full path file name
         # self.basename = os.path.basename(self.name)
         self.num = num
         self._range = range  # a list of start and end bytes
-        self.size = size
+        self._size = size
         # todo: change bool (downloaded, and completed) to (isdownloaded, and iscompleted), and down_bytes to downloaded
         self.downloaded = False
         self._down_bytes = 0
-        self.completed = False  # done downloading and merging into tempfile
+        self._completed = False  # done downloading and merging into tempfile
         self.tempfile = tempfile
-        self.headers = {}
+        self.headers = None  # server headers, set by get_size()
         self.url = url
         self.seg_type = seg_type
         self.merge = merge
         self.key = None
         self.locked = False  # set True by the worker which is currently downloading this segment
-        self.media_type = media_type
+        self._media_type = media_type
         self.retries = 0  # number of download retries
 
+        # direct write, worker writes segment data in place into tempfile at range[0] instead of a separate file, and
+        # merging becomes bookkeeping only
+        self.direct = direct
+
+        # number of bytes already written to segment file or to tempfile for direct write, counted in memory by worker,
+        # None means unknown and size on disk will be checked once, refer to sync_size()
+        self.written = 0 if direct else None
+
+        self.duration = 0  # hls segment duration in seconds
+        self.media_sequence = None  # hls segment sequence number, it is the default IV of AES-128 encryption
+
+        # file manager merging errors
+        self.merge_errors = 0
+        self.last_merge_error = None
+
         # override size if range available
         if range:
-            self.size = range[1] - range[0] + 1
+            self._size = range[1] - range[0] + 1
+
+        self.d = d
+
+    def _report_update(self, key, old, new):
+        if self.d is not None and old != new:
+            self.d.segment_updated(self, key, old, new)
+
+    @property
+    def size(self):
+        return self._size
+
+    @size.setter
+    def size(self, value):
+        old = self._size
+        self._size = value
+        self._report_update('size', old, value)
+
+    @property
+    def completed(self):
+        return self._completed
+
+    @completed.setter
+    def completed(self, value):
+        old = self._completed
+        self._completed = value
+        self._report_update('completed', old, value)
+
+    @property
+    def media_type(self):
+        return self._media_type
+
+    @media_type.setter
+    def media_type(self, value):
+        old = self._media_type
+        self._media_type = value
+        self._report_update('media_type', old, value)
 
     @property
     def current_size(self):
-        try:
-            size = os.path.getsize(self.name)
-        except:
-            size = 0
-        return size
+        if self.written is None:
+            self.sync_size()
+        return self.written
+
+    def sync_size(self):
+        """update "written" from segment file size on disk, used when resuming or verifying a segment, direct-write
+        segments have no file of their own and their count is kept as is"""
+        if not self.direct:
+            try:
+                self.written = os.path.getsize(self.name)
+            except:
+                self.written = 0
+        elif self.written is None:
+            self.written = 0
+
+        return self.written
 
     @property
     def down_bytes(self):
@@ -97,7 +167,70 @@ class Segment:
         return self.size
 
     def __repr__(self):
-        return repr(self.__dict__)
+        return repr({k: getattr(self, k, None) for k in self.__slots__})
+
+
+class _SizeAggregate:
+    """running totals of segments' sizes of one media type"""
+    __slots__ = ('count', 'known_count', 'known_size')
+
+    def __init__(self):
+        self.count = 0
+        self.known_count = 0  # segments with known size
+        self.known_size = 0
+
+    def add(self, size, sign=1):
+        """add a segment's size, or remove it if sign = -1"""
+        self.count += sign
+        if size:
+            self.known_count += sign
+            self.known_size += size * sign
+
+    def guess(self):
+        """total size, unknown segments' sizes are guessed from average of known sizes"""
+        total = self.known_size
+        if self.known_count and self.count > self.known_count:
+            total += self.known_size // self.known_count * (self.count - self.known_count)
+        return total
+
+
+class _SegmentsStats:
+    """running aggregates of download item's segments, kept up to date by Segment's property setters"""
+
+    def __init__(self, segments=()):
+        self.count = 0
+        self.completed = 0
+        self.video = _SizeAggregate()
+        self.audio = _SizeAggregate()
+        self.other = _SizeAggregate()
+
+        for seg in segments:
+            self.add(seg)
+
+    def sizes(self, media_type):
+        if media_type == MediaType.video:
+            return self.video
+        elif media_type == MediaType.audio:
+            return self.audio
+        return self.other
+
+    def add(self, seg, sign=1):
+        """add a segment, or remove it if sign = -1"""
+        self.count += sign
+        self.sizes(seg.media_type).add(seg.size, sign)
+        if seg.completed:
+            self.completed += sign
+
+    def update(self, seg, key, old, new):
+        if key == 'size':
+            sizes = self.sizes(seg.media_type)
+            sizes.add(old, -1)
+            sizes.add(new)
+        elif key == 'media_type':
+            self.sizes(old).add(seg.size, -1)
+            self.sizes(new).add(seg.size)
+        elif key == 'completed' and bool(old) != bool(new):
+            self.completed += 1 if new else -1
 
 
 class DownloadItem:
@@ -140,6 +273,11 @@ class DownloadItem:
         self._lock = None  # Lock() to access downloaded property from different threads
         self._status = config.Status.cancelled
 
+        # scheduling.SchedulingContext of running brain, will be signaled with every status change
+        self.scheduling_ctx = None
+
+        self._journal = None  # journal.ProgressJournal, resume info in temp folder
+
         self._remaining_parts = 0
         self.total_parts = 0
 
@@ -166,15 +304,16 @@ class DownloadItem:
         # schedule download
         self.sched = None
 
-        # speed
-        self._speed = 0
-        self.prev_downloaded_value = 0
-        self.speed_buffer = deque()  # store some speed readings for calculating average speed afterwards
-        self.speed_timer = 0
-        self.speed_refresh_rate = 0.5  # calculate speed every n seconds
+        # download queue
+        self.priority = 0  # pending items with higher priority start first, refer to downloadqueue.py
+
+        # bandwidth, refer to limiter.py
+        self.speed_limit = 0  # this item's own speed limit in bytes/sec, 0 means no limit other than global limit
+        self.bandwidth_weight = 1  # share of global speed limit relative to other active downloads
 
         # segments
-        self.segments = []
+        self._segments = []
+        self._segments_stats = None  # _SegmentsStats, running sizes and completed count, refer to segment_updated()
 
         # fragmented video parameters will be updated from video subclass object / update_param()
         self.fragment_base_url = None
@@ -201,7 +340,15 @@ class DownloadItem:
 
         # thumbnails
         self.thumbnail_url = None
-        self.thumbnail = None  # base64 string
+        self._thumbnail = None  # base64 string
+
+        # callable returns base64 thumbnail stored on disk, items loaded from downloads list at startup don't keep
+        # their thumbnails in memory until needed, refer to load_thumbnail()
+        self.thumbnail_loader = None
+
+        # False for items loaded from downloads list at startup until load_progress_info() is called, i.e. when item
+        # is resumed or its segments progress is requested
+        self.progress_info_loaded = False
 
         # playlist info
         self.playlist_url = ''
@@ -241,7 +388,8 @@ class DownloadItem:
         self.on_completion_command = ''
 
         self.segments_progress = []
-        self.segments_progress_bool = []
+        self._changed_segments = set()  # segments changed since last progress report, refer to mark_segment_changed()
+        self._segments_index = {}  # key=segment, value=position in self.segments, used for hls progress
 
         # properties names that will be saved on disk
         self.saved_properties = ['_name', 'folder', 'url', 'eff_url', 'playlist_url', 'playlist_title', 'size',
@@ -250,7 +398,8 @@ class DownloadItem:
                                  'fragment_base_url', 'audio_fragments', 'audio_fragment_base_url',
                                  '_total_size', 'protocol', 'manifest_url', 'selected_subtitles',
                                  'abr', 'tbr', 'format_id', 'audio_format_id', 'resolution', 'audio_quality',
-                                 'http_headers', 'metadata_file_content', 'title', 'extension', 'sched', 'thumbnail_url']
+                                 'http_headers', 'metadata_file_content', 'title', 'extension', 'sched', 'thumbnail_url',
+                                 'speed_limit', 'bandwidth_weight', 'priority']
 
         # property to indicate a time consuming operation is running on download item now
         self.busy = False
@@ -258,6 +407,15 @@ class DownloadItem:
     def __repr__(self):
         return f'DownloadItem object(name:{self.name}, url:{self.url})'
 
+    @property
+    def segments(self):
+        return self._segments
+
+    @segments.setter
+    def segments(self, value):
+        self._segments = value
+        self._segments_stats = None  # will be rebuilt on next use
+
     @property
     def remaining_parts(self):
         return self._remaining_parts
@@ -267,7 +425,8 @@ class DownloadItem:
         self._remaining_parts = value
 
         # should recalculate total size again with every completed segment, most of the time segment size won't be
-        # available until actually downloaded this segment, "check worker.report_completed()"
+        # available until actually downloaded this segment, "check worker.report_completed()", it is cheap since
+        # segments' sizes are accounted incrementally
         self.total_size = self.calculate_total_size()
 
     @property
@@ -292,37 +451,52 @@ class DownloadItem:
 
     @property
     def speed(self):
-        """average speed"""
-        if self.status != config.Status.downloading:  # or not self.speed_buffer:
-            self._speed = 0
-        else:
-            if not self.prev_downloaded_value:
-                self.prev_downloaded_value = self.downloaded
-
-            time_passed = time.time() - self.speed_timer
-            if time_passed >= self.speed_refresh_rate:
-                self.speed_timer = time.time()
-                delta = self.downloaded - self.prev_downloaded_value
-                self.prev_downloaded_value = self.downloaded
-                _speed = delta / time_passed
-                if _speed >= 0:
-                    # to get a stable speed reading will use an average of multiple speed readings
-                    self.speed_buffer.append(_speed)
-                avg_speed = sum(self.speed_buffer) / len(self.speed_buffer)
-                if len(self.speed_buffer) >= 10:
-                    self.speed_buffer.popleft()
-
-                self._speed = int(avg_speed) if avg_speed > 0 else 0
-
-        return self._speed
+        """average speed, it is read only, refer to speedmeter.SpeedSampler"""
+        if self.status != config.Status.downloading:
+            return 0
+
+        return speed_sampler.speed(self)
+
+    @property
+    def thumbnail(self):
+        """base64 thumbnail"""
+        return self.load_thumbnail()
+
+    @thumbnail.setter
+    def thumbnail(self, value):
+        self._thumbnail = value
+        self.thumbnail_loader = None
+
+    def load_thumbnail(self, cache=True):
+        """return base64 thumbnail, read it from disk if not loaded yet
+
+        Args:
+            cache (bool): keep loaded thumbnail in memory
+        """
+        if self._thumbnail is None and self.thumbnail_loader:
+            thumbnail = self.thumbnail_loader()
+            if not cache:
+                return thumbnail
+
+            self._thumbnail = thumbnail
+            self.thumbnail_loader = None
+
+        return self._thumbnail
 
     @property
     def lock(self):
-        # Lock() to access downloaded property from different threads
+        # Lock() to access downloaded property and segments stats from different threads
         if not self._lock:
             self._lock = Lock()
         return self._lock
 
+    @property
+    def journal(self):
+        # resume journal in current temp folder
+        if not self._journal or self._journal.folder != self.temp_folder:
+            self._journal = ProgressJournal(self.temp_folder)
+        return self._journal
+
     @property
     def downloaded(self):
         return self._downloaded
@@ -350,7 +524,7 @@ class DownloadItem:
                     p = 0
             else:
                 # to handle fragmented files
-                finished = len([seg for seg in self.segments if seg.completed])
+                finished = self.get_segments_stats().completed
                 p = round(finished * 100 / len(self.segments), 1)
         elif self.total_size:
             p = round(self.downloaded * 100 / self.total_size, 1)
@@ -384,6 +558,10 @@ class DownloadItem:
     def status(self, value):
         self._status = value
 
+        # wake up brain and its managers
+        if self.scheduling_ctx:
+            self.scheduling_ctx.signal()
+
         # kill subprocess if currently active
         if self.subprocess and value in (config.Status.cancelled, config.Status.error):
             self.kill_subprocess()
@@ -431,6 +609,11 @@ class DownloadItem:
         self._segment_size = value if value <= self.size else self.size
         # print('segment size = ', self._segment_size)
 
+    @property
+    def direct_write(self):
+        """True if ranged segments will be written in place into temp file, refer to Segment.direct"""
+        return config.direct_write and self.resumable
+
     @property
     def video_segments(self):
         return [seg for seg in self.segments if seg.media_type == MediaType.video]
@@ -459,36 +642,45 @@ class DownloadItem:
 
         # print('self.selected_subtitles:', self.selected_subtitles)
 
-    def calculate_total_size(self):
-        # this is heavy and should be used carefully, calculate size by getting every segment's size
-        def guess_size(seglist):
-            known_sizes = [seg.size for seg in seglist if seg.size]
-            unknown_sizes_num = len(seglist) - len(known_sizes)
-            tsize = sum(known_sizes)
-
-            # guess remaining segments' sizes
-            if known_sizes and unknown_sizes_num:
-                avg_seg_size = sum(known_sizes) // len(known_sizes)
-                tsize += avg_seg_size * unknown_sizes_num
-            return tsize
+    def get_segments_stats(self):
+        """running aggregates of segments, rebuilt only if segments list replaced or changed without add_segments()"""
+        with self.lock:
+            return self._get_segments_stats()
 
-        total_size = 0
+    def _get_segments_stats(self):
+        # must be called with self.lock acquired
+        stats = self._segments_stats
+        if stats is None or stats.count != len(self.segments):
+            stats = self._segments_stats = _SegmentsStats(self.segments)
+        return stats
 
-        if self.segments:
-
-            # get video segments
-            video_segs = [seg for seg in self.segments if seg.media_type == MediaType.video]
+    def add_segments(self, *segments):
+        """append new segments and account for their sizes, e.g. segments made by splitting a running segment"""
+        with self.lock:
+            stats = self._get_segments_stats()
+            for seg in segments:
+                seg.d = self
+                self.segments.append(seg)
+                stats.add(seg)
+
+    def segment_updated(self, seg, key, old, new):
+        """called by segment when its size, completed, or media_type changes, might be called from threads"""
+        with self.lock:
+            stats = self._segments_stats
+            if stats is not None and stats.count == len(self.segments):
+                stats.update(seg, key, old, new)
 
-            # get audio segments
-            audio_segs = [seg for seg in self.segments if seg.media_type == MediaType.audio]
+    def calculate_total_size(self):
+        # segments' sizes are accounted incrementally, refer to segment_updated()
+        total_size = 0
 
-            # get other segments if any
-            other_segs = [seg for seg in self.segments if seg not in (*video_segs, *audio_segs)]
+        if self.segments:
+            stats = self.get_segments_stats()
 
-            # calculate sizes
-            video_size = guess_size(video_segs)
-            audio_size = guess_size(audio_segs)
-            othres_size = guess_size(other_segs)
+            # calculate sizes, unknown segments' sizes are guessed
+            video_size = stats.video.guess()
+            audio_size = stats.audio.guess()
+            othres_size = stats.other.guess()
 
             self.video_size = video_size
             self.audio_size = audio_size
@@ -603,6 +795,33 @@ class DownloadItem:
             delete_file(self.temp_file)
             delete_file(self.audio_file)
 
+    def prepare_temp_files(self):
+        """delete temp files which will be built by appending segments, and preallocate temp files for direct-write
+        segments, direct-write temp files are kept since they contain data of previous download session"""
+        direct_files = {}  # key=file path, value=required size
+        for seg in self.segments:
+            if seg.direct:
+                direct_files[seg.tempfile] = max(direct_files.get(seg.tempfile, 0), seg.range[1] + 1)
+
+        for fp in (self.temp_file, self.audio_file):
+            if fp not in direct_files:
+                delete_file(fp)
+
+        if direct_files:
+            os.makedirs(self.temp_folder, exist_ok=True)
+
+        for fp, size in direct_files.items():
+            preallocate_file(fp, size)
+
+    def plan_ranges(self, size, url):
+        """initial segments ranges of a resumable file, based on what is known about its host, refer to get_range_list"""
+        link = link_stats.get(url)
+        connections = min(link.connections or config.max_connections, config.max_connections)
+        preview = self.type in (MediaType.video, MediaType.audio)
+
+        return get_range_list(size, config.SEGMENT_SIZE, connections=connections, rtt=link.rtt, speed=link.speed,
+                              preview=preview)
+
     def build_segments(self):
         # log('-'*20, 'build segments')
         # don't handle hls videos
@@ -622,13 +841,14 @@ class DownloadItem:
             # general files or video files with known sizes and resumable
             if self.resumable and self.size:
                 # get list of ranges i.e. [[0, 100], [101, 2000], ... ]
-                range_list = get_range_list(self.size, config.SEGMENT_SIZE)
+                range_list = self.plan_ranges(self.size, self.eff_url)
             else:
                 range_list = [None]  # add None in a list to make one segment with range=None
 
             _segments = [
                 Segment(name=os.path.join(self.temp_folder, str(i)), num=i, range=x,
-                        url=self.eff_url, tempfile=self.temp_file, media_type=self.type)
+                        url=self.eff_url, tempfile=self.temp_file, media_type=self.type,
+                        direct=self.direct_write and x is not None)
                 for i, x in enumerate(range_list)]
 
         # get an audio stream to be merged with dash video
@@ -643,11 +863,12 @@ class DownloadItem:
                     for i, x in enumerate(self.audio_fragments)]
 
             else:
-                range_list = get_range_list(self.audio_size, config.SEGMENT_SIZE)
+                range_list = self.plan_ranges(self.audio_size, self.audio_url)
 
                 audio_segments = [
                     Segment(name=os.path.join(self.temp_folder, str(i) + '_audio'), num=i, range=x,
-                            url=self.audio_url, tempfile=self.audio_file, media_type=MediaType.audio)
+                            url=self.audio_url, tempfile=self.audio_file, media_type=MediaType.audio,
+                            direct=self.direct_write and x is not None)
                     for i, x in enumerate(range_list)]
 
             # append to main list
@@ -663,12 +884,12 @@ class DownloadItem:
         self.segments = _segments
 
     def save_progress_info(self):
-        """save segments info to disk"""
-        progress_info = [{'name': seg.name, 'downloaded': seg.downloaded, 'completed': seg.completed, 'size': seg.size,
-                          '_range': seg.range, 'media_type': seg.media_type}
-                         for seg in self.segments]
-        file = os.path.join(self.temp_folder, 'progress_info.txt')
-        save_json(file, progress_info)
+        """save all segments info to disk, it replaces resume journal with a full snapshot"""
+        self.journal.write_snapshot(self.segments)
+
+    def journal_segments(self, *segments):
+        """append changed segments info to resume journal, cost doesn't depend on number of segments"""
+        self.journal.append(segments, self.segments)
 
     def load_progress_info(self):
         """
@@ -688,12 +909,10 @@ class DownloadItem:
         # log('load_progress_info()> Loading progress info')
         progress_info = []
 
-        # load progress info from temp folder if exist
-        progress_fp = os.path.join(self.temp_folder, 'progress_info.txt')
-        if os.path.isfile(progress_fp):
-            data = load_json(progress_fp)
-            if isinstance(data, list):
-                progress_info = data
+        # replay resume journal from temp folder if exist
+        data = self.journal.load()
+        if isinstance(data, list):
+            progress_info = data
 
         # # delete any segment which is not in progress_info file
         # if os.path.isdir(self.temp_folder):
@@ -705,7 +924,6 @@ class DownloadItem:
 
         # update segments from progress info
         if progress_info:
-            downloaded = 0
             # log('load_progress_info()> Found previous download on the disk')
 
             # verify segments on disk
@@ -715,20 +933,27 @@ class DownloadItem:
                 item['completed'] = False
 
                 try:
-                    size_on_disk = os.path.getsize(item.get('name'))
-                    downloaded += size_on_disk
+                    if item.get('direct'):
+                        # data written in place into temp file, "written" is the range map recorded on disk
+                        tempfile = self.audio_file if item.get('media_type') == MediaType.audio else self.temp_file
+                        size_on_disk = item.get('written', 0) if os.path.isfile(tempfile) else 0
+                    else:
+                        size_on_disk = os.path.getsize(item.get('name')) if os.path.isfile(item.get('name')) else 0
+                    item['written'] = size_on_disk
                     if size_on_disk > 0 and size_on_disk == item.get('size'):
                         item['downloaded'] = True
                 except:
                     continue
 
+            downloaded = sum(item.get('written', 0) for item in progress_info)
+
             # for dynamic made segments will build new segments from progress info
             if self.size and self.resumable and not self.fragments and 'hls' not in self.subtype_list:
                 self.segments.clear()
                 for i, item in enumerate(progress_info):
                     try:
                         seg = Segment()
-                        seg.__dict__.update(item)
+                        update_object(seg, item)
 
                         # update tempfile and url
                         if seg.media_type == MediaType.audio:
@@ -738,16 +963,23 @@ class DownloadItem:
                             seg.tempfile = self.temp_file
                             seg.url = self.eff_url
 
-                        self.segments.append(seg)
+                        self.add_segments(seg)
                     except:
                         pass
                 log('load_progress_info()> rebuild segments from previous download for:', self.name)
 
-            # for fixed segments will update segments list only
+            # for fixed segments will update segments list only, matched by name, segments order or number might
+            # differ from previous session, e.g. hls keys are downloaded once per key URI
             elif self.segments:
-                for seg, item in zip(self.segments, progress_info):
-                    if seg.name == item.get('name'):
-                        seg.__dict__.update(item)
+                info_map = {item.get('name'): item for item in progress_info}
+
+                # stale records of segments no longer in the list aren't counted, e.g. per-segment hls keys
+                downloaded = 0
+                for seg in self.segments:
+                    item = info_map.get(seg.name)
+                    if item:
+                        update_object(seg, item)
+                        downloaded += item.get('written', 0)
                 log('load_progress_info()> updated current segments for:', self.name)
 
             # update self.downloaded
@@ -756,6 +988,13 @@ class DownloadItem:
             # update media files progress
             self.update_media_files_progress()
 
+        self.progress_info_loaded = True
+
+    def ensure_progress_info(self):
+        """load progress info if not loaded yet, e.g. a history item loaded at startup"""
+        if not self.progress_info_loaded:
+            self.load_progress_info()
+
     def update_media_files_progress(self):
         """get the percentage of media files completion, e.g. temp video file, audio file, and final target file
 
@@ -768,8 +1007,10 @@ class DownloadItem:
             return
 
         def _get_progress(fp, full_size):
+            direct_segs = [seg for seg in self.segments if seg.direct and seg.tempfile == fp]
             try:
-                current_size = os.path.getsize(fp)
+                # direct-write temp files are preallocated, their size on disk doesn't reflect progress
+                current_size = sum(seg.written for seg in direct_segs) if direct_segs else os.path.getsize(fp)
             except:
                 current_size = 0
 
@@ -792,16 +1033,43 @@ class DownloadItem:
             
         self.merge_progress = _get_progress(self.target_file, self.total_size)
 
+    def mark_segment_changed(self, seg):
+        """add a segment to be reported by next update_segments_progress(activeonly=True), called by workers"""
+        self._changed_segments.add(seg)
+
+    def _pop_changed_segments(self):
+        # set.pop() is thread safe, workers might add segments meanwhile
+        segs = []
+        changed = self._changed_segments
+        while changed:
+            try:
+                segs.append(changed.pop())
+            except KeyError:
+                break
+        return segs
+
+    def _get_segment_index(self, seg):
+        index = self._segments_index.get(seg)
+        if index is None:
+            # new or rebuilt segments list
+            self._segments_index = {s: i for i, s in enumerate(self.segments)}
+            index = self._segments_index.get(seg)
+        return index
+
     def update_segments_progress(self, activeonly=False):
-        """set self.segments_progress, e.g [total size, [(starting range, length, total file size), ...]]"""
+        """set self.segments_progress, e.g [total size, [(starting range, length), ...]]
+
+        Args:
+            activeonly (bool): report only segments changed since last report, it doesn't scan all segments, otherwise
+            report all segments
+        """
         segments_progress = None
 
         if self.status == config.Status.completed:
             segments_progress = [100, [(0, 100)]]
 
         else:
-            spb = self.segments_progress_bool
-            c = (lambda seg: seg not in spb) if activeonly else (lambda seg: True)  # condition
+            segs = self._pop_changed_segments() if activeonly else self.segments
             total_size = self.total_size
 
             try:
@@ -811,22 +1079,20 @@ class DownloadItem:
                     # will use segments numbers as a starting point and segment size = 1
 
                     total_size = len(self.segments)
-                    sp = [(self.segments.index(seg), 1) for seg in self.segments if seg.downloaded and c(seg)]
+                    sp = [(self._get_segment_index(seg), 1) for seg in segs if seg.downloaded]
+                    sp = [item for item in sp if item[0] is not None]
 
                 # handle other video types
                 elif self.type == MediaType.video:
-
-                    vid = [(seg.range[0], seg.down_bytes) for seg in self.video_segments if c(seg)]
-                    aud = [(seg.range[0] + self.video_size - 1, seg.down_bytes) for seg in self.audio_segments if c(seg)]
-
-                    sp = vid + aud
+                    sp = [(seg.range[0], seg.down_bytes) for seg in segs if seg.media_type == MediaType.video]
+                    sp += [(seg.range[0] + self.video_size - 1, seg.down_bytes) for seg in segs
+                           if seg.media_type == MediaType.audio]
 
                 # handle non video items
                 else:
-                    sp = [(seg.range[0], seg.down_bytes) for seg in self.segments if c(seg)]
+                    sp = [(seg.range[0], seg.down_bytes) for seg in segs]
 
                 sp = [item for item in sp if item[1]]
-                spb.extend([seg for seg in self.segments if seg.downloaded])
                 segments_progress = [total_size, sp]
 
             except Exception as e:
@@ -0,0 +1,203 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        download queue, decides which pending download item starts next, and starts it the moment a download slot is
+        free, i.e. number of active downloads is less than config.max_concurrent_downloads.
+
+        pending items with higher "priority" start first, items with the same priority are shared fairly between
+        hosts, next item is taken from the host with the least active downloads, and hosts take turns when they are
+        equal, items of the same host start in the order they were queued.
+
+        queue knows when the last active download is done and nothing is pending, it calls "idle_callback" at that
+        moment, e.g. for on-completion actions, instead of watching all download items' status.
+"""
+
+import itertools
+from collections import deque
+from threading import Condition, Thread
+
+from . import config
+from .connections import HostConnectionBudget
+from .utils import log
+
+
+class DownloadQueue:
+    """event driven download queue
+
+    Args:
+        start_callback (callable): called with a download item in queue thread to start it, it must not block, and
+        the caller must call deactivate() when the download is done
+        idle_callback (callable): called without arguments, in the thread which called deactivate(), when no download
+        is active or pending, it must not block
+    """
+
+    # max. sleep time when nothing happens, to pick up changes in config.max_concurrent_downloads
+    idle_timeout = 1
+
+    def __init__(self, start_callback, idle_callback=None):
+        self.start_callback = start_callback
+        self.idle_callback = idle_callback
+        self._cond = Condition()
+        self._levels = {}  # key=priority, value=dict of {host: deque of pending download items}
+        self._front = deque()  # pending download items moved to front of queue
+        self._entries = {}  # key=download item uid, value=(priority, host) of pending item
+        self._active = {}  # key=download item uid, value=host
+        self._host_active = {}  # key=host, value=number of active downloads
+        self._host_turn = {}  # key=host, value=sequence number of last start, for round robin between equal hosts
+        self._counter = itertools.count()
+        self._thread = None
+
+    @property
+    def pending_count(self):
+        return len(self._entries)
+
+    @property
+    def active_count(self):
+        return len(self._active)
+
+    def start(self):
+        """start queue thread"""
+        if self._thread is None:
+            self._thread = Thread(target=self._run, daemon=True, name='download queue')
+            self._thread.start()
+
+    def put(self, d, priority=None):
+        """add a download item to queue, or move it to a new priority if already queued
+
+        Args:
+            d (DownloadItem): download item
+            priority (int): priority, higher starts first, default is download item's "priority" property
+        """
+        priority = d.priority if priority is None else priority
+
+        with self._cond:
+            self._discard(d)
+            self._add(d, priority)
+
+    def remove(self, d):
+        """remove a pending download item from queue
+
+        Returns:
+            (bool): True if item was pending
+        """
+        with self._cond:
+            return self._discard(d)
+
+    def set_priority(self, d, priority):
+        """change priority of a download item, pending item is moved to the end of its new priority level"""
+        d.priority = priority
+        with self._cond:
+            if d.uid in self._entries:
+                self._discard(d)
+                self._add(d, priority)
+
+    def move_to_front(self, d):
+        """make a pending download item the next one to start regardless of priority and hosts"""
+        with self._cond:
+            if self._discard(d):
+                self._front.appendleft(d)
+                self._entries[d.uid] = (None, None)
+
+    def is_pending(self, d):
+        return d.uid in self._entries
+
+    def activate(self, d):
+        """count a download item as active, e.g. started without queue"""
+        with self._cond:
+            self._activate(d)
+
+    def deactivate(self, d):
+        """download item is done, its slot is free"""
+        with self._cond:
+            host = self._active.pop(d.uid, None)
+            if host is None:
+                return
+
+            self._host_active[host] -= 1
+            if not self._host_active[host]:
+                del self._host_active[host]
+            self._cond.notify()
+
+            idle = not self._active and not self._entries
+
+        if idle and self.idle_callback:
+            try:
+                self.idle_callback()
+            except Exception as e:
+                log('DownloadQueue()> idle callback error:', e)
+
+    def _add(self, d, priority):
+        host = HostConnectionBudget.get_host(d.url)
+        self._levels.setdefault(priority, {}).setdefault(host, deque()).append(d)
+        self._entries[d.uid] = (priority, host)
+        self._cond.notify()
+
+    def _discard(self, d):
+        entry = self._entries.pop(d.uid, None)
+        if entry is None:
+            return False
+
+        priority, host = entry
+        items = self._front if priority is None else self._levels[priority][host]
+        for item in items:
+            # match by uid, queued object might be a different copy of the same download item
+            if item.uid == d.uid:
+                items.remove(item)
+                break
+
+        if priority is not None:
+            self._remove_empty(priority, host)
+
+        return True
+
+    def _remove_empty(self, priority, host):
+        hosts = self._levels[priority]
+        if not hosts[host]:
+            del hosts[host]
+        if not hosts:
+            del self._levels[priority]
+
+    def _activate(self, d):
+        if d.uid not in self._active:
+            host = HostConnectionBudget.get_host(d.url)
+            self._active[d.uid] = host
+            self._host_active[host] = self._host_active.get(host, 0) + 1
+
+    def _pop_next(self):
+        if self._front:
+            d = self._front.popleft()
+            del self._entries[d.uid]
+            return d
+
+        # highest priority level, then host with least active downloads, then host which waited longest
+        priority = max(self._levels)
+        hosts = self._levels[priority]
+        host = min(hosts, key=lambda h: (self._host_active.get(h, 0), self._host_turn.get(h, -1)))
+        d = hosts[host].popleft()
+        del self._entries[d.uid]
+        self._remove_empty(priority, host)
+        self._host_turn[host] = next(self._counter)
+        return d
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not (self._entries and len(self._active) < config.max_concurrent_downloads):
+                    self._cond.wait(self.idle_timeout)
+
+                d = self._pop_next()
+
+                # reserve slot before starting, the download might take a while to change its status
+                self._activate(d)
+
+            try:
+                self.start_callback(d)
+            except Exception as e:
+                log('DownloadQueue()> error:', e)
+                self.deactivate(d)
@@ -0,0 +1,323 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        download engines used by brain.thread_manager to run workers.
+        "threads" engine runs every worker in its own thread, blocking in pycurl.Curl.perform()
+        "curl_multi" engine drives all workers of all active download items from one reactor thread using
+        pycurl.CurlMulti, selectors, and socket_action, which save the cost of thread switching and GIL contention
+        when number of connections grows.
+"""
+
+import time
+import heapq
+import socket
+import selectors
+import itertools
+from collections import deque
+from threading import Thread, Event, Lock
+
+import pycurl
+
+from . import config
+from .utils import log
+
+
+class Transfer:
+    """a handle for a running worker, has Thread like is_alive() to be used in thread_manager"""
+
+    def __init__(self, worker):
+        self.worker = worker
+        self.done = Event()
+
+    def is_alive(self):
+        return not self.done.is_set()
+
+    def set_done(self):
+        """mark transfer finished and wake up download item's managers, must be called after worker.finalize()"""
+        self.done.set()
+
+        if self.worker.ctx:
+            self.worker.ctx.signal()
+
+    def __repr__(self):
+        return f'Transfer({self.worker})'
+
+
+class CurlMultiEngine:
+    """event loop that drives pycurl easy handles thru one pycurl.CurlMulti object
+
+    workers are submitted from any thread, however curl multi handle is not thread safe and it will be touched only
+    from the reactor thread, new workers are queued and the reactor will be woken up thru a socket pair.
+    """
+
+    def __init__(self):
+        self.multi = pycurl.CurlMulti()
+        self.multi.setopt(pycurl.M_SOCKETFUNCTION, self._socket_callback)
+        self.multi.setopt(pycurl.M_TIMERFUNCTION, self._timer_callback)
+
+        self.selector = selectors.DefaultSelector()
+
+        # socket pair used to wake up reactor from select() when a new worker submitted
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+        self.selector.register(self._wakeup_r, selectors.EVENT_READ)
+
+        self._pending = deque()  # transfers waiting to be added to multi handle
+        self._lock = Lock()
+        self._transfers = {}  # key=curl easy handle, value=Transfer
+        self._deadline = None  # time when curl wants socket_action(SOCKET_TIMEOUT) to be called, None=no timer
+
+        # transfers paused by bandwidth limiter, heap of (resume time, counter, Transfer)
+        self._paused = []
+        self._counter = itertools.count()
+
+        self._thread = None
+
+    @property
+    def active_transfers(self):
+        return len(self._transfers)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._thread = Thread(target=self._run, daemon=True, name='curl_multi_engine')
+        self._thread.start()
+
+    def submit(self, worker):
+        """queue a worker to be downloaded by reactor thread
+
+        Args:
+            worker (Worker): worker object, ready to run, i.e. worker.reuse() already called
+
+        Returns:
+            (Transfer): object has is_alive() method
+        """
+        transfer = Transfer(worker)
+
+        with self._lock:
+            self._pending.append(transfer)
+
+        self.start()
+        self._wakeup()
+
+        return transfer
+
+    def _wakeup(self):
+        try:
+            self._wakeup_w.send(b'x')
+        except (BlockingIOError, InterruptedError):
+            # socket buffer is full, reactor will wake up anyway
+            pass
+
+    def _drain_wakeup(self):
+        try:
+            while self._wakeup_r.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+    def _socket_callback(self, what, sock_fd, multi, socketp):
+        """called by libcurl to tell which events to watch for on a socket"""
+        try:
+            if what == pycurl.POLL_REMOVE:
+                self.selector.unregister(sock_fd)
+                return
+        except (KeyError, ValueError):
+            return
+
+        events = 0
+        if what in (pycurl.POLL_IN, pycurl.POLL_INOUT):
+            events |= selectors.EVENT_READ
+        if what in (pycurl.POLL_OUT, pycurl.POLL_INOUT):
+            events |= selectors.EVENT_WRITE
+
+        # POLL_NONE, curl doesn't want any events for now, selectors refuse an empty events mask
+        if not events:
+            try:
+                self.selector.unregister(sock_fd)
+            except (KeyError, ValueError):
+                pass
+            return
+
+        try:
+            self.selector.modify(sock_fd, events)
+        except KeyError:
+            self.selector.register(sock_fd, events)
+
+    def _timer_callback(self, timeout_ms):
+        """called by libcurl to set a single timeout, -1 means delete timer"""
+        if timeout_ms < 0:
+            self._deadline = None
+        else:
+            self._deadline = time.monotonic() + timeout_ms / 1000
+
+    def _socket_action(self, sock_fd, ev_bitmask):
+        try:
+            self.multi.socket_action(sock_fd, ev_bitmask)
+        except pycurl.error as e:
+            log('CurlMultiEngine.socket_action()> error:', e, log_level=3)
+
+    def _add_pending(self):
+        with self._lock:
+            pending = list(self._pending)
+            self._pending.clear()
+
+        for transfer in pending:
+            self._add_transfer(transfer)
+
+    def _add_transfer(self, transfer):
+        worker = transfer.worker
+        try:
+            worker.prepare()
+        except Exception as e:
+            worker.handle_error(e)
+            self._finish_transfer(transfer)
+            return
+
+        worker.pause_callback = lambda delay, transfer=transfer: self._pause(transfer, delay)
+        self._transfers[worker.c] = transfer
+        self.multi.add_handle(worker.c)
+
+    def _pause(self, transfer, delay):
+        """schedule resuming a transfer paused by bandwidth limiter, called from worker's write callback in reactor
+        thread, worker itself pauses the transfer by returning pycurl.WRITEFUNC_PAUSE from its write callback, note:
+        calling curl.pause() from inside callbacks breaks pycurl's multi state, "multi_perform() already running"
+        """
+        heapq.heappush(self._paused, (time.monotonic() + delay, next(self._counter), transfer))
+
+    def _resume_paused(self):
+        now = time.monotonic()
+        while self._paused and self._paused[0][0] <= now:
+            _, _, transfer = heapq.heappop(self._paused)
+            c = transfer.worker.c
+
+            # transfer might be finished / removed while paused
+            if self._transfers.get(c) is transfer:
+                try:
+                    c.pause(pycurl.PAUSE_CONT)
+                except pycurl.error as e:
+                    log('CurlMultiEngine.resume()> error:', e, log_level=3)
+
+    def _finish_transfer(self, transfer, error=None):
+        worker = transfer.worker
+        try:
+            if error is None:
+                worker.check_response()
+            else:
+                worker.handle_error(error)
+        except Exception as e:
+            log('CurlMultiEngine> error:', e, '- worker', worker.tag, log_level=3)
+        finally:
+            worker.finalize()
+
+            # next fragment of worker's batch, same easy handle is added again and reuses its connection
+            if worker.next_segment():
+                self._add_transfer(transfer)
+            else:
+                transfer.set_done()
+
+    def _check_completed(self):
+        while True:
+            num_queued, ok_list, err_list = self.multi.info_read()
+
+            for c in ok_list:
+                self.multi.remove_handle(c)
+                transfer = self._transfers.pop(c, None)
+                if transfer:
+                    self._finish_transfer(transfer)
+
+            for c, errno, errmsg in err_list:
+                self.multi.remove_handle(c)
+                transfer = self._transfers.pop(c, None)
+                if transfer:
+                    self._finish_transfer(transfer, error=pycurl.error(errno, errmsg))
+
+            if num_queued == 0:
+                break
+
+    def _run(self):
+        log('CurlMultiEngine: started', log_level=3)
+
+        while not config.shutdown:
+            self._add_pending()
+            self._resume_paused()
+
+            if self._deadline is None:
+                # no running transfers, block until a new worker submitted
+                timeout = None if not self._transfers else 1
+            else:
+                timeout = max(0, self._deadline - time.monotonic())
+
+            if self._paused:
+                resume_timeout = max(0, self._paused[0][0] - time.monotonic())
+                timeout = resume_timeout if timeout is None else min(timeout, resume_timeout)
+
+            events = self.selector.select(timeout)
+
+            for key, mask in events:
+                if key.fileobj is self._wakeup_r:
+                    self._drain_wakeup()
+                    continue
+
+                ev_bitmask = 0
+                if mask & selectors.EVENT_READ:
+                    ev_bitmask |= pycurl.CSELECT_IN
+                if mask & selectors.EVENT_WRITE:
+                    ev_bitmask |= pycurl.CSELECT_OUT
+
+                self._socket_action(key.fd, ev_bitmask)
+
+            if self._deadline is not None and time.monotonic() >= self._deadline:
+                self._deadline = None
+                self._socket_action(pycurl.SOCKET_TIMEOUT, 0)
+
+            self._check_completed()
+
+        log('CurlMultiEngine: quitting', log_level=3)
+
+
+# one engine for the whole application, created on first use
+_curl_multi_engine = None
+_engine_lock = Lock()
+
+
+def get_curl_multi_engine():
+    global _curl_multi_engine
+
+    with _engine_lock:
+        if _curl_multi_engine is None:
+            _curl_multi_engine = CurlMultiEngine()
+
+    return _curl_multi_engine
+
+
+def start_worker(worker):
+    """run worker using the engine selected in settings
+
+    Args:
+        worker (Worker): worker object, ready to run, i.e. worker.reuse() already called
+
+    Returns:
+        (Transfer): object has is_alive() method
+    """
+    if config.download_engine == 'curl_multi':
+        return get_curl_multi_engine().submit(worker)
+    else:
+        transfer = Transfer(worker)
+
+        def run():
+            try:
+                worker.run()
+            finally:
+                transfer.set_done()
+
+        Thread(target=run, daemon=True).start()
+        return transfer
@@ -0,0 +1,155 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        append-only resume journal, keeps segments' progress info in download item's temp folder.
+
+        journal file is a text file with one json record per line, every record is a segment's info, e.g.
+        {"name": "/downloads/temp/3", "_range": [0, 1023], "written": 512, ...}, later records of the same segment
+        name override older ones, and new segments are added in order of appearance.
+
+        writing a record costs the same regardless of number of segments, when the journal grows too big compared to
+        number of segments it is compacted, i.e. rewritten as a snapshot with one record per segment in a temporary
+        file which replaces journal file atomically, a process killed in the middle of writing leaves at most one
+        incomplete last line, which is ignored when loading.
+"""
+
+import os
+import json
+from threading import Lock
+
+from .utils import log, delete_file
+
+
+def segment_info(seg):
+    """segment's info to be saved for resuming"""
+    return {'name': seg.name, 'downloaded': seg.downloaded, 'completed': seg.completed, 'size': seg.size,
+            '_range': seg.range, 'media_type': seg.media_type, 'direct': seg.direct, 'written': seg.written}
+
+
+class ProgressJournal:
+    """resume journal of a download item
+
+    Args:
+        folder (str): download item's temp folder
+    """
+    file_name = 'progress_journal.txt'
+    legacy_file_name = 'progress_info.txt'  # json list, written by older versions
+
+    # compact journal when number of records exceeds this ratio of segments number, and the minimum records number
+    compaction_ratio = 2
+    min_compaction_records = 1000
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.fp = os.path.join(folder, self.file_name)
+        self.records = None  # number of records in journal file, None means unknown
+        self._lock = Lock()
+
+    def append(self, segments, all_segments):
+        """add records of changed segments to journal
+
+        Args:
+            segments (iterable): changed segments
+            all_segments (list): all segments of download item, used if journal needs a full snapshot
+        """
+        with self._lock:
+            if self.records is None:
+                self.records = self._count_records()
+
+            items = [segment_info(seg) for seg in segments]
+
+            # journal must start with a full snapshot, and be compacted when it grows too big
+            max_records = max(self.min_compaction_records, self.compaction_ratio * len(all_segments))
+            if not self.records or self.records + len(items) > max_records:
+                self._write_snapshot([segment_info(seg) for seg in all_segments])
+                return
+
+            try:
+                with open(self.fp, 'a', encoding='utf-8') as f:
+                    f.write(''.join(self._dump(item) for item in items))
+                self.records += len(items)
+            except Exception as e:
+                log('ProgressJournal.append()> error:', e, self.fp, log_level=3)
+
+    def write_snapshot(self, all_segments):
+        """replace journal with one record per segment
+
+        Args:
+            all_segments (list): all segments of download item
+        """
+        with self._lock:
+            self._write_snapshot([segment_info(seg) for seg in all_segments])
+
+    def load(self):
+        """replay journal
+
+        Returns:
+            (list): segments' info dicts in order of appearance, or None if there is no saved progress info
+        """
+        with self._lock:
+            if os.path.isfile(self.fp):
+                segments = {}
+                records = 0
+                broken = False
+                with open(self.fp, encoding='utf-8', errors='replace') as f:
+                    for line in f:
+                        try:
+                            item = json.loads(line)
+                            segments.setdefault(item['name'], {}).update(item)
+                            records += 1
+                        except Exception:
+                            # incomplete last record of an interrupted write
+                            broken = True
+
+                # zero records forces a new snapshot with next append, new records will not be glued to a broken line
+                self.records = 0 if broken else records
+                return list(segments.values())
+
+            # progress info saved by older versions
+            legacy_fp = os.path.join(self.folder, self.legacy_file_name)
+            if os.path.isfile(legacy_fp):
+                try:
+                    with open(legacy_fp, encoding='utf-8') as f:
+                        data = json.load(f)
+                    if isinstance(data, list):
+                        return data
+                except Exception as e:
+                    log('ProgressJournal.load()> error:', e, legacy_fp, log_level=3)
+
+            return None
+
+    def _count_records(self):
+        try:
+            with open(self.fp, 'rb') as f:
+                return sum(1 for _ in f)
+        except FileNotFoundError:
+            return 0
+
+    def _write_snapshot(self, items):
+        tmp_fp = self.fp + '.tmp'
+        try:
+            with open(tmp_fp, 'w', encoding='utf-8') as f:
+                f.write(''.join(self._dump(item) for item in items))
+                f.flush()
+                os.fsync(f.fileno())
+
+            # atomic swap, old journal stays intact if we get killed before this point
+            os.replace(tmp_fp, self.fp)
+            self.records = len(items)
+
+            # older versions' progress info is obsolete now
+            legacy_fp = os.path.join(self.folder, self.legacy_file_name)
+            if os.path.isfile(legacy_fp):
+                delete_file(legacy_fp)
+        except Exception as e:
+            log('ProgressJournal.write_snapshot()> error:', e, self.fp, log_level=3)
+
+    @staticmethod
+    def _dump(item):
+        return json.dumps(item, separators=(',', ':')) + '\n'
@@ -0,0 +1,157 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        process-wide bandwidth limiter, all workers of all download items draw tokens from one token bucket, so
+        config.speed_limit is the total download rate of the whole application regardless of number of downloads or
+        connections, a stalled connection doesn't hold any share, its bandwidth is used by other connections at once.
+
+        every download item may have a "speed_limit" cap of its own, and a "bandwidth_weight" to get a bigger or
+        smaller share of the global rate when downloads compete for it.
+
+        tokens are consumed after data is received, a consumer may drive a bucket into debt, and it is told how long
+        to wait until the debt is paid off, "threads" engine workers sleep, "curl_multi" engine pauses the handle.
+"""
+
+import time
+from threading import Lock
+
+from . import config
+
+
+class TokenBucket:
+    """token bucket with debt
+
+    Args:
+        rate (int): tokens (bytes) per second, 0 means unlimited
+        burst (float): bucket capacity in seconds worth of tokens
+    """
+
+    def __init__(self, rate=0, burst=0.25):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = 0
+        self.timestamp = time.monotonic()
+
+    def refill(self, now):
+        if self.rate:
+            self.tokens = min(self.rate * self.burst, self.tokens + (now - self.timestamp) * self.rate)
+        self.timestamp = now
+
+    def consume(self, n, now):
+        """take n tokens, tokens could go negative
+
+        Returns:
+            (float): seconds to wait until debt is paid off, 0 if there is no debt
+        """
+        self.refill(now)
+        if not self.rate:
+            self.tokens = 0
+            return 0
+
+        self.tokens -= n
+        return -self.tokens / self.rate if self.tokens < 0 else 0
+
+
+class _ItemState:
+    """download item's limiter state"""
+
+    def __init__(self):
+        self.cap = TokenBucket()  # download item's own speed limit
+        self.share = TokenBucket()  # weighted share of global rate, enforced only when global bucket is in debt
+        self.weight = 1
+        self.last_active = 0
+
+
+class BandwidthLimiter:
+    """global bandwidth limiter, use the module level "limiter" object"""
+
+    # seconds, download item which didn't receive data during this time doesn't take a share of global rate
+    activity_window = 0.5
+
+    def __init__(self):
+        self._lock = Lock()
+        self.bucket = TokenBucket()
+        self.items = {}  # key=download item uid, value=_ItemState
+
+    @staticmethod
+    def is_limited(d=None):
+        """True if global speed limit or download item's own speed limit is set"""
+        return bool(config.speed_limit or getattr(d, 'speed_limit', 0))
+
+    def consume(self, d, n):
+        """report received bytes
+
+        Args:
+            d (DownloadItem): download item which received data
+            n (int): number of received bytes
+
+        Returns:
+            (float): seconds the caller must wait before receiving more data
+        """
+        if not self.is_limited(d):
+            return 0
+
+        with self._lock:
+            now = time.monotonic()
+
+            self.bucket.rate = config.speed_limit
+            delay = self.bucket.consume(n, now)
+
+            item = self.items.get(d.uid)
+            if item is None:
+                item = self.items[d.uid] = _ItemState()
+
+            item.last_active = now
+            item.weight = max(getattr(d, 'bandwidth_weight', 1) or 1, 0.01)
+
+            # download item's own cap
+            item.cap.rate = getattr(d, 'speed_limit', 0)
+            delay = max(delay, item.cap.consume(n, now))
+
+            # weighted share of global rate between active download items, spare bandwidth isn't reserved for
+            # anyone, it is only enforced when global bucket is in debt, i.e. downloads compete for bandwidth
+            if self.bucket.rate:
+                item.share.rate = self._share_rate(item, now)
+                share_delay = item.share.consume(n, now)
+                if self.bucket.tokens < 0:
+                    delay = max(delay, share_delay)
+
+            return delay
+
+    def _share_rate(self, item, now):
+        """weighted share of global rate, max-min fair, i.e. a download item capped by its own speed limit below its
+        share gets its cap, and the rest is shared by the other active download items"""
+        active = []
+        for uid, other in list(self.items.items()):
+            if now - other.last_active <= self.activity_window:
+                active.append(other)
+            elif now - other.last_active > 60:
+                # forget finished downloads
+                del self.items[uid]
+
+        rate = self.bucket.rate
+        weights = sum(other.weight for other in active)
+
+        # smallest cap per weight first, once an item isn't capped, the following items aren't capped either
+        for other in sorted(active, key=lambda x: (x.cap.rate or float('inf')) / x.weight):
+            share = rate * other.weight / weights
+            if other.cap.rate:
+                share = min(share, other.cap.rate)
+
+            if other is item:
+                return share
+
+            rate -= share
+            weights -= other.weight
+
+        return rate
+
+
+# one limiter for the whole application
+limiter = BandwidthLimiter()
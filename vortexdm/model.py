@@ -10,14 +10,85 @@
         this module contains an observables data models
 """
 import os
+import time
+from threading import Lock, Thread
 
 from .downloaditem import DownloadItem
 from .video import Video
 from . import utils
 
 
+class UpdatesFlusher:
+    """collect changed properties of observables and deliver them to observer callbacks in batches, use the module
+    level "updates_flusher" object
+
+    a property changed many times between two flushes is delivered once with its latest value, e.g. "downloaded" which
+    is set by workers many times a second, flushing thread runs only while there are pending changes.
+    """
+    interval = 0.1  # seconds between flushes
+
+    def __init__(self):
+        self._lock = Lock()
+        self._changes = {}  # key=id(observable), value=(observable, dict of changed properties)
+        self._thread = None
+
+    def add(self, observable, key, value):
+        with self._lock:
+            item = self._changes.get(id(observable))
+            if item is None:
+                item = self._changes[id(observable)] = (observable, {})
+            item[1][key] = value
+
+            if self._thread is None:
+                self._thread = Thread(target=self._run, daemon=True, name='updates flusher')
+                self._thread.start()
+
+    def flush(self, observable=None):
+        """deliver pending changes now
+
+        Args:
+            observable (Observable): flush only this observable's changes, if None flush all
+        """
+        with self._lock:
+            if observable is None:
+                items = list(self._changes.values())
+                self._changes.clear()
+            else:
+                item = self._changes.pop(id(observable), None)
+                items = [item] if item else []
+
+        for observable, changes in items:
+            try:
+                observable.deliver(changes)
+            except Exception as e:
+                utils.log('UpdatesFlusher()> error:', e, log_level=3)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+
+            with self._lock:
+                if not self._changes:
+                    self._thread = None
+                    return
+
+            self.flush()
+
+
+# one flusher for the whole application
+updates_flusher = UpdatesFlusher()
+
+
 class Observable:
     """super class for observable download item / Video"""
+
+    # properties reported to observer callbacks
+    watch_list = frozenset(['uid', 'name', 'progress', 'speed', 'eta', 'downloaded', 'size', '_total_size',
+                            'total_size', 'status', 'busy', 'thumbnail', 'type', 'subtype_list', 'resumable', 'title',
+                            'extension', 'errors', 'sched', 'remaining_parts', 'live_connections', 'total_parts',
+                            'shutdown_pc', 'on_completion_command', 'video_progress', 'audio_progress',
+                            'merge_progress', 'segments_progress', 'duration', 'duration_string'])
+
     def __init__(self, observer_callbacks=None):
         """initialize
 
@@ -26,12 +97,6 @@ class Observable:
             watch_list changes
         """
 
-        self.watch_list = ['uid', 'name', 'progress', 'speed', 'eta', 'downloaded', 'size', '_total_size',
-                           'total_size', 'status', 'busy', 'thumbnail', 'type', 'subtype_list', 'resumable', 'title',
-                           'extension', 'errors', 'sched', 'remaining_parts', 'live_connections', 'total_parts',
-                           'shutdown_pc', 'on_completion_command', 'video_progress', 'audio_progress', 'merge_progress',
-                           'segments_progress', 'duration', 'duration_string']
-
         # list of callbacks to be executed on properties change
         self.observer_callbacks = observer_callbacks or []
 
@@ -43,6 +108,12 @@ class Observable:
 
         """
 
+        # other attributes are set directly, they are assigned in hot loops, e.g. by workers
+        watched = key in self.watch_list or key == 'folder'
+        if not watched:
+            super_class.__setattr__(self, key, value)
+            return
+
         try:
             old_value = super_class.__getattribute__(self, key)
         except:
@@ -52,6 +123,10 @@ class Observable:
         if key == 'folder':
             value = os.path.normpath(value)
 
+        # pending changes belong to old uid
+        if key == 'uid' and value != old_value:
+            self.flush_updates()
+
         # set new value
         super_class.__setattr__(self, key, value)
         # self.__dict__[key] = value  # don't use this because it doesn't work well with decorated properties
@@ -64,15 +139,19 @@ class Observable:
             self.notify(key, value)
 
     def notify(self, key, value):
-        """notify observer callbacks with every property change,
-        uid will be sent with every property"""
-        if key in self.watch_list:
-            # include 'uid' with every property change,
-            # in same time we should avoid repeated 'uid' key in the same dictionary,
-            # note "repeated dictionary keys won't raise an error any way"
-            # see https://bugs.python.org/issue16385
-            buffer = {'uid': self.uid, key: value} if key != 'uid' else {key: value}
-            self._notify(**buffer)
+        """record a property change, changes are delivered to observer callbacks in batches by updates_flusher"""
+        if key in self.watch_list and self.observer_callbacks:
+            updates_flusher.add(self, key, value)
+
+    def flush_updates(self):
+        """deliver pending property changes of this object now"""
+        updates_flusher.flush(self)
+
+    def deliver(self, changes):
+        """notify observer callbacks with a batch of changed properties, uid will be sent with every batch"""
+        buffer = {'uid': self.uid}
+        buffer.update(changes)
+        self._notify(**buffer)
 
     def _notify(self, **kwargs):
         """execute registered callbacks"""
@@ -0,0 +1,417 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        scheduling context for a single download item, it holds the channels between workers and thread manager,
+        every running brain has its own context, so concurrent downloads don't drain each other's errors and jobs.
+        it is also an event source, workers signal when they finish, fail, or report errors, and download item signals
+        status changes, brain, thread manager, and file manager sleep in wait() until something happened, instead of
+        polling segments and queues in short sleep loops.
+
+        FragmentBatcher decides how many small fragments a worker downloads back-to-back on one connection.
+
+        SegmentSplitter decides which running segment to split in auto-segmentation, and where.
+
+        EndGame races the slowest running segments with shadow copies near completion, and "tail_stats" keeps the
+        time every download took from 95% to 100%.
+"""
+
+import math
+import time
+from queue import Queue, Empty
+from collections import deque
+from threading import Condition, Lock
+
+
+class ErrorRecord:
+    """structured error reported by a worker
+
+    Args:
+        kind (str): one of ErrorRecord.kinds
+        code (int): http response code for 'http' errors, libcurl error number for 'curl' errors, otherwise 0
+        description (str): human readable description
+        seg_name (str): segment basename
+        worker_tag (int): worker tag number
+    """
+    http = 'http'  # server responded with error code, e.g. 403, 429, 503
+    curl = 'curl'  # connection / transfer error raised by libcurl
+    html = 'html'  # server sent html contents instead of file data
+    other = 'other'
+    kinds = (http, curl, html, other)
+
+    def __init__(self, kind=other, code=0, description='', seg_name='', worker_tag=None):
+        self.kind = kind
+        self.code = code
+        self.description = description
+        self.seg_name = seg_name
+        self.worker_tag = worker_tag
+        self.timestamp = time.time()
+
+    @property
+    def is_throttling(self):
+        """True if server asks us to slow down, i.e. "429 Too Many Requests" or "503 Service Unavailable" """
+        return self.kind == ErrorRecord.http and self.code in (429, 503)
+
+    def __repr__(self):
+        return f'ErrorRecord({self.kind}, {self.code}, {self.description!r}, seg={self.seg_name}, ' \
+               f'worker={self.worker_tag})'
+
+
+class SchedulingContext:
+    """channels between a download item's workers and its thread manager"""
+
+    def __init__(self, d=None):
+        self.d = d  # reference to DownloadItem
+        self._errors = Queue()  # ErrorRecord objects reported by workers
+        self._failed_jobs = Queue()  # segments returned by workers to be downloaded again
+
+        self._cond = Condition()
+        self._sequence = 0  # events counter, incremented by every signal()
+
+    @property
+    def sequence(self):
+        return self._sequence
+
+    def signal(self):
+        """wake up all threads waiting for this download item's events"""
+        with self._cond:
+            self._sequence += 1
+            self._cond.notify_all()
+
+    def wait(self, sequence, timeout=None):
+        """block until an event newer than sequence is signaled or timeout expires
+
+        Args:
+            sequence (int): last seen events sequence, returned from previous wait() call or sequence property
+            timeout (float): max. waiting time in seconds, None means wait for an event forever
+
+        Returns:
+            (int): current events sequence, to be passed to next wait() call, events signaled while caller was busy
+            will not be missed
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._sequence != sequence, timeout)
+            return self._sequence
+
+    def wait_for(self, predicate, timeout=None):
+        """block until predicate becomes true or timeout expires, predicate is checked only when an event signaled
+
+        Returns:
+            (bool): last result of predicate
+        """
+        with self._cond:
+            return self._cond.wait_for(predicate, timeout)
+
+    def report_error(self, record):
+        self._errors.put(record)
+        self.signal()
+
+    def report_failed_job(self, seg):
+        self._failed_jobs.put(seg)
+        self.signal()
+
+    @property
+    def failed_jobs_num(self):
+        return self._failed_jobs.qsize()
+
+    @property
+    def errors_num(self):
+        return self._errors.qsize()
+
+    @staticmethod
+    def _drain(q):
+        items = []
+        while True:
+            try:
+                items.append(q.get_nowait())
+            except Empty:
+                return items
+
+    def get_errors(self):
+        """return and remove all reported error records"""
+        return self._drain(self._errors)
+
+    def get_failed_jobs(self):
+        """return and remove all returned segments"""
+        return self._drain(self._failed_jobs)
+
+
+class FragmentBatcher:
+    """decide how many consecutive fragments, i.e. rangeless hls / dash segments, a worker downloads back-to-back on
+    the same curl handle and connection, instead of one fragment per job
+
+    a batch should take about "target_time" seconds, fragment time is estimated from round trip time, average fragment
+    size, and connection speed, a batch never takes more than a fair share of remaining jobs, so all connections
+    stay busy till the end.
+    """
+    target_time = 2  # seconds
+    max_size = 64  # max. number of fragments in a batch, 1 disables batching
+    smoothing = 0.2  # weight of a new reading in moving averages
+
+    def __init__(self):
+        self.rtt = None  # seconds, time from sending request to first byte received
+        self.fragment_size = None  # bytes
+        self.fragment_time = None  # seconds, total time of a fragment download, used when speed is unknown
+
+    def _average(self, current, value):
+        return value if current is None else current + self.smoothing * (value - current)
+
+    def update(self, transfers):
+        """add readings of finished fragments
+
+        Args:
+            transfers (iterable): tuples of (rtt, total time, size), refer to Worker.transfers
+        """
+        for rtt, total_time, size in transfers:
+            self.rtt = self._average(self.rtt, rtt)
+            self.fragment_time = self._average(self.fragment_time, total_time)
+            if size:
+                self.fragment_size = self._average(self.fragment_size, size)
+
+    def batch_size(self, jobs_num, connections, speed=0):
+        """number of fragments for next job
+
+        Args:
+            jobs_num (int): number of fragments waiting for download, including next one
+            connections (int): allowed number of connections
+            speed (int): average connection speed in bytes/sec, 0 if unknown
+
+        Returns:
+            (int): batch size, 1 means no batching
+        """
+        if self.fragment_time is None:
+            # no readings yet, first fragments measure rtt and size
+            return 1
+
+        if speed and self.fragment_size:
+            fragment_time = self.rtt + self.fragment_size / speed
+        else:
+            fragment_time = self.fragment_time
+
+        size = int(self.target_time / max(fragment_time, 0.001))
+        fair_share = -(-jobs_num // max(connections, 1))  # ceil
+
+        return max(1, min(size, fair_share, self.max_size))
+
+
+class SegmentSplitter:
+    """auto-segmentation, decide which segment to split to help a slow connection, and where to split it
+
+    segment with the longest estimated time to finish is split first, at the point where old and new connections are
+    expected to finish together, i.e. remaining bytes are shared in proportion to their speeds, after what old
+    connection downloads while new one is connecting, a split which saves less than "min_gain" seconds isn't done,
+    e.g. old connection would overtake it before new one receives its first byte.
+
+    segments of unknown speed, e.g. just started, stalled, or waiting for a worker, are split in half if both halves
+    are bigger than a minimum size.
+    """
+    connect_time = 1  # seconds, time a new connection takes to receive first byte, used before any readings
+    min_gain = 2  # seconds, minimum saved time of a split
+    smoothing = 0.2  # weight of a new reading in moving average
+
+    def __init__(self):
+        self.rtt = None  # seconds, time from sending request to first byte received
+
+    def update(self, transfers):
+        """add readings of finished segments
+
+        Args:
+            transfers (iterable): tuples of (rtt, total time, size), refer to Worker.transfers
+        """
+        for rtt, *_ in transfers:
+            self.rtt = rtt if self.rtt is None else self.rtt + self.smoothing * (rtt - self.rtt)
+
+    @property
+    def lead_time(self):
+        """estimated time from splitting a segment till new connection receives first byte"""
+        if self.rtt is None:
+            return self.connect_time
+
+        # a round trip for tcp handshake, another one for the request, and thread manager loop delay
+        return 2 * self.rtt + 0.1
+
+    def split_point(self, seg, speed, new_speed, min_size):
+        """find where to split a segment
+
+        Args:
+            seg (Segment): ranged segment
+            speed (int): segment's connection speed in bytes/sec, 0 if unknown
+            new_speed (int): expected speed of new connection in bytes/sec, 0 if unknown
+            min_size (int): minimum size of both halves in bytes, used if segment's speed is unknown
+
+        Returns:
+            (int): last byte of segment's new range, new segment starts after it, or None if split isn't worth it
+        """
+        remaining = seg.remaining
+        start = seg.range[0] + seg.current_size
+
+        if speed:
+            new_speed = new_speed or speed
+            ahead = int(speed * self.lead_time)  # downloaded by old connection while new one is connecting
+            share = int((remaining - ahead) * speed / (speed + new_speed))
+            new_size = remaining - ahead - share
+
+            # old connection alone vs both connections
+            saved = remaining / speed - (self.lead_time + new_size / new_speed)
+            if new_size <= 0 or saved < self.min_gain:
+                return None
+        else:
+            ahead, share = 0, remaining // 2
+            if remaining - share <= min_size:
+                return None
+
+        return start + ahead + share
+
+    def plan(self, segs, seg_speeds, new_speed, min_size):
+        """select segment to split and its split point
+
+        Args:
+            segs (list): ranged segments which can be split, in preferred order for equal estimated times
+            seg_speeds (dict): key=segment, value=its connection speed in bytes/sec, running segments only
+            new_speed (int): expected speed of new connection in bytes/sec, 0 if unknown
+            min_size (int): minimum size of both halves in bytes, used for segments of unknown speed
+
+        Returns:
+            (tuple): (segment, split point), or (None, None)
+        """
+        def eta(seg):
+            speed = seg_speeds.get(seg)
+            return seg.remaining / speed if speed else float('inf')
+
+        # longest estimated time first, sort is stable
+        for seg in sorted(segs, key=eta, reverse=True):
+            point = self.split_point(seg, seg_speeds.get(seg, 0), new_speed, min_size)
+            if point is not None:
+                return seg, point
+
+        return None, None
+
+
+class EndGame:
+    """end-game mode of a download item, near completion an idle worker races the slowest running segment, i.e. the one
+    with the longest estimated time to finish, by downloading a shadow copy of its remaining range on a new connection
+
+    the first to finish wins, if shadow wins, original segment's range is cut where the shadow starts, and original
+    worker is cancelled, if original wins, shadow worker is cancelled and shadow is dropped, shadows are not part of
+    download item's segments until they win.
+    """
+    threshold = 0.05  # end-game starts when remaining bytes drop below this ratio of total size
+    min_eta = 2  # seconds, segments expected to finish sooner aren't raced
+
+    def __init__(self):
+        self.races = {}  # key=original segment, value=its shadow segment
+        self.shadows = {}  # key=shadow segment, value=original segment
+        self.dropped = set()  # shadows which lost or became useless, they must not be downloaded again
+        self.started = 0  # number of shadows started
+        self.won = 0  # number of races won by shadows
+
+    def is_shadow(self, seg):
+        """True if seg is a shadow which didn't win, i.e. it isn't one of download item's segments"""
+        return seg in self.shadows or seg in self.dropped
+
+    def is_active(self, d):
+        """True if remaining bytes are below threshold"""
+        total_size = d.total_size
+        return bool(total_size) and total_size - d.downloaded <= self.threshold * total_size
+
+    def pick(self, workers, connection_speeds):
+        """select running segment to race
+
+        Args:
+            workers (iterable): running workers
+            connection_speeds (dict): key=worker tag, value=speed in bytes/sec, stalled workers are missing
+
+        Returns:
+            (Segment): segment with the longest estimated time to finish, or None
+        """
+        candidates = []
+        for worker in workers:
+            seg = worker.seg
+            if seg.range is None or seg.downloaded or seg in self.races or seg in self.shadows:
+                continue
+
+            speed = connection_speeds.get(worker.tag, 0)
+            eta = seg.remaining / speed if speed else float('inf')
+            if eta >= self.min_eta and seg.remaining:
+                candidates.append((eta, seg))
+
+        return max(candidates, key=lambda item: item[0])[1] if candidates else None
+
+    def add(self, seg, shadow):
+        """register a race between a segment and its shadow"""
+        self.races[seg] = shadow
+        self.shadows[shadow] = seg
+        self.started += 1
+
+    def finished(self, seg):
+        """called when a worker of seg is done, decide race result
+
+        Returns:
+            (tuple): (result, original, shadow), result is one of:
+            None: seg isn't racing, or race continues, e.g. a failed segment will be retried
+            'shadow won': cut original's range and cancel its worker, shadow becomes a regular segment
+            'original won': cancel shadow's worker, it will be dropped when it finishes
+            'drop shadow': shadow finished after original
+        """
+        if seg in self.shadows:
+            original = self.shadows[seg]
+            if seg.downloaded and not original.downloaded:
+                result = 'shadow won'
+                self.won += 1
+            elif original.downloaded:
+                result = 'drop shadow'
+                self.dropped.add(seg)
+            else:
+                return None, original, seg
+
+            del self.shadows[seg]
+            del self.races[original]
+            return result, original, seg
+
+        shadow = self.races.get(seg)
+        if shadow is not None and seg.downloaded:
+            return 'original won', seg, shadow
+
+        return None, seg, shadow
+
+
+class TailLatency:
+    """time from 95% to 100% of finished downloads, in seconds, process-wide, use module level "tail_stats" object"""
+
+    start = 0.95  # tail starts at this ratio of total size
+    history_size = 1000  # number of kept readings
+
+    def __init__(self):
+        self._lock = Lock()
+        self.readings = deque(maxlen=self.history_size)
+
+    def record(self, seconds):
+        with self._lock:
+            self.readings.append(seconds)
+
+    def percentile(self, p):
+        """return p-th percentile of readings, e.g. p=99, or None if there are no readings"""
+        with self._lock:
+            readings = sorted(self.readings)
+
+        if not readings:
+            return None
+
+        # nearest rank
+        index = max(0, math.ceil(p / 100 * len(readings)) - 1)
+        return readings[index]
+
+    def __str__(self):
+        if not self.readings:
+            return 'no readings'
+
+        return f'{len(self.readings)} downloads, 95% to 100% time: p50 {self.percentile(50):.2f} s, ' \
+               f'p99 {self.percentile(99):.2f} s'
+
+
+tail_stats = TailLatency()
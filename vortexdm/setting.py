@@ -14,6 +14,7 @@ import shutil
 from . import config
 from . import downloaditem
 from . import model
+from .store import DownloadsStore
 from .utils import log, update_object
 
 
@@ -73,9 +74,48 @@ def locate_setting_folder():
 config.sett_folder = locate_setting_folder()
 
 
+_downloads_store = None
+
+
+def get_downloads_store():
+    """return downloads list store in settings folder, refer to store.py"""
+    global _downloads_store
+    if _downloads_store is None or _downloads_store.folder != config.sett_folder:
+        _downloads_store = DownloadsStore(config.sett_folder)
+    return _downloads_store
+
+
+def get_d_info(d):
+    """return download item's info to be saved in downloads list store
+
+    Returns:
+        (tuple): uid, dict of saved properties, base64 thumbnail string or None
+    """
+    d_dict = {key: d.__dict__.get(key) for key in d.saved_properties}
+
+    # convert base64 byte to string is required because json can't handle byte objects, thumbnail which isn't loaded
+    # from disk yet is kept as is in downloads list store
+    thumbnail = None if d.thumbnail_loader else d.thumbnail
+    thumbnail = thumbnail.decode("utf-8") if thumbnail else None
+
+    return d.uid, d_dict, thumbnail
+
+
+def _thumbnail_loader(store, uid):
+    def load():
+        # use encode() to convert base64 string to byte, however it does work without it, will keep it to be safe
+        thumbnail = store.load_thumbnail(uid)
+        return thumbnail.encode() if thumbnail else b''
+    return load
+
+
 def load_d_map():
-    """create and return a dictionary of 'uid: DownloadItem objects' based on data extracted from 'downloads.dat' file
+    """create and return a dictionary of 'uid: DownloadItem objects' based on data extracted from downloads list
+    store, downloads list saved in 'downloads.dat' file by older versions is imported once
 
+    items are loaded as lightweight records, thumbnails are read from disk on demand, and progress info, i.e. resume
+    journal and segments, is loaded when item is resumed or its segments progress is requested, refer to
+    DownloadItem.ensure_progress_info()
     """
     d_map = {}
 
@@ -83,26 +123,20 @@ def load_d_map():
 
         log('Load previous download items from', config.sett_folder)
 
-        # get data
-        file = os.path.join(config.sett_folder, 'downloads.dat')
-        with open(file, 'r') as f:
-            # expecting a list of dictionaries
-            data = json.load(f)
+        # get data, a list of (uid, d_dict, has_thumbnail)
+        store = get_downloads_store()
+        items = store.load()
 
         # converting data to a map of uid: ObservableDownloadItem() objects
-        for uid, d_dict in data.items():  # {'uid': d_dict, 'uid2': d_dict2, ...}
+        for uid, d_dict, has_thumbnail in items:
             d = update_object(model.ObservableDownloadItem(), d_dict)
             if d:  # if update_object() returned an updated object not None
                 d.uid = uid
                 d_map[uid] = d
+                if has_thumbnail:
+                    d.thumbnail_loader = _thumbnail_loader(store, uid)
 
-        # get thumbnails
-        file = os.path.join(config.sett_folder, 'thumbnails.dat')
-        with open(file, 'r') as f:
-            # expecting a list of dictionaries
-            thumbnails = json.load(f)
-
-        # clean d_map and load thumbnails
+        # clean d_map
         for d in d_map.values():
             d.live_connections = 0
 
@@ -115,12 +149,6 @@ def load_d_map():
             if d.status not in (config.Status.completed, config.Status.scheduled, config.Status.error):
                 d.status = config.Status.cancelled
 
-            # use encode() to convert base64 string to byte, however it does work without it, will keep it to be safe
-            d.thumbnail = thumbnails.get(d.uid, '').encode()
-
-            # update progress info
-            d.load_progress_info()
-
     except Exception as e:
         log(f'load_d_map()>: {e}')
         raise e
@@ -131,39 +159,30 @@ def load_d_map():
 
 
 def save_d_map(d_map):
+    """save all download items, and remove deleted items from downloads list store"""
     try:
-        data = {}  # dictionary, key=d.uid, value=ObservableDownloadItem
-        thumbnails = {}  # dictionary, key=d.uid, value=base64 binary string for thumbnail
-        for uid, d in d_map.items():
-            d_dict = {key: d.__dict__.get(key) for key in d.saved_properties}
-            data[uid] = d_dict
-
-            # thumbnails
-            if d.thumbnail:
-                # convert base64 byte to string is required because json can't handle byte objects
-                thumbnails[d.uid] = d.thumbnail.decode("utf-8")
-
-        # store d_map in downloads.cfg file
-        downloads_fp = os.path.join(config.sett_folder, 'downloads.dat')
-        with open(downloads_fp, 'w') as f:
-            try:
-                json.dump(data, f, indent=4)
-            except Exception as e:
-                print('error save d_list:', e)
-
-        # store thumbnails in thumbnails.cfg file
-        thumbnails_fp = os.path.join(config.sett_folder, 'thumbnails.dat')
-        with open(thumbnails_fp, 'w') as f:
-            try:
-                json.dump(thumbnails, f)
-            except Exception as e:
-                print('error save thumbnails file:', e)
-
-        log('downloads items list saved in:', downloads_fp, log_level=2)
+        get_downloads_store().replace_all(get_d_info(d) for d in d_map.values())
+        log('downloads items list saved in:', get_downloads_store().fp, log_level=2)
     except Exception as e:
         log('save_d_map()> ', e)
 
 
+def save_d(*d_list):
+    """add or update download items in downloads list store, it doesn't rewrite other items"""
+    try:
+        get_downloads_store().save(get_d_info(d) for d in d_list)
+    except Exception as e:
+        log('save_d()> ', e)
+
+
+def delete_d(*uids):
+    """remove download items from downloads list store"""
+    try:
+        get_downloads_store().delete(*uids)
+    except Exception as e:
+        log('delete_d()> ', e)
+
+
 def get_user_settings():
     settings = {}
     try:
@@ -0,0 +1,190 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        process-wide speed sampler, one thread samples received bytes of all running download items and their
+        connections at a fixed rate, and keeps an exponentially weighted moving average (EWMA) of throughput, and a
+        fixed size history of speed readings for every download item.
+
+        readers, e.g. DownloadItem.speed, eta, thread_manager's auto segmentation, and connection controllers, get a
+        read-only SpeedSnapshot, reading doesn't change any state, so the result doesn't depend on who reads it or
+        how often.
+"""
+
+import time
+from collections import deque, namedtuple
+from threading import Lock, Thread
+
+from .utils import log
+
+# read-only speed info of a download item
+# timestamp: time.monotonic() of last sample
+# speed: EWMA of download item's throughput in bytes/sec
+# received: total bytes received by download item's connections since sampling started
+# connections: tuple of (worker tag, EWMA throughput) of connections which are receiving data
+# history: tuple of (timestamp, speed) readings, oldest first
+SpeedSnapshot = namedtuple('SpeedSnapshot', ['timestamp', 'speed', 'received', 'connections', 'history'])
+SpeedSnapshot.__new__.__defaults__ = (0, 0, 0, (), ())
+
+
+class EWMARate:
+    """exponentially weighted moving average of a byte counter's rate
+
+    Args:
+        half_life (float): seconds, weight of a reading drops by half after this time
+    """
+    __slots__ = ('half_life', 'rate', 'count', 'timestamp')
+
+    def __init__(self, half_life=2):
+        self.half_life = half_life
+        self.rate = 0
+        self.count = None  # last counter value
+        self.timestamp = 0
+
+    def update(self, count, now):
+        """add a reading of a cumulative counter, e.g. total received bytes"""
+        if self.count is None or count < self.count:
+            # first reading, or counter restarted
+            self.count = count
+            self.timestamp = now
+            return
+
+        elapsed = now - self.timestamp
+        if elapsed <= 0:
+            return
+
+        instant_rate = (count - self.count) / elapsed
+
+        # weight depends on elapsed time, a late tick doesn't distort the average
+        alpha = 1 - 0.5 ** (elapsed / self.half_life)
+        self.rate += alpha * (instant_rate - self.rate)
+
+        # forget tiny leftovers of a stopped transfer
+        if self.rate < 1:
+            self.rate = 0
+
+        self.count = count
+        self.timestamp = now
+
+
+class _ItemSampler:
+    """download item's sampling state"""
+
+    def __init__(self, workers, half_life, history_size):
+        self.workers = workers  # list of download item's workers, it might grow while download is running
+        self.half_life = half_life
+        self.rate = EWMARate(half_life)
+        self.connections = {}  # key=worker tag, value=EWMARate
+        self.history = deque(maxlen=history_size)
+        self.snapshot = SpeedSnapshot()
+
+    def sample(self, now):
+        received = 0
+        connections = []
+        for worker in list(self.workers):
+            count = worker.received
+            received += count
+
+            rate = self.connections.get(worker.tag)
+            if rate is None:
+                rate = self.connections[worker.tag] = EWMARate(self.half_life)
+            rate.update(count, now)
+            if rate.rate:
+                connections.append((worker.tag, int(rate.rate)))
+
+        self.rate.update(received, now)
+        speed = int(self.rate.rate)
+        self.history.append((now, speed))
+
+        # replace snapshot at once, readers never see a half updated one
+        self.snapshot = SpeedSnapshot(now, speed, received, tuple(connections), ())
+
+
+class SpeedSampler:
+    """sample throughput of running download items, use the module level "speed_sampler" object
+
+    thread_manager registers a download item with its workers when it starts and unregisters it when it quits,
+    sampling thread runs only while there are registered download items.
+    """
+    interval = 0.5  # seconds between samples
+    half_life = 2  # seconds, EWMA half life, i.e. a reading's weight drops by half after this time
+    history_size = 120  # number of speed readings kept for every download item, i.e. one minute
+
+    def __init__(self):
+        self._lock = Lock()
+        self._items = {}  # key=download item uid, value=_ItemSampler
+        self._thread = None
+
+    def register(self, d, workers):
+        """start sampling a download item
+
+        Args:
+            d (DownloadItem): download item
+            workers (list): download item's Worker objects, every worker counts its received bytes in
+            "received" attribute
+        """
+        with self._lock:
+            self._items[d.uid] = _ItemSampler(workers, self.half_life, self.history_size)
+
+            if self._thread is None:
+                self._thread = Thread(target=self._run, daemon=True, name='speed sampler')
+                self._thread.start()
+
+    def unregister(self, d):
+        with self._lock:
+            self._items.pop(d.uid, None)
+
+    def snapshot(self, d, history=False):
+        """latest speed info of a download item
+
+        Args:
+            d (DownloadItem): download item
+            history (bool): include speed readings history
+
+        Returns:
+            (SpeedSnapshot): speed info, zero values if download item isn't sampled
+        """
+        item = self._items.get(d.uid)
+        if item is None:
+            return SpeedSnapshot()
+
+        snapshot = item.snapshot
+        if history:
+            with self._lock:
+                snapshot = snapshot._replace(history=tuple(item.history))
+
+        return snapshot
+
+    def speed(self, d):
+        """download item's speed in bytes/sec"""
+        return self.snapshot(d).speed
+
+    def connection_speed(self, d):
+        """average speed of download item's connections which are receiving data, in bytes/sec"""
+        connections = self.snapshot(d).connections
+        return sum(rate for _, rate in connections) // len(connections) if connections else 0
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+
+            with self._lock:
+                if not self._items:
+                    self._thread = None
+                    return
+
+                now = time.monotonic()
+                for item in self._items.values():
+                    try:
+                        item.sample(now)
+                    except Exception as e:
+                        log('SpeedSampler()> error:', e, log_level=3)
+
+
+# one sampler for the whole application
+speed_sampler = SpeedSampler()
@@ -0,0 +1,182 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        downloads list store, an SQLite database in settings folder, every download item is one row, so adding or
+        updating an item doesn't rewrite the whole list, and every write is a transaction, a crash in the middle of
+        saving leaves the previous state intact.
+
+        download items' saved properties are stored as json text in "data" column, status, url, and folder are stored
+        in their own indexed columns for lookups, thumbnails are stored as base64 text.
+
+        downloads list saved by older versions in "downloads.dat" and "thumbnails.dat" json files is imported once
+        when the database is created, old files are left untouched.
+"""
+
+import os
+import json
+import sqlite3
+from threading import Lock
+
+from .utils import log
+
+
+class DownloadsStore:
+    """SQLite store of download items
+
+    Args:
+        folder (str): settings folder
+    """
+    file_name = 'downloads.db'
+    legacy_downloads_file = 'downloads.dat'  # json, written by older versions
+    legacy_thumbnails_file = 'thumbnails.dat'
+
+    schema_version = 1
+
+    # an updated item keeps its rowid, i.e. its position in downloads list, and its stored thumbnail if no new one
+    # is given, i.e. thumbnail wasn't loaded from disk
+    _upsert_sql = 'INSERT INTO downloads (uid, status, url, folder, data, thumbnail) VALUES (?, ?, ?, ?, ?, ?) ' \
+                  'ON CONFLICT (uid) DO UPDATE SET status=excluded.status, url=excluded.url, ' \
+                  'folder=excluded.folder, data=excluded.data, ' \
+                  'thumbnail=COALESCE(excluded.thumbnail, downloads.thumbnail)'
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.fp = os.path.join(folder, self.file_name)
+        self._lock = Lock()
+        self._conn = None
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            # one connection shared by controller's threads, access is serialized by self._lock
+            conn = sqlite3.connect(self.fp, check_same_thread=False, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn = conn
+            self._create_schema()
+
+        return self._conn
+
+    def _create_schema(self):
+        conn = self._conn
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version >= self.schema_version:
+            return
+
+        with _Transaction(conn):
+            conn.execute('CREATE TABLE IF NOT EXISTS downloads (uid TEXT PRIMARY KEY, status TEXT, url TEXT, '
+                         'folder TEXT, data TEXT NOT NULL, thumbnail TEXT)')
+            conn.execute('CREATE INDEX IF NOT EXISTS downloads_status ON downloads (status)')
+            conn.execute('CREATE INDEX IF NOT EXISTS downloads_url ON downloads (url)')
+            conn.execute('CREATE INDEX IF NOT EXISTS downloads_folder ON downloads (folder)')
+
+            if version == 0:
+                self._migrate_legacy_files()
+
+            conn.execute(f'PRAGMA user_version = {self.schema_version}')
+
+    def _migrate_legacy_files(self):
+        """import downloads list saved by older versions, called inside schema transaction"""
+        downloads_fp = os.path.join(self.folder, self.legacy_downloads_file)
+        if not os.path.isfile(downloads_fp):
+            return
+
+        try:
+            with open(downloads_fp, 'r') as f:
+                data = json.load(f)  # {'uid': d_dict, 'uid2': d_dict2, ...}
+
+            thumbnails = {}
+            thumbnails_fp = os.path.join(self.folder, self.legacy_thumbnails_file)
+            if os.path.isfile(thumbnails_fp):
+                with open(thumbnails_fp, 'r') as f:
+                    thumbnails = json.load(f)
+
+            self._conn.executemany(self._upsert_sql, (self._row(uid, d_dict, thumbnails.get(uid))
+                                                      for uid, d_dict in data.items()))
+            log(f'DownloadsStore: imported {len(data)} download items from', downloads_fp)
+
+        except Exception as e:
+            log('DownloadsStore._migrate_legacy_files()> error:', e)
+
+    @staticmethod
+    def _row(uid, d_dict, thumbnail=None):
+        return (uid, d_dict.get('_status'), d_dict.get('url'), d_dict.get('folder'), json.dumps(d_dict),
+                thumbnail or None)
+
+    def save(self, items):
+        """add or update download items in one transaction
+
+        Args:
+            items (iterable): tuples of (uid, dict of saved properties, base64 thumbnail string or None)
+        """
+        with self._lock, _Transaction(self.conn):
+            self.conn.executemany(self._upsert_sql, (self._row(*item) for item in items))
+
+    def delete(self, *uids):
+        with self._lock, _Transaction(self.conn):
+            self.conn.executemany('DELETE FROM downloads WHERE uid = ?', ((uid,) for uid in uids))
+
+    def replace_all(self, items):
+        """save download items and remove any other stored item, in one transaction
+
+        Args:
+            items (iterable): tuples of (uid, dict of saved properties, base64 thumbnail string or None)
+        """
+        items = list(items)
+        with self._lock, _Transaction(self.conn):
+            self.conn.execute('CREATE TEMP TABLE IF NOT EXISTS kept_uids (uid TEXT PRIMARY KEY)')
+            self.conn.execute('DELETE FROM kept_uids')
+            self.conn.executemany('INSERT OR IGNORE INTO kept_uids (uid) VALUES (?)', ((item[0],) for item in items))
+            self.conn.execute('DELETE FROM downloads WHERE uid NOT IN (SELECT uid FROM kept_uids)')
+            self.conn.executemany(self._upsert_sql, (self._row(*item) for item in items))
+
+    def load(self):
+        """load stored download items without thumbnails, refer to load_thumbnail()
+
+        Returns:
+            (list): tuples of (uid, dict of saved properties, True if item has a thumbnail)
+        """
+        items = []
+        with self._lock:
+            sql = 'SELECT uid, data, thumbnail IS NOT NULL FROM downloads ORDER BY rowid'
+            for uid, data, has_thumbnail in self.conn.execute(sql):
+                try:
+                    items.append((uid, json.loads(data), bool(has_thumbnail)))
+                except Exception as e:
+                    log('DownloadsStore.load()> error:', e, uid)
+
+        return items
+
+    def load_thumbnail(self, uid):
+        """return stored base64 thumbnail string of a download item, or None"""
+        with self._lock:
+            row = self.conn.execute('SELECT thumbnail FROM downloads WHERE uid = ?', (uid,)).fetchone()
+        return row[0] if row else None
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class _Transaction:
+    """context manager, commit on success and rollback on error, connection must be in autocommit mode, i.e.
+    isolation_level=None"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.conn.execute('COMMIT' if exc_type is None else 'ROLLBACK')
+        return False
@@ -0,0 +1,109 @@
+"""
+    Vortex Download Manager (VortexDM)
+
+    A multi-connection internet download manager, based on "PycURL" and "youtube_dl". Original project, FireDM, by Mahmoud Elshahat.
+    :copyright: (c) 2023 by Sixline
+    :copyright: (c) 2019-2021 by Mahmoud Elshahat.
+    :license: GNU GPLv3, see LICENSE.md for more details.
+
+    Module description:
+        timer service, one thread runs callbacks at their due time, timers are kept in a min-heap keyed on due time,
+        so the thread sleeps until the nearest timer instead of scanning download items periodically.
+
+        due times are wall-clock timestamps, i.e. time.time(), because scheduled downloads are set by date and time,
+        the thread never sleeps longer than "max_sleep", so a system clock change or a suspended computer can't
+        delay a timer for long.
+"""
+
+import time
+import heapq
+import itertools
+from threading import Condition, Thread
+
+from .utils import log
+
+
+class Timer:
+    """handle of a scheduled callback, returned by TimerService.call_at()"""
+    __slots__ = ('due', 'callback', 'args', 'cancelled')
+
+    def __init__(self, due, callback, args):
+        self.due = due
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerService:
+    """run callbacks at their due time in one thread, use the module level "timer_service" object
+
+    callbacks run in timer thread, they must not block, otherwise they delay other timers.
+    """
+
+    max_sleep = 1  # seconds
+
+    def __init__(self):
+        self._cond = Condition()
+        self._heap = []  # (due, sequence, Timer)
+        self._counter = itertools.count()
+        self._thread = None
+
+    def call_at(self, due, callback, *args):
+        """run callback at due time
+
+        Args:
+            due (float): wall-clock timestamp, e.g. datetime.timestamp()
+            callback (callable): function to call
+            args: callback's arguments
+
+        Returns:
+            (Timer): timer handle, use its cancel() method to cancel
+        """
+        timer = Timer(due, callback, args)
+        with self._cond:
+            heapq.heappush(self._heap, (due, next(self._counter), timer))
+
+            if self._thread is None:
+                self._thread = Thread(target=self._run, daemon=True, name='timer service')
+                self._thread.start()
+
+            # wake up timer thread, new timer might be due before the nearest one
+            self._cond.notify()
+
+        return timer
+
+    def call_later(self, delay, callback, *args):
+        """run callback after delay in seconds"""
+        return self.call_at(time.time() + delay, callback, *args)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    # drop cancelled timers
+                    while self._heap and self._heap[0][2].cancelled:
+                        heapq.heappop(self._heap)
+
+                    if not self._heap:
+                        self._thread = None
+                        return
+
+                    delay = self._heap[0][0] - time.time()
+                    if delay <= 0:
+                        break
+
+                    self._cond.wait(min(delay, self.max_sleep))
+
+                timer = heapq.heappop(self._heap)[2]
+
+            try:
+                timer.callback(*timer.args)
+            except Exception as e:
+                log('TimerService()> error:', e, timer.callback)
+
+
+# one timer service for the whole application
+timer_service = TimerService()
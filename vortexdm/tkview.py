@@ -1561,6 +1561,7 @@ class DItem(tk.Frame):
         self.progress = ''
 
         self.thumbnail_img = None
+        self.thumbnail_requested = False  # thumbnail is asked from controller when item is shown or selected
 
         self.columnconfigure(1, weight=1)
         self.blank_img = tk.PhotoImage()
@@ -3123,6 +3124,7 @@ class MainWindow(IView):
         self.url = ''
         self.url_after_id = None  # identifier returned by 'after' method, keep it for future cancelling
         self.d_items = {}  # hold DItem objects  {'UID': DItem()}
+        self._thumbnails_state = None  # downloads tab state at last visible thumbnails check
 
         self.pl_window = None  # playlist download window
         self.subtitles_window = None  # subtitles download window
@@ -3953,6 +3955,9 @@ class MainWindow(IView):
                            get_text_validator=lambda x: int(x) if 0 < int(x) < 101 else 3, width=8).pack(anchor='w')
         LabeledEntryOption(tab, 'Connections per download (1 ~ 100): ', entry_key='max_connections', width=8,
                            get_text_validator=lambda x: int(x) if 0 < int(x) < 101 else 10).pack(anchor='w')
+        LabeledEntryOption(tab, 'Connections per host for all downloads (0 = no limit): ',
+                           entry_key='max_connections_per_host', width=8,
+                           get_text_validator=lambda x: int(x) if 0 <= int(x) < 1001 else 0).pack(anchor='w')
 
         # speed limit
         speed_frame = tk.Frame(tab, bg=bg)
@@ -3968,6 +3973,27 @@ class MainWindow(IView):
         LabeledEntryOption(tab, 'Auto refreshing expired urls [Num of retries]: ', entry_key='refresh_url_retries',
                            width=8, get_text_validator=lambda x: int(x)).pack(anchor='w')
 
+        # download engine -------------------------
+        engine_frame = tk.Frame(tab, bg=bg)
+        tk.Label(engine_frame, bg=bg, fg=fg, text='Download engine:  ').pack(side='left')
+        engines_menu = Combobox(engine_frame, values=config.download_engine_choices,
+                                selection=config.download_engine)
+        engines_menu.callback = lambda: set_option(download_engine=engines_menu.selection)
+        engines_menu.pack(side='left')
+        engine_frame.pack(anchor='w')
+
+        # connection controller -------------------------
+        controller_frame = tk.Frame(tab, bg=bg)
+        tk.Label(controller_frame, bg=bg, fg=fg, text='Connection controller:  ').pack(side='left')
+        controllers_menu = Combobox(controller_frame, values=config.connection_controller_choices,
+                                    selection=config.connection_controller)
+        controllers_menu.callback = lambda: set_option(connection_controller=controllers_menu.selection)
+        controllers_menu.pack(side='left')
+        controller_frame.pack(anchor='w')
+
+        CheckOption(tab, 'Write segments directly into target file at their position (no merging copy)',
+                    key='direct_write').pack(anchor='w')
+
         separator()
 
         # ------------------------------------------------------------------------------------Debugging options---------
@@ -4108,6 +4134,50 @@ class MainWindow(IView):
         elif button == 'Disable':
             self.controller.set_on_completion_command(uid, '')
 
+    def set_speed_limit_selected(self):
+        """set own speed limit of selected items, global speed limit still applies"""
+        items = self.get_selected_items()
+        if not items:
+            return
+
+        current = self.controller.get_property('speed_limit', uid=items[0].uid)
+        button, sl = self.popup('Speed limit of selected items (kb/s, mb/s. gb/s)',
+                                'global speed limit still applies, press "No Limit" to remove items\' limit',
+                                get_user_input=True, default_user_input=format_bytes(current) if current else '',
+                                buttons=['Apply', 'No Limit'])
+
+        if button == 'Apply':
+            sl = self.validate_speed_limit(sl)
+        elif button == 'No Limit':
+            sl = 0
+        else:
+            return
+
+        for item in items:
+            self.controller.set_bandwidth(item.uid, speed_limit=sl)
+
+    def set_bandwidth_weight_selected(self):
+        """set share of global speed limit of selected items relative to other running downloads"""
+        items = self.get_selected_items()
+        if not items:
+            return
+
+        current = self.controller.get_property('bandwidth_weight', uid=items[0].uid)
+        button, weight = self.popup('Bandwidth weight of selected items, used when global speed limit is set',
+                                    'e.g. weight 2 gets twice the bandwidth of a download with weight 1',
+                                    get_user_input=True, default_user_input=str(current), buttons=['Apply'])
+
+        if button != 'Apply':
+            return
+
+        try:
+            weight = float(weight)
+        except ValueError:
+            return
+
+        for item in items:
+            self.controller.set_bandwidth(item.uid, bandwidth_weight=weight)
+
     def validate_speed_limit(self, sl):
         # if no units entered will assume it KB
         try:
@@ -4275,12 +4345,19 @@ class MainWindow(IView):
             12: ('Schedule / Unschedule', lambda uid: self.schedule_selected()),
             13: ('Toggle Shutdown Pc When Finish', lambda uid: self.controller.toggle_shutdown(uid)),
             14: ('On Item Completion Command', lambda uid: self.set_on_completion_command(uid)),
-            15: ('---', None),
-            16: ('Properties', lambda uid: self.msgbox(self.controller.get_properties(uid=uid))),
+            15: ('Speed Limit', lambda uid: self.set_speed_limit_selected()),
+            16: ('Bandwidth Weight', lambda uid: self.set_bandwidth_weight_selected()),
+            17: ('---', None),
+            18: ('Start Next', lambda uid: self.start_next_selected()),
+            19: ('Priority: High', lambda uid: self.set_priority_selected(1)),
+            20: ('Priority: Normal', lambda uid: self.set_priority_selected(0)),
+            21: ('Priority: Low', lambda uid: self.set_priority_selected(-1)),
+            22: ('---', None),
+            23: ('Properties', lambda uid: self.msgbox(self.controller.get_properties(uid=uid))),
         }
 
         rcm = [v[0] for k, v in rcm_map.items() if k != 8]
-        on_completion_rcm = [v[0] for k, v in rcm_map.items() if k in (0, 1, 3, 4, 5, 6, 8, 10, 16)]
+        on_completion_rcm = [v[0] for k, v in rcm_map.items() if k in (0, 1, 3, 4, 5, 6, 8, 10, 23)]
 
         rcm_map2 = {v[0]: v[1] for v in rcm_map.values()}
 
@@ -4337,6 +4414,17 @@ class MainWindow(IView):
         for item in self.get_selected_items():
             self.stop_download(item.uid)
 
+    def start_next_selected(self):
+        """start selected pending items next, before other pending items"""
+        for item in reversed(self.get_selected_items()):
+            if item.status == config.Status.pending:
+                self.controller.move_to_front(item.uid)
+
+    def set_priority_selected(self, priority):
+        """change priority of selected items, pending items with higher priority start first"""
+        for item in self.get_selected_items():
+            self.controller.set_priority(item.uid, priority)
+
     def delitems(self, items, deltarget=False):
         """remove selected download items from downloads tab
         temp files will be removed, completed files on disk will also get deleted if deltarget=True
@@ -4445,8 +4533,40 @@ class MainWindow(IView):
         current_item.select()
 
         if current_item.selected:
+            self.request_thumbnail(current_item)
             self.switch_d_preview(uid)
 
+    def request_thumbnail(self, item):
+        """ask controller for a download item's thumbnail, once"""
+        if not item.thumbnail_requested:
+            item.thumbnail_requested = True
+            self.controller.get_thumbnail(uid=item.uid)
+
+    def request_visible_thumbnails(self):
+        """ask controller for thumbnails of download items which are shown in downloads tab, thumbnails of other
+        items aren't read from disk till they are scrolled into view"""
+        try:
+            canvas = self.d_tab.master  # scrollable frame is a window in a canvas
+
+            # check items only if downloads tab is scrolled, resized, filtered, or items changed
+            state = (canvas.yview(), canvas.winfo_height(), len(self.d_items), config.view_mode, config.view_filter)
+            if state != self._thumbnails_state:
+                self._thumbnails_state = state
+
+                top = canvas.winfo_rooty()
+                bottom = top + canvas.winfo_height()
+                for item in self.d_items.values():
+                    if item.thumbnail_requested or not item.winfo_ismapped():
+                        continue
+
+                    y = item.winfo_rooty()
+                    if y < bottom and y + item.winfo_height() > top:
+                        self.request_thumbnail(item)
+        except Exception as e:
+            log('request_visible_thumbnails()> error:', e, log_level=3)
+
+        self.root.after(300, self.request_visible_thumbnails)
+
     def get_selected_items(self):
         """return a list of selected items"""
         return [item for item in self.d_items.values() if item.selected]
@@ -4839,6 +4959,9 @@ class MainWindow(IView):
         # get download items
         self.controller.get_d_list()
 
+        # load thumbnails of shown download items
+        self.root.after(300, self.request_visible_thumbnails)
+
         # start url monitor thread
         run_thread(url_watchdog, self.root, daemon=True)
 
@@ -15,7 +15,7 @@ import re
 import importlib
 from importlib.util import find_spec
 import webbrowser
-from threading import Thread
+from threading import Thread, Lock
 import subprocess
 import shlex
 import certifi
@@ -23,6 +23,8 @@ import shutil
 import json
 import zipfile
 import urllib.request
+from urllib.parse import urlparse
+from collections import namedtuple
 import platform
 import subprocess
 
@@ -72,6 +74,134 @@ def ignore_errors(func):
     return wraper
 
 
+class CurlStats:
+    """count connections made by curl transfers, to show how many connections and TLS handshakes are saved by the
+    shared TLS sessions, refer to get_curl_share(), and by connections reused within a curl multi handle
+
+    a full TLS handshake is told from a resumed one by the server certificate, a resumed session doesn't send it,
+    it is read from CERTINFO which is enabled in set_curl_options(), TLS backends which don't support CERTINFO
+    report all handshakes as resumed.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self.transfers = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+        self.tls_handshakes = 0  # full handshakes, server sent its certificate
+        self.tls_resumed = 0  # abbreviated handshakes which resumed a shared TLS session
+
+    def record(self, c):
+        """read connection info of a finished transfer, must be called before resetting or closing curl handle"""
+        try:
+            connects = c.getinfo(pycurl.NUM_CONNECTS)  # zero if an existing connection was reused
+            appconnect = c.getinfo(pycurl.APPCONNECT_TIME)  # zero if there was no TLS handshake
+            certinfo = c.getinfo(pycurl.INFO_CERTINFO) if connects and appconnect > 0 else None
+        except Exception:
+            return
+
+        with self._lock:
+            self.transfers += 1
+            if connects:
+                self.new_connections += connects
+                if appconnect > 0:
+                    if certinfo:
+                        self.tls_handshakes += 1
+                    else:
+                        self.tls_resumed += 1
+            else:
+                self.reused_connections += 1
+
+    def __str__(self):
+        return f'{self.transfers} transfers, {self.new_connections} new connections, ' \
+               f'{self.reused_connections} reused connections, {self.tls_handshakes} full TLS handshakes, ' \
+               f'{self.tls_resumed} resumed TLS sessions'
+
+
+curl_stats = CurlStats()
+
+# rtt: round trip time in seconds, speed: throughput of one connection in bytes/sec, connections: useful number of
+# connections, zero if unknown
+LinkInfo = namedtuple('LinkInfo', ['rtt', 'speed', 'connections'])
+
+
+class LinkStats:
+    """per-host link info learned from header probes and finished downloads, used to plan initial segments of next
+    downloads from the same host, refer to get_range_list()"""
+
+    smoothing = 0.3  # weight of a new reading in moving averages
+
+    def __init__(self):
+        self._lock = Lock()
+        self._hosts = {}  # key=host, value=LinkInfo
+
+    @staticmethod
+    def get_host(url):
+        try:
+            return urlparse(url).hostname or ''
+        except Exception:
+            return ''
+
+    def record(self, url, rtt=0, speed=0, connections=0):
+        """add readings of a host, zero values are ignored"""
+        host = self.get_host(url)
+
+        def average(current, value):
+            if not value:
+                return current
+            return value if not current else current + self.smoothing * (value - current)
+
+        with self._lock:
+            info = self._hosts.get(host, LinkInfo(0, 0, 0))
+            self._hosts[host] = LinkInfo(average(info.rtt, rtt), int(average(info.speed, speed)),
+                                         connections or info.connections)
+
+    def get(self, url):
+        """return LinkInfo of url's host"""
+        with self._lock:
+            return self._hosts.get(self.get_host(url), LinkInfo(0, 0, 0))
+
+
+link_stats = LinkStats()
+
+_curl_share = None
+_curl_share_lock = Lock()
+
+
+def get_curl_share():
+    """get one pycurl.CurlShare object for the whole application, it shares DNS cache and TLS sessions between all
+    curl handles, i.e. segments, fragments, header probes, and small files on same host don't repeat name resolving
+    and full TLS handshakes.
+
+    connection cache isn't shared, libcurl doesn't support sharing it between handles which transfer at the same
+    time in different threads, i.e. "threads" download engine, "curl_multi" engine reuses connections within its
+    multi handle anyway.
+
+    Return:
+        (pycurl.CurlShare): shared object, or None if not supported
+    """
+    global _curl_share
+
+    with _curl_share_lock:
+        if _curl_share is None:
+            try:
+                share = pycurl.CurlShare()
+            except Exception as e:
+                log('curl share not available:', e, log_level=3)
+                _curl_share = False
+                return None
+
+            for lock_data in (pycurl.LOCK_DATA_DNS, pycurl.LOCK_DATA_SSL_SESSION):
+                try:
+                    share.setopt(pycurl.SH_SHARE, lock_data)
+                except Exception as e:
+                    log('curl share option', lock_data, 'not available:', e, log_level=3)
+
+            _curl_share = share
+
+        return _curl_share or None
+
+
 def set_curl_options(c, http_headers=None):
     """take pycurl object as an argument and set basic options
 
@@ -160,6 +290,22 @@ def set_curl_options(c, http_headers=None):
     # Accept encoding "compressed content"
     c.setopt(pycurl.ACCEPT_ENCODING, '')
 
+    # server certificate info, used by curl_stats to tell a full TLS handshake from a resumed session
+    try:
+        c.setopt(pycurl.OPT_CERTINFO, 1)
+    except pycurl.error:
+        pass
+
+    # share dns cache and ssl sessions with all other curl handles
+    share = get_curl_share()
+    if share:
+        try:
+            c.setopt(pycurl.SHARE, share)
+        except pycurl.error as e:
+            # reused curl handle, c.reset() keeps the share attached and pycurl refuses to set it again
+            if 'already sharing' not in str(e):
+                log('set_curl_options()> curl share error:', e, log_level=3)
+
 
 def get_headers(url, verbose=False, http_headers=None, seg_range=None):
     """return dictionary of headers"""
@@ -216,9 +362,17 @@ def get_headers(url, verbose=False, http_headers=None, seg_range=None):
         if '23' not in repr(e):
             log('get_headers()>', e)
 
+    # round trip time of request, i.e. first byte time without connecting, used to plan segments
+    try:
+        link_stats.record(url, rtt=c.getinfo(pycurl.STARTTRANSFER_TIME) - c.getinfo(pycurl.PRETRANSFER_TIME))
+    except Exception:
+        pass
+
     # add status code and effective url to headers
     curl_headers['status_code'] = c.getinfo(pycurl.RESPONSE_CODE)
     curl_headers['eff_url'] = c.getinfo(pycurl.EFFECTIVE_URL)
+    curl_stats.record(c)
+    c.close()
 
     # return headers
     return curl_headers
@@ -294,6 +448,7 @@ def download(url, fp=None, verbose=True, http_headers=None, decode=True, return_
         log('download():', e)
     finally:
         # close curl
+        curl_stats.record(c)
         c.close()
 
         if return_buffer:
@@ -1035,13 +1190,24 @@ def calc_md5_sha256(fp=None, buffer=None):
         return f'calc_md5_sha256()> error, {str(e)}'
 
 
-def get_range_list(file_size, minsize):
+def get_range_list(file_size, minsize, connections=None, rtt=0, speed=0, preview=True):
     """
-    return a list of ranges to improve watch while downloading feature
-    
+    plan initial segments, an equal share of the file for every expected connection, so thread manager rarely needs
+    to split segments while downloading, a segment should take much longer than opening its connection, i.e. at least
+    "overhead_rtts" round trips, when the link is unknown segments are at least 20 x minsize.
+
+    for watch while downloading feature, first segments are smaller to finish quickly, every one is double the size
+    of the previous one, up to half an equal share of the file, every small segment has a follow-up segment at the
+    end of the file with the rest of its share, so its connection moves on to it instead of being idle or waiting
+    for auto-segmentation to split a running segment, thread manager picks segments in order of their offsets.
+
     Args:
         file_size(int): file size in bytes
         minsize(int): minimum segment size
+        connections(int): expected number of connections, default is config.max_connections
+        rtt(float): round trip time in seconds, zero if unknown
+        speed(int): expected throughput of one connection in bytes/sec, zero if unknown
+        preview(bool): make first segments smaller, e.g. for video files
 
     Return:
         list of ranges i.e. [[0, 100], [101, 2000], ... ]
@@ -1049,27 +1215,45 @@ def get_range_list(file_size, minsize):
     Example:
         >>> get_range_list(1000000, 102400)
         [[0, 999999]]
-        >>> get_range_list(3000000, 102400)
-        [[0, 149999], [150000, 449999], [450000, 899999], [900000, 1499999], [1500000, 2999999]]
+        >>> get_range_list(10000000, 102400, connections=5)
+        [[0, 624999], [625000, 1874999], [1875000, 4374999], [4375000, 6874999], [6875000, 8749999], [8750000, 9999999]]
+        >>> get_range_list(3000000, 102400, connections=5, rtt=0.001, speed=1000000, preview=False)
+        [[0, 599999], [600000, 1199999], [1200000, 1799999], [1800000, 2399999], [2400000, 2999999]]
         >>> get_range_list(0, 102400)
         [None]
     """
 
     if file_size == 0:
         return [None]
-    elif file_size < minsize * 100 / 5:
+
+    connections = connections or config.max_connections
+    overhead_rtts = 10
+
+    # smallest worth segment
+    if rtt and speed:
+        seg_min = max(minsize, int(speed * rtt * overhead_rtts))
+    else:
+        seg_min = minsize * 20
+
+    count = max(1, min(connections, file_size // seg_min))
+    if count == 1:
         return [[0, file_size - 1]]
 
-    range_list = []
+    share = file_size // count
+    heads = []
 
-    sizes = []
-    # make first segments smaller to finish quickly and be ready for watch while 
-    # downloading other segments
-    for i in (5, 10, 15, 20):  # 5%, 10%, etc..
-        sizes.append(i * file_size // 100)
-    remaining = file_size - sum(sizes)  # almost 50% remaining
-    sizes.append(remaining)
+    # make first segments smaller to finish quickly and be ready for watch while downloading other segments
+    if preview:
+        size = max(minsize, share // 4)
+        while size <= share // 2 and len(heads) < count - 1:
+            heads.append(size)
+            size *= 2
 
+    # every connection downloads an equal share, small first segments have the rest of their share at the end
+    sizes = heads + [share] * (count - len(heads)) + [share - size for size in heads]
+    sizes[-1] += file_size - share * count
+
+    range_list = []
     start = 0
     for s in sizes:
         range_list.append([start, start + s - 1])
@@ -1300,6 +1484,26 @@ def check_write_permission(target_folder, create_dirs=True):
     return success
 
 
+def preallocate_file(fp, size):
+    """create file if it doesn't exist and reserve disk space for it, existing data will be kept
+
+    Args:
+        fp(str): file path
+        size(int): required file size in bytes, file will never be shrunk
+    """
+
+    with open(fp, 'ab') as f:
+        if os.path.getsize(fp) >= size:
+            return
+
+        try:
+            # reserve real disk blocks, available on linux and some other unix systems
+            os.posix_fallocate(f.fileno(), 0, size)
+        except (AttributeError, OSError):
+            # fallback, sparse file on most filesystems
+            f.truncate(size)
+
+
 def read_in_chunks(fn, bytes_range=None, chunk_size=10_485_760, flag='rb'):
     """read bytes range from target file, in chunks to save memory, useful in handling big files
     Args:
@@ -1335,7 +1539,8 @@ __all__ = [
     'auto_rename', 'calc_md5', 'calc_md5_sha256', 'calc_sha256', 'get_range_list',
     'run_thread', 'generate_unique_name', 'open_webpage', 'threaded', 'parse_urls', 'get_media_duration',
     'get_pkg_path', 'get_pkg_version', 'import_file', 'zip_extract', 'create_folder', 'simpledownload', 'ignore_errors',
-    'check_write_permission', 'thread_after', 'read_in_chunks'
+    'check_write_permission', 'thread_after', 'read_in_chunks', 'preallocate_file',
+    'get_curl_share', 'curl_stats', 'link_stats'
 ]
 
 if __name__ == '__main__':
@@ -18,6 +18,7 @@ import shlex
 import subprocess
 
 from . import config
+from . import aes
 from .downloaditem import DownloadItem, Segment
 from .utils import (log, validate_file_name, get_headers, format_bytes, run_command, delete_file, download, rename_file,
                     run_thread, import_file)
@@ -936,7 +937,6 @@ def pre_process_hls(d):
         media_playlist = MediaPlaylist(d, url, m3u8_doc, stream_type)
 
         segments = media_playlist.create_segment_list()
-        d.segments += segments
 
         # write m3u8 file with absolute paths for debugging
         name = 'remote_video2.m3u8' if stream_type == 'video' else 'remote_audio2.m3u8'
@@ -950,6 +950,9 @@ def pre_process_hls(d):
         with open(os.path.join(d.temp_folder, file_path), 'w') as f:
             f.write(media_playlist.create_local_m3u8_doc())
 
+        # add segments after writing m3u8 docs, segments are deep copied there and shouldn't reference download item
+        d.add_segments(*segments)
+
     # reset segments first
     d.segments = []
 
@@ -965,19 +968,52 @@ def pre_process_hls(d):
     return True
 
 
+def decrypt_hls_segment(seg):
+    """read and decrypt an AES-128 encrypted hls segment, its key must be downloaded already
+
+    Args:
+        seg (Segment): hls segment with "key" attribute
+
+    Returns:
+        (bytes): decrypted segment data
+    """
+    key = seg.key
+
+    # key file is shared by all segments which use the same key URI, read it once
+    source = key.source
+    if source.data is None:
+        with open(source.name, 'rb') as f:
+            source.data = f.read()
+
+    if key.iv:
+        # hexadecimal string, e.g. IV=0x8f6109d91fffb816bcd43fefe018db49
+        iv = key.iv[2:] if key.iv.lower().startswith('0x') else key.iv
+        iv = bytes.fromhex(iv).rjust(16, b'\0')
+    else:
+        # no IV attribute, segment's sequence number is used as IV
+        iv = (seg.media_sequence or 0).to_bytes(16, 'big')
+
+    with open(seg.name, 'rb') as f:
+        data = f.read()
+
+    return aes.aes_cbc_decrypt(data, source.data, iv)
+
+
 def post_process_hls(d):
-    """ffmpeg will process m3u8 files"""
+    """make final media files from downloaded hls segments
+
+    segments are merged into temp files while downloading, encrypted ones are decrypted while merging, ffmpeg is
+    needed only to remux mpeg-ts data into target container, if segments couldn't be merged, e.g. encrypted stream
+    and no AES package installed, ffmpeg will process local m3u8 files instead
+    """
 
     log('post_process_hls()> start processing', d.name)
 
     local_video_m3u8_file = os.path.join(d.temp_folder, 'local_video.m3u8')
     local_audio_m3u8_file = os.path.join(d.temp_folder, 'local_audio.m3u8')
 
-    def process_file(infp, outfp):
-        cmd = f'"{config.ffmpeg_actual_path}" -loglevel error -stats -y' \
-              f' -protocol_whitelist "file,http,https,tcp,tls,crypto"  ' \
-              f'-allowed_extensions ALL ' \
-              f'-i "{infp}"'
+    def process_file(infp, outfp, options=''):
+        cmd = f'"{config.ffmpeg_actual_path}" -loglevel error -stats -y {options} -i "{infp}"'
         fastcmd = cmd + f' -c copy "file:{outfp}"'
         slowcmd = cmd + f' "file:{outfp}"'
 
@@ -991,10 +1027,41 @@ def post_process_hls(d):
                 log('post_process_hls()> ffmpeg failed:', output)
                 return False
 
-    process_file(local_video_m3u8_file, d.temp_file)
+        return True
 
-    if 'dash' in d.subtype_list:
-        process_file(local_audio_m3u8_file, d.audio_file)
+    def remux(fp):
+        # write to a temp name with the same extension, ffmpeg chooses output container by extension
+        folder, name = os.path.split(fp)
+        out_fp = os.path.join(folder, f'remux_{name}')
+        if not process_file(fp, out_fp):
+            delete_file(out_fp)
+            return False
+
+        delete_file(fp)
+        rename_file(out_fp, fp)
+        return True
+
+    merged = all(seg.merge for seg in d.segments if not isinstance(seg, Key))
+
+    if not merged:
+        m3u8_options = '-protocol_whitelist "file,http,https,tcp,tls,crypto" -allowed_extensions ALL'
+        success = process_file(local_video_m3u8_file, d.temp_file, m3u8_options)
+
+        if success and 'dash' in d.subtype_list:
+            success = process_file(local_audio_m3u8_file, d.audio_file, m3u8_options)
+
+    # temp files have mpeg-ts data, no remux needed if ffmpeg will process them later anyway, i.e. merging dash audio
+    # and video, or converting audio, or if target container is mpeg-ts
+    elif not ('dash' in d.subtype_list or d.type == 'audio' or
+              os.path.splitext(d.temp_file)[1].lower() in ('.ts', '.m2ts', '.mts')):
+        success = remux(d.temp_file)
+
+    else:
+        success = True
+
+    if not success:
+        log('post_process_hls()> failed processing', d.name)
+        return False
 
     log('post_process_hls()> done processing', d.name)
 
@@ -1238,6 +1305,8 @@ def write_metadata(input_file, meta_file):
 
 
 class Key(Segment):
+    __slots__ = ('method', 'iv', 'raw_line', 'source', 'data')
+
     def __init__(self):
         super().__init__(self)
         self.name = None
@@ -1246,6 +1315,10 @@ class Key(Segment):
         self.iv = None
         self.raw_line = None
 
+        # key which downloads key file, keys with the same URI share one file, which is downloaded once
+        self.source = self
+        self.data = None  # key file contents, cached by decrypt_hls_segment()
+
     def __repr__(self):
         return self.create_line()
 
@@ -1277,6 +1350,7 @@ class MediaPlaylist:
         self.encrypted = False
         self.encryption_type = None
         self.current_key = None
+        self.keys = {}  # key=URI, value=Key which downloads it
         self.segments = []
         self.parse_m3u8_doc()
 
@@ -1311,7 +1385,19 @@ class MediaPlaylist:
                     key.url = urljoin(self.url, key.url)
                     self.encrypted = True
                     self.encryption_type = key.method
+
+                    # some playlists repeat the same key tag before every segment
+                    current_key = self.current_key
+                    if current_key and current_key.raw_line == key.raw_line:
+                        continue
+
+                    # key rotation, a new URI is downloaded, a known URI with different attributes, e.g. IV,
+                    # reuses the file of the first key with that URI
+                    key.source = self.keys.setdefault(key.url, key)
                     self.current_key = key
+                elif key.method == 'NONE':
+                    # next segments aren't encrypted
+                    self.current_key = None
 
             # stream #EXTINF tag must be followed by stream url
             elif line.startswith('#EXTINF'):
@@ -1326,7 +1412,7 @@ class MediaPlaylist:
                 seg.media_type = self.stream_type
                 seg.url = next_line if not next_line.startswith('#') else None
                 seg.duration = self.seg_duration
-                seg.key = copy.copy(self.current_key)
+                seg.key = self.current_key  # shared by all segments until next key tag
 
                 if seg.url:
                     if seg.url.startswith('skd://'):
@@ -1334,6 +1420,13 @@ class MediaPlaylist:
                         seg.url = seg.url.replace('skd://', 'https://')
 
                     seg.url = urljoin(self.url, seg.url)
+
+                    # sequence number, first segment takes the value of #EXT-X-MEDIA-SEQUENCE
+                    try:
+                        seg.media_sequence = int(self.media_sequence or 0) + len(self.segments)
+                    except ValueError:
+                        seg.media_sequence = len(self.segments)
+
                     self.segments.append(seg)
 
             elif line.startswith('#EXT-X-ENDLIST'):
@@ -1344,8 +1437,12 @@ class MediaPlaylist:
         for i, seg in enumerate(self.segments):
             seg.name = os.path.join(self.d.temp_folder, f'{self.stream_type}_seg_{i + 1}.ts')
 
+        for i, key in enumerate(self.keys.values()):
+            key.name = os.path.join(self.d.temp_folder, f'{self.stream_type}_key_{i + 1}.key')
+
+        for seg in self.segments:
             if seg.key:
-                seg.key.name = f'{seg.name}.key'
+                seg.key.name = seg.key.source.name
 
     def summary(self):
         print('M3u8 playlist')
@@ -1369,10 +1466,12 @@ class MediaPlaylist:
         lines.append(f'#EXT-X-TARGETDURATION:{self.max_seg_duration}')
         lines.append(f'#EXT-X-MEDIA-SEQUENCE:{self.media_sequence}')
 
-        # segments
+        # segments, key tag is written when key changes, it applies to all following segments
+        current_key = None
         for seg in segments:
-            if seg.key:
-                lines.append(seg.key.create_line())
+            if seg.key is not current_key:
+                lines.append(seg.key.create_line() if seg.key else '#EXT-X-KEY:METHOD=NONE')
+                current_key = seg.key
             lines.append(f'#EXTINF:{seg.duration},')
             lines.append(seg.url)
 
@@ -1396,26 +1495,37 @@ class MediaPlaylist:
 
         return self.create_m3u8_doc(segments)
 
+    def can_decrypt(self):
+        """True if all encrypted segments can be decrypted in-process, refer to decrypt_hls_segment()"""
+        methods = {seg.key.method for seg in self.segments if seg.key}
+        return not methods or (aes.available and methods == {'AES-128'})
+
     def create_segment_list(self):
 
-        merge = 'encrypted' not in self.d.subtype_list  # merge non-encrypted streams only
+        # merge segments into temp file while downloading, encrypted segments are decrypted while merging, if this
+        # isn't possible ffmpeg will process local m3u8 file after download, refer to post_process_hls()
+        merge = 'encrypted' not in self.d.subtype_list or self.can_decrypt()
         temp_file = self.d.temp_file if self.stream_type == 'video' else self.d.audio_file
 
         segment_list = []
         segments = self.segments.copy()
+        added_keys = set()
 
         # Segment(name=seg_name, num=i, range=None, size=0, url=abs_url, tempfile=d.temp_file, merge=merge)
         for i, seg in enumerate(segments):
             seg_key_pair = [seg]
-            if seg.key:
-                seg_key_pair.append(seg.key)
+
+            # every key file is downloaded once, before the first segment which needs it
+            if seg.key and seg.key.source.url not in added_keys:
+                added_keys.add(seg.key.source.url)
+                seg_key_pair.insert(0, seg.key.source)
 
             for segment in seg_key_pair:
                 segment.num = i
                 segment.range = None
                 segment.size = 0
                 segment.tempfile = temp_file
-                segment.merge = merge
+                segment.merge = merge and not isinstance(segment, Key)  # keys are never merged
                 segment_list.append(segment)
 
         return segment_list
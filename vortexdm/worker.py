@@ -13,30 +13,50 @@
 
 import os
 import time
+from collections import deque
+
 import pycurl
 
-from .config import Status, error_q, jobs_q, max_seg_retries
-from .utils import log, set_curl_options, format_bytes, translate_server_code
+from .config import Status, max_seg_retries
+from .utils import log, set_curl_options, format_bytes, translate_server_code, curl_stats
+from .scheduling import ErrorRecord
+from .limiter import limiter
 
 
 class Worker:
-    def __init__(self, tag=0, d=None):
+    def __init__(self, tag=0, d=None, ctx=None):
         self.tag = tag
         self.d = d
+        self.ctx = ctx  # scheduling.SchedulingContext of download item
         self.seg = None
         self.resume_range = None
 
+        # fragments batch, next segments downloaded back-to-back with the same curl handle, refer to next_segment()
+        self.batch = deque()
+        self.job_segs = []  # all segments of current job, i.e. seg and its batch
+        self.transfers = []  # (rtt, total time, size) of segments done in current job, read by FragmentBatcher
+
+        # set by thread manager to abort current job, e.g. it lost an end-game race, refer to scheduling.EndGame
+        self.cancelled = False
+        self.shadow = False  # downloading an end-game shadow segment, its bytes and progress count only if it wins
+
         # writing data parameters
         self.file = None
         self.mode = 'wb'  # file opening mode default to new write binary
 
         self.buffer = 0
         self.timer1 = 0
+        self.received = 0  # total received bytes by this worker, sampled by speedmeter.SpeedSampler
 
         # connection parameters
         self.c = pycurl.Curl()
-        self.speed_limit = 0
         self.headers = {}
+        self.response_code = 0  # http response code of last transfer, 0 if transfer failed before a response
+
+        # called with a delay in seconds when bandwidth limiter asks worker to slow down, set by download engine,
+        # if None, worker will block in its write callback
+        self.pause_callback = None
+        self.paused_until = 0  # time.monotonic() value, write callback pauses transfer until this time
 
         # minimum speed and timeout, abort if download speed slower than n byte/sec during n seconds
         self.minimum_speed = None
@@ -47,36 +67,97 @@ class Worker:
     def __repr__(self):
         return f"worker_{self.tag}"
 
-    def reuse(self, seg=None, speed_limit=0, minimum_speed=None, timeout=None):
-        """Recycle same object again, better for performance as recommended by curl docs"""
-        if seg.locked:
-            log('Seg', self.seg.basename, 'segment in use by another worker', '- worker', {self.tag}, log_level=2)
-            return False
+    def reuse(self, seg=None, minimum_speed=None, timeout=None, batch=(), shadow=False):
+        """Recycle same object again, better for performance as recommended by curl docs
 
-        self.reset()
+        Args:
+            seg (Segment): segment to download
+            minimum_speed (int): abort if download speed slower than minimum_speed byte/sec during timeout seconds
+            timeout (int): seconds
+            batch (iterable): next segments to download after seg on the same connection, i.e. small fragments
+            shadow (bool): seg is an end-game shadow segment, refer to scheduling.EndGame
+        """
+        if seg.locked or any(s.locked for s in batch):
+            log('Seg', seg.basename, 'segment in use by another worker', '- worker', {self.tag}, log_level=2)
+            return False
 
-        self.seg = seg
+        # set locks
+        self.batch = deque(batch)
+        self.job_segs = [seg, *self.batch]
+        for s in self.job_segs:
+            s.locked = True
 
-        # set lock
-        self.seg.locked = True
+        self.transfers = []
+        self.cancelled = False
+        self.shadow = shadow
 
-        self.speed_limit = speed_limit
+        # set by curl_multi engine for each transfer, a worker reused by threads engine must pause by sleeping instead
+        self.pause_callback = None
 
         # minimum speed and timeout, abort if download speed slower than n byte/sec during n seconds
         self.minimum_speed = minimum_speed
         self.timeout = timeout
 
+        self.start_segment(seg)
+
+        return True
+
+    def start_segment(self, seg):
+        """reset curl handle and get ready to download a segment"""
+        self.reset()
+
+        self.seg = seg
+
         msg = f'Seg {self.seg.basename} start, size: {format_bytes(self.seg.size)} - range: {self.seg.range}'
-        if self.speed_limit:
-            msg += f'- SL= {self.speed_limit}'
         if self.minimum_speed:
             msg += f'- minimum speed= {self.minimum_speed}, timeout={self.timeout}'
+        if self.batch:
+            msg += f' - batch: {len(self.batch)} more'
 
         log(msg, ' - worker', self.tag, log_level=2)
 
         self.check_previous_download()
 
-        return True
+    def next_segment(self):
+        """switch to next segment of a batch after current segment is done, called after finalize(), the same curl
+        handle is used, so connection to server is kept alive
+
+        Returns:
+            (bool): True if worker is ready to download next segment, otherwise, e.g. current segment failed, rest
+            of batch is given back to thread manager
+        """
+        while self.batch and self.seg.downloaded and not self.cancelled and self.d.status == Status.downloading:
+            seg = self.batch.popleft()
+
+            if seg.downloaded:
+                seg.locked = False
+                continue
+
+            if seg.retries >= max_seg_retries:
+                # thread manager will handle it
+                self.batch.appendleft(seg)
+                break
+
+            # wake up file manager to merge finished segment
+            if self.ctx:
+                self.ctx.signal()
+
+            seg.retries += 1
+            self.start_segment(seg)
+            return True
+
+        # give back rest of batch
+        while self.batch:
+            seg = self.batch.popleft()
+            seg.locked = False
+            if self.ctx:
+                self.ctx.report_failed_job(seg)
+
+        return False
+
+    def cancel(self):
+        """abort current job, segment isn't reported as failed job, refer to progress() kill switch"""
+        self.cancelled = True
 
     def reset(self):
         # reset curl options "only", other info cache stay intact, https://curl.haxx.se/libcurl/c/curl_easy_reset.html
@@ -88,6 +169,8 @@ class Worker:
         self.buffer = 0
         self.resume_range = None
         self.headers = {}
+        self.response_code = 0
+        self.paused_until = 0
 
         self.print_headers = True
 
@@ -95,12 +178,14 @@ class Worker:
         def overwrite():
             # reset start size and remove value from d.downloaded
             self.report_download(-self.seg.current_size)
+            self.seg.written = 0
             self.mode = 'wb'
             log('Seg', self.seg.basename, 'overwrite the previous part-downloaded segment', ' - worker', self.tag,
                 log_level=3)
 
-        # if file doesn't exist will start fresh
-        if not os.path.exists(self.seg.name):
+        # if file doesn't exist will start fresh, direct-write segments have no file of their own
+        if not self.seg.direct and not os.path.exists(self.seg.name):
+            self.seg.written = 0
             self.mode = 'wb'
             return
 
@@ -121,15 +206,8 @@ class Worker:
 
         # Case-2: over-sized, in case the server sent extra bytes from last session by mistake, truncate file
         elif self.seg.current_size > self.seg.size:
-            log('Seg', self.seg.basename, 'over-sized', self.seg.current_size, 'will be truncated to:',
-                format_bytes(self.seg.size), ' - worker', self.tag, log_level=3)
-
             self.seg.downloaded = True
-            self.report_download(- (self.seg.current_size - self.seg.size))
-
-            # truncate file
-            with open(self.seg.name, 'rb+') as f:
-                f.truncate(self.seg.size)
+            self.truncate()
 
         # Case-3: Resume, with new range
         elif self.seg.range and self.seg.current_size < self.seg.size:
@@ -146,8 +224,28 @@ class Worker:
         else:
             overwrite()
 
+    def truncate(self):
+        """remove extra bytes of an over-sized segment, e.g. its range was cut while downloading"""
+        log('Seg', self.seg.basename, 'over-sized', self.seg.current_size, 'will be truncated to:',
+            format_bytes(self.seg.size), ' - worker', self.tag, log_level=3)
+
+        self.report_download(- (self.seg.current_size - self.seg.size))
+
+        # truncate file, extra bytes of a direct-write segment belong to next segment and will be overwritten
+        if not self.seg.direct:
+            with open(self.seg.name, 'rb+') as f:
+                f.truncate(self.seg.size)
+        self.seg.written = self.seg.size
+
     def verify(self):
         """check if segment completed"""
+        # size on disk is the final word, in-memory count is used while downloading
+        self.seg.sync_size()
+
+        # server error, e.g. an empty "500" response of a fragment with unknown size, isn't a completed segment
+        if self.response_code >= 400:
+            return False
+
         # unknown segment size, will report done if there is any downloaded data > 0
         if self.seg.size == 0 and self.seg.current_size > 0:
             return True
@@ -167,6 +265,10 @@ class Worker:
         # self.debug('worker', self.tag, 'completed', self.seg.name)
         self.seg.downloaded = True
 
+        # shadow is reported by thread manager if it wins the race
+        if not self.shadow:
+            self.d.mark_segment_changed(self.seg)
+
         # in case couldn't fetch segment size from headers
         if not self.seg.size:
             self.seg.size = self.seg.current_size
@@ -191,9 +293,6 @@ class Worker:
 
         self.c.setopt(pycurl.NOPROGRESS, 0)  # will use a progress function
 
-        # set speed limit selected by user
-        self.c.setopt(pycurl.MAX_RECV_SPEED_LARGE, self.speed_limit)  # cap download speed to n bytes/sec, 0=disabled
-
         # verbose
         self.c.setopt(pycurl.VERBOSE, 0)
 
@@ -239,8 +338,8 @@ class Worker:
         Returning a non-zero value from this callback will cause curl to abort the transfer
         """
 
-        # check termination by user
-        if self.d.status != Status.downloading:
+        # check termination by user, or job cancelled by thread manager
+        if self.d.status != Status.downloading or self.cancelled:
             return -1  # abort
 
         if self.headers and self.headers.get('content-range') and self.print_headers:
@@ -249,88 +348,151 @@ class Worker:
                 self.headers.get('content-range'), self.headers.get('content-length'), log_level=3)
             self.print_headers = False
 
-    def report_error(self, description='unspecified error'):
+    def report_error(self, description='unspecified error', kind=ErrorRecord.other, code=0):
         # report server error to thread manager, to dynamically control connections number
-        error_q.put(description)
+        record = ErrorRecord(kind=kind, code=code, description=description, seg_name=self.seg.basename,
+                             worker_tag=self.tag)
+        self.ctx.report_error(record)
 
     def report_download(self, value):
         """report downloaded to DownloadItem"""
         if isinstance(value, (int, float)):
+            # shadow's bytes and progress are reported by thread manager if it wins the race, while racing it
+            # overlaps original segment's range
+            if self.shadow:
+                return
+
             self.d.downloaded += value
             self.seg.down_bytes += value
+            self.d.mark_segment_changed(self.seg)
 
-    def run(self):
-        try:
+    def prepare(self):
+        """check segment, set curl options, and open segment file, it raises an exception on failure"""
 
-            # check if file completed before and exit
-            if self.seg.downloaded:
-                raise Exception('completed before')
+        # check if file completed before and exit
+        if self.seg.downloaded:
+            raise Exception('completed before')
 
-            if not self.seg.url:
-                log('Seg', self.seg.basename, 'segment has no valid url', '- worker', {self.tag}, log_level=2)
-                raise Exception('invalid url')
+        if not self.seg.url:
+            log('Seg', self.seg.basename, 'segment has no valid url', '- worker', {self.tag}, log_level=2)
+            raise Exception('invalid url')
 
-            # set options
-            self.set_options()
+        # set options
+        self.set_options()
 
-            # make sure target directory exist
-            target_directory = os.path.dirname(self.seg.name)
-            if not os.path.isdir(target_directory):
-                os.makedirs(target_directory)  # it will also create any intermediate folders in the given path
+        # make sure target directory exist
+        target_directory = os.path.dirname(self.seg.name)
+        if not os.path.isdir(target_directory):
+            os.makedirs(target_directory)  # it will also create any intermediate folders in the given path
 
-            # open segment file
+        # open segment file
+        if self.seg.direct:
+            # write in place into temp file which is preallocated by brain, refer to DownloadItem.prepare_temp_files()
+            self.file = open(self.seg.tempfile, 'rb+', buffering=0)
+            self.file.seek(self.seg.range[0] + self.seg.written)
+        else:
             self.file = open(self.seg.name, self.mode, buffering=0)
 
-            # Main Libcurl operation
-            self.c.perform()
+    def check_response(self):
+        """get response code and check for connection errors"""
+        response_code = self.response_code = self.c.getinfo(pycurl.RESPONSE_CODE)
+        if response_code in range(400, 512):
+            log('Seg', self.seg.basename, 'server refuse connection', response_code, translate_server_code(response_code),
+                'content type:', self.headers.get('content-type'), log_level=3)
+
+            # send error to thread manager, it will reduce connections number to fix this error
+            self.report_error(f'server refuse connection: {response_code}, {translate_server_code(response_code)}',
+                              kind=ErrorRecord.http, code=response_code)
+
+    def handle_error(self, e):
+        # this error generated when user cancel download, or write function abort
+        if '23' in repr(e) or '42' in repr(e):  # ('Failed writing body', 'Callback aborted')
+            error = f'terminated'
+            log('Seg', self.seg.basename, error, 'worker', self.tag, log_level=3)
+        else:
+            error = repr(e)
+            log('Seg', self.seg.basename, '- worker', self.tag, 'quitting ...', error, log_level=3)
 
-            # get response code and check for connection errors
-            response_code = self.c.getinfo(pycurl.RESPONSE_CODE)
-            if response_code in range(400, 512):
-                log('Seg', self.seg.basename, 'server refuse connection', response_code, translate_server_code(response_code),
-                    'content type:', self.headers.get('content-type'), log_level=3)
+            # report server error to thread manager
+            if isinstance(e, pycurl.error):
+                self.report_error(repr(e), kind=ErrorRecord.curl, code=e.args[0])
+            else:
+                self.report_error(repr(e))
 
-                # send error to thread manager, it will reduce connections number to fix this error
-                self.report_error(f'server refuse connection: {response_code}, {translate_server_code(response_code)}')
+    def finalize(self):
+        """report download, close file, and check segment completion, must be called after every download attempt"""
+        # report download
+        self.report_download(self.buffer)
+        self.buffer = 0
 
-        except Exception as e:
-            # this error generated when user cancel download, or write function abort
-            if '23' in repr(e) or '42' in repr(e):  # ('Failed writing body', 'Callback aborted')
-                error = f'terminated'
-                log('Seg', self.seg.basename, error, 'worker', self.tag, log_level=3)
-            else:
-                error = repr(e)
-                log('Seg', self.seg.basename, '- worker', self.tag, 'quitting ...', error, log_level=3)
+        # count new and reused connections
+        curl_stats.record(self.c)
+
+        # segment file is opened only if transfer started
+        transferred = self.file is not None
+
+        # close segment file handle
+        if self.file:
+            self.file.close()
+
+        # check if download completed
+        completed = self.verify()
+        if completed:
+            # range was cut while downloading, i.e. an end-game shadow won the rest of it
+            if self.seg.size and self.seg.current_size > self.seg.size:
+                self.truncate()
+
+            self.report_completed()
+
+            # timing info for fragments batching, refer to scheduling.FragmentBatcher
+            if transferred:
+                try:
+                    rtt = self.c.getinfo(pycurl.STARTTRANSFER_TIME) - self.c.getinfo(pycurl.PRETRANSFER_TIME)
+                    self.transfers.append((max(rtt, 0), self.c.getinfo(pycurl.TOTAL_TIME), self.seg.size))
+                except Exception:
+                    pass
+        elif self.cancelled:
+            log('Seg', self.seg.basename, 'cancelled', '- worker', self.tag, log_level=3)
+        else:
+            # if segment not fully downloaded send it back to thread manager to try again
+            self.report_not_completed()
 
-                # report server error to thread manager
-                self.report_error(repr(e))
+        # remove segment lock, a failed segment must be unlocked before it is reported, thread manager drops returned
+        # segments which are still locked
+        self.seg.locked = False
 
-        finally:
-            # report download
-            self.report_download(self.buffer)
-            self.buffer = 0
+        if not completed and not self.cancelled:
+            # put back to jobs queue to try again
+            self.ctx.report_failed_job(self.seg)
 
-            # close segment file handle
-            if self.file:
-                self.file.close()
+    def run(self):
+        """download segment and its batch in a blocking call, used by "threads" download engine, for "curl_multi"
+        engine check engine.CurlMultiEngine"""
+        while True:
+            try:
+                self.prepare()
 
-            # check if download completed
-            completed = self.verify()
-            if completed:
-                self.report_completed()
-            else:
-                # if segment not fully downloaded send it back to thread manager to try again
-                self.report_not_completed()
+                # Main Libcurl operation
+                self.c.perform()
 
-                # put back to jobs queue to try again
-                jobs_q.put(self.seg)
+                self.check_response()
 
-            # remove segment lock
-            self.seg.locked = False
+            except Exception as e:
+                self.handle_error(e)
+
+            finally:
+                self.finalize()
+
+            if not self.next_segment():
+                break
 
     def write(self, data):
         """write to file"""
 
+        # transfer is paused by bandwidth limiter, curl will deliver same data again when engine resumes transfer
+        if self.paused_until and time.monotonic() < self.paused_until:
+            return pycurl.WRITEFUNC_PAUSE
+
         quit_flag = False
 
         content_type = self.headers.get('content-type')
@@ -344,7 +506,7 @@ class Worker:
                     log('=' * 20, data, '=' * 20, sep='\n', start='', log_level=3)
 
                     # report server error to thread manager
-                    self.report_error('received html contents')
+                    self.report_error('received html contents', kind=ErrorRecord.html)
 
                     return -1  # abort
             except Exception as e:
@@ -358,8 +520,10 @@ class Worker:
                 data = data[:-oversize]
                 quit_flag = True
 
-        # write to file
+        # write to file, and count written bytes in memory, no need to check file size on disk
         self.file.write(data)
+        self.seg.written += len(data)
+        self.received += len(data)
 
         self.buffer += len(data)
 
@@ -372,5 +536,18 @@ class Worker:
         if quit_flag:
             return -1  # abort
 
-
-
+        # speed limit, take tokens from global bandwidth limiter
+        delay = limiter.consume(self.d, len(data))
+        if delay:
+            self.throttle(delay)
+
+    def throttle(self, delay):
+        """stop receiving data for a while, as requested by bandwidth limiter"""
+        if self.pause_callback:
+            self.paused_until = time.monotonic() + delay
+            self.pause_callback(delay)
+        elif self.ctx:
+            # block, but wake up at once if download stopped
+            self.ctx.wait_for(lambda: self.d.status != Status.downloading, timeout=delay)
+        else:
+            time.sleep(delay)